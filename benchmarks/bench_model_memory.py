@@ -0,0 +1,71 @@
+"""
+Memory of a model loaded with generate_network=True, which keeps every
+species of the generated network as a pattern in the species block.
+The made up model has a scaffold with the given number of sites, each
+of which is free or binds a kinase that is phosphorylated or not, so
+the network has 3^sites scaffold species.
+
+Usage: python benchmarks/bench_model_memory.py [sites]
+"""
+
+import gc, os, sys, tempfile, time, tracemalloc
+import bionetgen as bng
+
+
+def make_model(sites):
+    names = [f"a{idx}" for idx in range(sites)]
+    lines = [
+        "begin model",
+        "begin parameters",
+        "    kon 1e-3",
+        "    koff 0.1",
+        "    kp 1",
+        "    kd 0.5",
+        "end parameters",
+        "begin molecule types",
+        f"    S({','.join(names)})",
+        "    K(s,p~0~1)",
+        "end molecule types",
+        "begin seed species",
+        f"    S({','.join(names)}) 100",
+        "    K(s,p~0) 1000",
+        "end seed species",
+        "begin observables",
+        "    Molecules Kp K(p~1)",
+        "end observables",
+        "begin reaction rules",
+    ]
+    for name in names:
+        lines.append(f"    S({name}) + K(s) <-> S({name}!1).K(s!1) kon, koff")
+        lines.append(f"    S({name}!1).K(s!1,p~0) -> S({name}!1).K(s!1,p~1) kp")
+    lines += [
+        "    K(p~1) -> K(p~0) kd",
+        "end reaction rules",
+        "end model",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    sites = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    with tempfile.TemporaryDirectory() as folder:
+        # the modules used for loading are imported lazily, a small
+        # model is loaded first so they aren't counted
+        path = os.path.join(folder, "warmup.bngl")
+        with open(path, "w") as f:
+            f.write(make_model(1))
+        bng.bngmodel(path, generate_network=True)
+        path = os.path.join(folder, "scaffold.bngl")
+        with open(path, "w") as f:
+            f.write(make_model(sites))
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        model = bng.bngmodel(path, generate_network=True)
+        seconds = time.perf_counter() - start
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    print(f"{len(model.species)} species loaded in {seconds:.2f} s")
+    print(f"{'model memory':>20}: {current / 2**20:.1f} MB")
+    print(f"{'peak while loading':>20}: {peak / 2**20:.1f} MB")
@@ -0,0 +1,37 @@
+"""
+Time of finding the pairs of similar species names used by the
+atomizer naming convention analysis, for a growing number of
+made up SBML style species names.
+
+Usage: python benchmarks/bench_naming_conventions.py [max_names]
+"""
+
+import random, sys, time
+from bionetgen.atomizer.atomizer import detectOntology
+
+proteins = ["EGFR", "Grb2", "Sos", "Ras", "Raf", "MEK", "ERK", "Shc", "PI3K", "Akt"]
+suffixes = ["", "_P", "_PP", "_GTP", "_GDP", "_active", "_cyt", "_nuc", "p", "_i"]
+
+
+def make_names(count, seed=0):
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        parts = rng.sample(proteins, rng.randint(1, 3))
+        name = "_".join(part + rng.choice(suffixes) for part in parts)
+        if rng.random() < 0.3:
+            name += str(rng.randint(1, 99))
+        names.add(name)
+    return sorted(names)
+
+
+if __name__ == "__main__":
+    max_names = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+    count = 500
+    while count <= max_names:
+        names = make_names(count)
+        start = time.perf_counter()
+        namePairs, _, _ = detectOntology.defineEditDistanceMatrix(names, 4)
+        elapsed = time.perf_counter() - start
+        print(f"{count} names: {len(namePairs)} pairs in {elapsed:.2f} s")
+        count *= 2
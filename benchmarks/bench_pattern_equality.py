@@ -0,0 +1,41 @@
+"""
+Micro-benchmark of molecule equality with logging off.
+
+Pattern equality is decided by canonical labels, so this compares
+every pair of molecules of the test species directly, which
+exercises the molecule and component comparisons (and their
+debug logging).
+
+Usage: python benchmarks/bench_pattern_equality.py [repeat]
+"""
+
+import os, sys, timeit
+from bionetgen.modelapi.pattern_reader import BNGPatternReader
+
+tfold = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests")
+
+
+def load_molecules():
+    with open(os.path.join(tfold, "canon_label_testing.txt"), "r") as f:
+        pattern_strs = [pat.strip() for line in f for pat in line.split("    ")]
+    patterns = BNGPatternReader.parse_many(pattern_strs[:200])
+    return [molecule for pattern in patterns for molecule in pattern.molecules]
+
+
+def compare_all(molecules):
+    matches = 0
+    for mol1 in molecules:
+        for mol2 in molecules:
+            if mol1 == mol2:
+                matches += 1
+    return matches
+
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    molecules = load_molecules()
+    ncomp = len(molecules) ** 2
+    times = timeit.repeat(lambda: compare_all(molecules), number=1, repeat=repeat)
+    best = min(times)
+    print(f"{ncomp} comparisons, best of {repeat}: {best:.3f} s")
+    print(f"{1e6 * best / ncomp:.2f} us per comparison")
@@ -0,0 +1,89 @@
+"""
+Time of the sympy steps of the atomizer's kinetic law analysis
+(parsing, expanding, splitting into forward and backward terms,
+removing the reactants and simplifying) for made up reactions that
+share their rate laws, without the expression cache and with it for
+the sympy and symengine backends.
+
+Usage: python benchmarks/bench_rate_laws.py [reactions] [laws]
+"""
+
+import random, sys, time
+import sympy
+from sympy.core.cache import clear_cache
+from bionetgen.atomizer.sbml2bngl import SBML2BNGL, ExpressionCache, symengine
+
+templates = [
+    "{k1} * {A} * {B} - {k2} * {C}",
+    "{k1} * {A} * {B}",
+    "{k1} * {A} * {B} / ({Km} + {A})",
+    "cell * ({k1} * {A} * {B} - {k2} * {C})",
+    "{k1} * {A} * {A} / 2 - {k2} * {C}",
+    "{k1} * ({A} + {B}) * {C} - 0.5 * {k2} * {C}",
+    "{k1} * ({A} + {Km} * {B}) ** 4 - {k2} * ({C} + {Km}) ** 3",
+]
+
+
+def make_laws(reactions, laws, seed=0):
+    rng = random.Random(seed)
+    distinct = []
+    for idx in range(laws):
+        names = {
+            "k1": f"kf{idx}",
+            "k2": f"kr{idx}",
+            "Km": f"Km{idx}",
+            "A": f"S{rng.randrange(50)}",
+            "B": f"S{rng.randrange(50, 100)}",
+            "C": f"S{rng.randrange(100, 150)}",
+        }
+        form = rng.choice(templates).format(**names)
+        distinct.append((form, [names["A"], names["B"]], [names["C"]]))
+    return [rng.choice(distinct) for _ in range(reactions)]
+
+
+class Uncached(ExpressionCache):
+    # the same steps computed every time
+    def cached(self, operation, expr, function):
+        return function(expr)
+
+    def parse(self, form):
+        return sympy.sympify(form, locals=self.symbols)
+
+
+def analyze(cache, form, reactants, products):
+    sym = cache.parse(form)
+    comp = sympy.Symbol("cell")
+    if comp in cache.atoms(sym):
+        sym = sym / comp
+    exp = cache.expand(sym)
+    if not exp.is_Add:
+        return cache.simplify(exp / sympy.Mul(*sympy.symbols(reactants))), None
+    left, right = cache.cached("terms", exp, lambda x: SBML2BNGL.gather_terms(None, x))
+    left = left / sympy.Mul(*sympy.symbols(reactants))
+    cache.numer_denom(left)
+    if right is not None:
+        right = right / sympy.Mul(*sympy.symbols(products))
+        cache.numer_denom(right)
+        right = cache.simplify(right)
+    return cache.simplify(left), right
+
+
+def run(cache, laws):
+    # sympy's own cache would favour the runs after the first one
+    clear_cache()
+    start = time.perf_counter()
+    results = [analyze(cache, *law) for law in laws]
+    return time.perf_counter() - start, [str(result) for result in results]
+
+
+if __name__ == "__main__":
+    reactions = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    laws = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    rateLaws = make_laws(reactions, laws)
+    backends = ["sympy"] + (["symengine"] if symengine is not None else [])
+    seconds, expected = run(Uncached({}, backend="sympy"), rateLaws)
+    print(f"{'no cache':>20}: {seconds:.2f} s")
+    for backend in backends:
+        seconds, results = run(ExpressionCache({}, backend=backend), rateLaws)
+        assert results == expected
+        print(f"{'cache, ' + backend:>20}: {seconds:.2f} s")
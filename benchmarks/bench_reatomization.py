@@ -0,0 +1,120 @@
+"""
+Time of atomizing a made up SBML model of phosphorylated proteins and
+their complexes for the first time, again without changes, which
+reuses the saved atomization, and again after adding a protein, which
+only compares the new names in the naming convention analysis. The
+output of the last run is checked against atomizing the edited model
+without the cache.
+
+Usage: python benchmarks/bench_reatomization.py [proteins]
+"""
+
+import os, random, sys, tempfile, time
+import libsbml
+from bionetgen.atomizer import AtomizeTool
+
+
+def add_species(model, name):
+    species = model.createSpecies()
+    species.setId(name)
+    species.setName(name)
+    species.setCompartment("cell")
+    species.setInitialConcentration(1.0)
+    species.setHasOnlySubstanceUnits(False)
+    species.setBoundaryCondition(False)
+    species.setConstant(False)
+
+
+def add_reaction(model, reactants, products):
+    idx = model.getNumReactions()
+    parameter = model.createParameter()
+    parameter.setId(f"k{idx}")
+    parameter.setValue(0.1)
+    parameter.setConstant(True)
+    reaction = model.createReaction()
+    reaction.setId(f"r{idx}")
+    reaction.setReversible(False)
+    reaction.setFast(False)
+    for name in reactants:
+        reference = reaction.createReactant()
+        reference.setSpecies(name)
+        reference.setStoichiometry(1)
+        reference.setConstant(True)
+    for name in products:
+        reference = reaction.createProduct()
+        reference.setSpecies(name)
+        reference.setStoichiometry(1)
+        reference.setConstant(True)
+    law = reaction.createKineticLaw()
+    law.setMath(libsbml.parseL3Formula(f"k{idx} * " + " * ".join(reactants)))
+
+
+def make_model(proteins, extra=0, seed=0):
+    rng = random.Random(seed)
+    document = libsbml.SBMLDocument(3, 1)
+    model = document.createModel()
+    model.setId("synthetic")
+    compartment = model.createCompartment()
+    compartment.setId("cell")
+    compartment.setSize(1.0)
+    compartment.setConstant(True)
+    compartment.setSpatialDimensions(3)
+    names = [f"Prot{chr(65 + idx % 26)}{idx // 26}" for idx in range(proteins)]
+    for name in names:
+        add_species(model, name)
+        add_species(model, name + "_P")
+        add_reaction(model, [name], [name + "_P"])
+    for idx, name in enumerate(names):
+        for idx2 in rng.sample(range(proteins), 2):
+            if idx2 <= idx:
+                continue
+            other = names[idx2]
+            add_species(model, f"{name}_{other}")
+            add_reaction(model, [name, other], [f"{name}_{other}"])
+            add_species(model, f"{name}_P_{other}")
+            add_reaction(model, [name + "_P", other], [f"{name}_P_{other}"])
+    # the edit, proteins that weren't in the model before
+    for idx in range(extra):
+        add_species(model, f"ProtNew{idx}")
+        add_species(model, f"ProtNew{idx}_P")
+        add_reaction(model, [f"ProtNew{idx}"], [f"ProtNew{idx}_P"])
+    return document
+
+
+def atomize(inputFile, outputFile, cacheFile):
+    options = {
+        "atomize": True,
+        "pathwaycommons": False,
+        "bionetgen_analysis": False,
+        "output": outputFile,
+        "sct_cache": cacheFile,
+        "reuse_atomization": cacheFile is not None,
+        "log_level": "ERROR",
+    }
+    start = time.perf_counter()
+    AtomizeTool(input_file=inputFile, options_dict=options).run()
+    seconds = time.perf_counter() - start
+    with open(outputFile) as f:
+        return seconds, f.read()
+
+
+if __name__ == "__main__":
+    proteins = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    with tempfile.TemporaryDirectory() as folder:
+        inputFile = os.path.join(folder, "model.xml")
+        outputFile = os.path.join(folder, "model.bngl")
+        cacheFile = os.path.join(folder, "sct_cache.sqlite")
+        document = make_model(proteins)
+        print(f"{document.getModel().getNumSpecies()} species")
+        libsbml.writeSBMLToFile(document, inputFile)
+        seconds, first = atomize(inputFile, outputFile, cacheFile)
+        print(f"{'first run':>20}: {seconds:.2f} s")
+        seconds, again = atomize(inputFile, outputFile, cacheFile)
+        assert again == first
+        print(f"{'unchanged':>20}: {seconds:.2f} s")
+        libsbml.writeSBMLToFile(make_model(proteins, extra=1), inputFile)
+        seconds, edited = atomize(inputFile, outputFile, cacheFile)
+        print(f"{'one protein added':>20}: {seconds:.2f} s")
+        seconds, expected = atomize(inputFile, outputFile, None)
+        assert edited == expected
+        print(f"{'without the cache':>20}: {seconds:.2f} s")
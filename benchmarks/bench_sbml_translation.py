@@ -0,0 +1,95 @@
+"""
+Time of the SBML2BNGL translation steps the atomizer runs before
+atomization, for a made up SBML model with many species. Every
+species name is used in two compartments and a quarter of the
+parameters get an initial assignment from a species.
+
+Usage: python benchmarks/bench_sbml_translation.py [species]
+"""
+
+import sys, time
+import libsbml
+from bionetgen.atomizer.sbml2bngl import SBML2BNGL
+
+
+def make_model(count):
+    document = libsbml.SBMLDocument(3, 1)
+    model = document.createModel()
+    model.setId("synthetic")
+    for name in ("cyt", "nuc"):
+        compartment = model.createCompartment()
+        compartment.setId(name)
+        compartment.setSize(2.0)
+        compartment.setConstant(True)
+        compartment.setSpatialDimensions(3)
+    for idx in range(count):
+        species = model.createSpecies()
+        species.setId(f"s{idx}")
+        species.setName(f"P{idx // 2}")
+        species.setCompartment("cyt" if idx % 2 == 0 else "nuc")
+        species.setInitialConcentration(1.0)
+        species.setHasOnlySubstanceUnits(False)
+        species.setBoundaryCondition(False)
+        species.setConstant(False)
+    for idx in range(count // 2):
+        parameter = model.createParameter()
+        parameter.setId(f"k{idx}")
+        parameter.setValue(0.1)
+        parameter.setConstant(True)
+        reaction = model.createReaction()
+        reaction.setId(f"r{idx}")
+        reaction.setReversible(False)
+        reaction.setFast(False)
+        reactant = reaction.createReactant()
+        reactant.setSpecies(f"s{2 * idx}")
+        reactant.setStoichiometry(1)
+        reactant.setConstant(True)
+        product = reaction.createProduct()
+        product.setSpecies(f"s{2 * idx + 1}")
+        product.setStoichiometry(1)
+        product.setConstant(True)
+        law = reaction.createKineticLaw()
+        law.setMath(libsbml.parseL3Formula(f"k{idx} * s{2 * idx}"))
+    for idx in range(0, count // 2, 2):
+        assignment = model.createInitialAssignment()
+        assignment.setSymbol(f"k{idx}")
+        assignment.setMath(libsbml.parseL3Formula(f"2 * s{2 * idx}"))
+    return document
+
+
+def translate(model):
+    # the first calls of libsbml2bngl.analyzeFile, in the same order
+    times = {}
+    start = time.perf_counter()
+    parser = SBML2BNGL(model, False)
+    times["constructor"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    param, zparam = parser.getParameters()
+    paramNames = set(x.split(" ")[0] for x in param)
+    for species in parser.model.getListOfSpecies():
+        parser.getRawSpecies(species, paramNames)
+    parser.reset()
+    times["raw species"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    molecules, initialConditions, _, _, _, _ = parser.getSpecies(
+        {}, [x.split(" ")[0] for x in param]
+    )
+    times["species"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    param, zparam, initialConditions, _ = parser.getInitialAssignments(
+        {}, param, zparam, molecules, initialConditions
+    )
+    times["initial assignments"] = time.perf_counter() - start
+    return times
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    document = make_model(count)
+    times = translate(document.getModel())
+    for step, seconds in times.items():
+        print(f"{step:>20}: {seconds:.2f} s")
+    print(f"{'total':>20}: {sum(times.values()):.2f} s")
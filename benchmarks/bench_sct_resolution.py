@@ -0,0 +1,36 @@
+"""
+Time of weighting every species of made up species composition
+graphs, as the atomizer does for each model, for a growing number
+of species.
+
+Usage: python benchmarks/bench_sct_resolution.py [max_species]
+"""
+
+import random, sys, time
+from bionetgen.atomizer.atomizer.resolveSCT import SCTSolver
+
+
+def make_graph(count, seed=0):
+    # ten molecule types, the other species are a modification of an
+    # earlier species or a complex of one with a molecule type
+    rng = random.Random(seed)
+    graph = {f"S{idx}": [] for idx in range(10)}
+    for idx in range(10, count):
+        parent = f"S{rng.randrange(idx)}"
+        if rng.random() < 0.5:
+            graph[f"S{idx}"] = [[parent]]
+        else:
+            graph[f"S{idx}"] = [[parent, f"S{rng.randrange(10)}"]]
+    return graph
+
+
+if __name__ == "__main__":
+    max_species = int(sys.argv[1]) if len(sys.argv) > 1 else 3200
+    count = 50
+    while count <= max_species:
+        graph = make_graph(count)
+        start = time.perf_counter()
+        SCTSolver(None).weightDependencyGraph(graph)
+        elapsed = time.perf_counter() - start
+        print(f"{count} species: {elapsed:.3f} s")
+        count *= 2
@@ -0,0 +1,34 @@
+"""
+Latency of loading a small model and running it with and without
+the BNG2.pl worker pool.
+
+Usage: python benchmarks/bench_worker_pool.py [repeat]
+"""
+
+import os, sys, time
+import bionetgen as bng
+
+tfold = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests")
+model_file = os.path.join(tfold, "test.bngl")
+
+
+def best_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    cwd = os.getcwd()
+    for pool in (None, True):
+        # the first call starts the pool's worker
+        bng.bngmodel(model_file, pool=pool)
+        load = best_time(lambda: bng.bngmodel(model_file, pool=pool), repeat)
+        run = best_time(lambda: bng.run(model_file, suppress=True, pool=pool), repeat)
+        os.chdir(cwd)
+        name = "pool" if pool else "subprocess"
+        print(f"{name:>10}: bngmodel {1e3 * load:.1f} ms, run {1e3 * run:.1f} ms")
@@ -1,4 +1,34 @@
-from .core.defaults import defaults
-from .modelapi import bngmodel
-from .modelapi.runner import run
-from .simulator import sim_getter
+import importlib
+
+# public names are loaded on first use (PEP 562) so that
+# importing bionetgen doesn't pull in the whole library
+_lazy_attributes = {
+    "defaults": ".core.defaults",
+    "bngmodel": ".modelapi",
+    "run": ".modelapi.runner",
+    "sim_getter": ".simulator",
+}
+_lazy_submodules = (
+    "atomizer",
+    "core",
+    "main",
+    "modelapi",
+    "network",
+    "simulator",
+)
+
+
+def __getattr__(name):
+    if name in _lazy_attributes:
+        module = importlib.import_module(_lazy_attributes[name], __name__)
+        value = getattr(module, name)
+    elif name in _lazy_submodules:
+        value = importlib.import_module("." + name, __name__)
+    else:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_attributes) | set(_lazy_submodules))
@@ -1 +1,2 @@
 from .atomizeTool import AtomizeTool
+from .batchAtomizeTool import BatchAtomizeTool
@@ -1,6 +1,10 @@
 import bionetgen.atomizer.libsbml2bngl as ls2b
+from bionetgen.atomizer.utils.util import clearCaches, cacheStats
+from bionetgen.atomizer.utils.webcache import web_cache
+from bionetgen.atomizer.utils.profiler import profiler
+from bionetgen.atomizer.utils.sctcache import sct_cache
 from bionetgen.core.defaults import BNGDefaults
-import yaml, os
+import cProfile, yaml, os
 
 from bionetgen.core.utils.logging import BNGLogger, log_level
 
@@ -10,7 +14,12 @@ d = BNGDefaults()
 
 class AtomizeTool:
     def __init__(
-        self, input_file=None, options_dict=None, parser_namespace=None, app=None
+        self,
+        input_file=None,
+        options_dict=None,
+        parser_namespace=None,
+        app=None,
+        profile=None,
     ):
         self.app = app
         self.logger = BNGLogger(app=self.app)
@@ -30,6 +39,10 @@ class AtomizeTool:
             "convert_units": False,  # currently not supported
             "atomize": False,  # default is flat translation
             "pathwaycommons": True,  # requires connection so default is false
+            "offline": False,  # only use web responses from the cache
+            "web_cache": None,  # sqlite file of the web cache
+            "sct_cache": None,  # sqlite file of the stored atomizations
+            "reuse_atomization": True,  # reuse atomizations of earlier runs
             "bionetgen_analysis": os.path.join(
                 d.bng_path, "BNG2.pl"
             ),  # TODO: get it from app config
@@ -40,6 +53,9 @@ class AtomizeTool:
             "quiet_mode": False,
             "obs_map_file": None,
             "log_level": "DEBUG",  # options are "CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG"
+            "profile": False,  # True or path of the JSON stage report
+            "profile_stats": None,  # path of a cProfile file
+            "profile_memory": False,  # trace the peak memory of every stage
         }
         # input file
         if input_file is not None:
@@ -54,6 +70,8 @@ class AtomizeTool:
             for key in config:
                 if hasattr(parser_namespace, key):
                     config[key] = getattr(parser_namespace, key)
+        if profile is not None:
+            config["profile"] = profile
         # special handling of log level
         if log_level is not None:
             config["log_level"] = log_level
@@ -66,6 +84,11 @@ class AtomizeTool:
             else:
                 # we called the CLI but didn't give any log_level info
                 config["log_level"] = "INFO"
+        elif options_dict is not None and options_dict.get("debug"):
+            # we called from library, e.g. a worker of BatchAtomizeTool
+            config["log_level"] = "DEBUG"
+        elif options_dict is not None and options_dict.get("log_level") is not None:
+            config["log_level"] = options_dict["log_level"]
         else:
             # we called from library but no log_level info exists
             config["log_level"] = "INFO"
@@ -98,6 +121,10 @@ class AtomizeTool:
         options["annotation"] = config["annotation"]
         options["atomize"] = config["atomize"]
         options["pathwaycommons"] = config["pathwaycommons"]
+        options["offline"] = config["offline"]
+        options["webCache"] = config["web_cache"]
+        options["sctCache"] = config["sct_cache"]
+        options["reuseAtomization"] = config["reuse_atomization"]
         options["bionetgenAnalysis"] = config["bionetgen_analysis"]
         options["isomorphismCheck"] = config["isomorphism_check"]
         options["ignore"] = config["ignore"]
@@ -106,6 +133,11 @@ class AtomizeTool:
         options["replaceLocParams"] = not config["keep_local_parameters"]
         options["quietMode"] = config["quiet_mode"]
         options["obs_map_file"] = config["obs_map_file"]
+        options["profile"] = config["profile"]
+        if options["profile"] is True:
+            options["profile"] = options["outputFile"] + ".profile.json"
+        options["profileStats"] = config["profile_stats"]
+        options["profileMemory"] = config["profile_memory"]
         assert config["log_level"] in [
             "CRITICAL",
             "ERROR",
@@ -117,8 +149,49 @@ class AtomizeTool:
         return options
 
     def run(self):
+        self.profileReport = None
+        stats = None
+        if self.config["profile"]:
+            profiler.start(memory=self.config["profileMemory"])
+        if self.config["profileStats"]:
+            stats = cProfile.Profile()
+            stats.enable()
+        try:
+            return self._run()
+        finally:
+            if stats is not None:
+                stats.disable()
+                stats.dump_stats(self.config["profileStats"])
+            if self.config["profile"]:
+                self.profileReport = profiler.stop()
+                self.profileReport["input"] = self.config["inputFile"]
+                profiler.write(self.profileReport, self.config["profile"])
+                for path, stage in self.profileReport["stages"].items():
+                    memory = ""
+                    if "peak_memory_mb" in stage:
+                        memory = f", peak {stage['peak_memory_mb']:.1f} MB"
+                    elif "max_rss_mb" in stage:
+                        memory = f", max RSS {stage['max_rss_mb']:.1f} MB"
+                    self.logger.info(
+                        f"{path}: {stage['seconds']:.2f} s{memory}",
+                        loc=f"{__file__} : AtomizeTool.run()",
+                    )
+                self.logger.info(
+                    f"profile written to {self.config['profile']}",
+                    loc=f"{__file__} : AtomizeTool.run()",
+                )
+
+    def _run(self):
         # TODO: Make atomizer also use cement app logging
         # this involves changing a lot of code in atomizer!
+        web_cache.configure(
+            path=self.config["webCache"], offline=self.config["offline"]
+        )
+        sct_cache.configure(
+            path=self.config["sctCache"], enabled=self.config["reuseAtomization"]
+        )
+        # memoized results of the previous model aren't useful anymore
+        clearCaches()
         self.logger.debug("Analyzing SBML file", loc=f"{__file__} : AtomizeTool.run()")
         self.returnArray = ls2b.analyzeFile(
             self.config["inputFile"],
@@ -139,16 +212,22 @@ class AtomizeTool:
             obs_map_file=self.config["obs_map_file"],
             app=self.app,
         )
+        if self.logger.is_debug:
+            for name, stats in sorted(cacheStats().items()):
+                self.logger.debug(
+                    f"cache {name}: {stats}", loc=f"{__file__} : AtomizeTool.run()"
+                )
         self.logger.debug("Post-analysis", loc=f"{__file__} : AtomizeTool.run()")
         try:
             if self.config["bionetgenAnalysis"] and self.returnArray:
-                ls2b.postAnalyzeFile(
-                    self.config["outputFile"],
-                    self.config["bionetgenAnalysis"],
-                    self.returnArray.database,
-                    replaceLocParams=self.config["replaceLocParams"],
-                    obs_map_file=self.config["obs_map_file"],
-                )
+                with profiler.stage("post-analysis"):
+                    ls2b.postAnalyzeFile(
+                        self.config["outputFile"],
+                        self.config["bionetgenAnalysis"],
+                        self.returnArray.database,
+                        replaceLocParams=self.config["replaceLocParams"],
+                        obs_map_file=self.config["obs_map_file"],
+                    )
         except Exception as e:
             self.logger.warning(
                 "Post-analysis failed", loc=f"{__file__} : AtomizeTool.run()"
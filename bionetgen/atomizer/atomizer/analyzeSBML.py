@@ -31,12 +31,13 @@ the json config file for classyfying rules according to their reactants/products
 """
 
 
-@memoize
+# the keys hold the whole dataset, so these are limited by size
+@memoize(maxsize=5000, maxbytes=64 * 2**20)
 def get_close_matches(match, dataset, cutoff=0.6):
     return difflib.get_close_matches(match, dataset, cutoff=cutoff)
 
 
-@memoize
+@memoize(maxsize=50000)
 def sequenceMatcher(a, b):
     """
     compares two strings ignoring underscores
@@ -981,8 +982,8 @@ class SBMLAnalyzer:
         translationKeys = []
         conventionDict = {}
 
-        # FIXME: This line contains the single biggest execution bottleneck in the code
-        # we should be able to delete it
+        # only the pairs of names within the threshold are compared,
+        # see detectOntology.similarPairs
         # user defined equivalence
         if not onlyUser:
             (
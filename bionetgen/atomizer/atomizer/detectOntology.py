@@ -4,6 +4,7 @@ Created on Sat Oct 19 15:19:35 2013
 
 @author: proto
 """
+
 import pprint
 import difflib
 from collections import Counter
@@ -13,16 +14,18 @@ import pickle
 import os
 from os import listdir
 from os.path import isfile, join
-import numpy as np
+from bisect import bisect_left, bisect_right
 
 try:
     from utils.util import pmemoize as memoize
+    from utils.sctcache import sct_cache, fingerprint
     import libsbml
 except ModuleNotFoundError:
     import sys
 
     sys.path.append("..")
     from bionetgen.atomizer.utils.util import pmemoize as memoize
+    from bionetgen.atomizer.utils.sctcache import sct_cache, fingerprint
     import libsbml
 
 
@@ -44,24 +47,149 @@ def levenshtein(s1, s2):
     return matrix[l2][l1]
 
 
-def getDifferences(scoreMatrix, speciesName, threshold):
+def boundedLevenshtein(s1, s2, threshold):
     """
-    given a list of strings and a scoreMatrix, return the list of difference between
-    those strings with a levenshtein difference of less than threshold
-    returns:
-        namePairs: list of tuples containing strings with distance <2
-        differenceList: list of differences between the tuples in namePairs
+    levenshtein distance between s1 and s2 if it's at most threshold,
+    otherwise threshold + 1. only the diagonal band of width
+    2 * threshold + 1 of the DP matrix is computed (Ukkonen) and the
+    computation stops as soon as a whole row is over the threshold
     """
-    differenceList = []
-    namePairs = []
+    l1 = len(s1)
+    l2 = len(s2)
+    over = threshold + 1
+    if abs(l1 - l2) > threshold:
+        return over
+    # a common prefix and suffix don't change the distance
+    prefix = 0
+    while prefix < l1 and prefix < l2 and s1[prefix] == s2[prefix]:
+        prefix += 1
+    suffix = 0
+    while (
+        suffix < l1 - prefix
+        and suffix < l2 - prefix
+        and s1[l1 - 1 - suffix] == s2[l2 - 1 - suffix]
+    ):
+        suffix += 1
+    s1 = s1[prefix : l1 - suffix]
+    s2 = s2[prefix : l2 - suffix]
+    l1 = len(s1)
+    l2 = len(s2)
+    if l1 > l2:
+        s1, s2, l1, l2 = s2, s1, l2, l1
+    if l1 == 0:
+        return l2 if l2 <= threshold else over
+    # two rows are reused, cells outside the band stay over the threshold
+    previous = [x if x <= threshold else over for x in range(l1 + 2)]
+    current = [over] * (l1 + 2)
+    for zz in range(1, l2 + 1):
+        start = zz - threshold if zz > threshold else 1
+        end = zz + threshold if zz + threshold < l1 else l1
+        current[start - 1] = over
+        if zz <= threshold:
+            current[0] = zz
+        char = s2[zz - 1]
+        rowMin = over
+        for sz in range(start, end + 1):
+            value = previous[sz - 1]
+            if s1[sz - 1] != char:
+                value += 1
+            if previous[sz] + 1 < value:
+                value = previous[sz] + 1
+            if current[sz - 1] + 1 < value:
+                value = current[sz - 1] + 1
+            if value > over:
+                value = over
+            current[sz] = value
+            if value < rowMin:
+                rowMin = value
+        if rowMin > threshold and current[0] > threshold:
+            return over
+        previous, current = current, previous
+    return previous[l1] if previous[l1] < over else over
+
+
+def qgrams(string, q=2):
+    """
+    set of q-grams of the string, padded so the first and last
+    characters are part of q q-grams like the ones in the middle
+    """
+    padded = "\x00" * (q - 1) + string + "\x01" * (q - 1)
+    return {padded[i : i + q] for i in range(len(padded) - q + 1)}
 
-    for idx in range(0, len(scoreMatrix)):
-        for idx2 in range(0, len(scoreMatrix[idx])):
-            if scoreMatrix[idx][idx2] <= threshold and idx < idx2:
-                if len(speciesName[idx]) < len(speciesName[idx2]):
-                    namePairs.append([speciesName[idx], speciesName[idx2]])
-                else:
-                    namePairs.append([speciesName[idx2], speciesName[idx]])
+
+def similarPairs(speciesName, threshold, q=2):
+    """
+    returns the sorted list of index pairs (idx, idx2), idx < idx2, of
+    the strings in speciesName within levenshtein distance threshold
+    of each other, without comparing every pair.
+
+    an edit changes at most q of the q-grams of a string, so two strings
+    within the threshold share at least max(q-grams) - threshold * q of
+    their q-grams and one of them is among the threshold * q + 1 rarest
+    q-grams of either string. candidates come from an inverted q-gram
+    index on those rarest q-grams and are filtered by their length
+    difference, q-gram count and character counts before the banded
+    distance is computed.
+    strings with too few q-grams for the filter to apply are compared
+    with each other directly
+    """
+    grams = [qgrams(species, q) for species in speciesName]
+    lengths = [len(species) for species in speciesName]
+    chars = [Counter(species) for species in speciesName]
+    # posting lists are sorted by string length, so the strings of
+    # a gram within the length window are a slice of its list
+    index = {}
+    for idx in sorted(range(len(speciesName)), key=lambda idx: lengths[idx]):
+        for gram in grams[idx]:
+            index.setdefault(gram, ([], []))
+            index[gram][0].append(lengths[idx])
+            index[gram][1].append(idx)
+    prefixSize = threshold * q + 1
+    # strings the q-gram filter can't be used for, by length
+    unfiltered = {}
+    for idx, gramSet in enumerate(grams):
+        if len(gramSet) < prefixSize:
+            unfiltered.setdefault(lengths[idx], []).append(idx)
+    pairs = []
+    for idx, species in enumerate(speciesName):
+        gramSet = grams[idx]
+        low = lengths[idx] - threshold
+        high = lengths[idx] + threshold
+        candidates = set()
+        rarest = sorted(gramSet, key=lambda gram: (len(index[gram][0]), gram))
+        for gram in rarest[:prefixSize]:
+            gramLengths, gramIdxs = index[gram]
+            candidates.update(
+                gramIdxs[
+                    bisect_left(gramLengths, low) : bisect_right(gramLengths, high)
+                ]
+            )
+        if len(gramSet) < prefixSize:
+            for length in range(low, high + 1):
+                candidates.update(unfiltered.get(length, ()))
+        for idx2 in candidates:
+            if idx2 <= idx:
+                continue
+            gramSet2 = grams[idx2]
+            required = max(len(gramSet), len(gramSet2)) - threshold * q
+            if required > 0 and len(gramSet & gramSet2) < required:
+                continue
+            # characters only in one of the strings need an edit each
+            surplus = sum((chars[idx] - chars[idx2]).values())
+            if max(surplus, surplus - lengths[idx] + lengths[idx2]) > threshold:
+                continue
+            if boundedLevenshtein(species, speciesName[idx2], threshold) <= threshold:
+                pairs.append((idx, idx2))
+    pairs.sort()
+    return pairs
+
+
+def getPairDifferences(namePairs):
+    """
+    returns the list of differences between the strings of each pair,
+    as the added and removed characters of difflib.ndiff
+    """
+    differenceList = []
     for pair in namePairs:
         if len(pair[1]) < len(pair[0]):
             difference = difflib.ndiff(pair[1].lower(), pair[0].lower())
@@ -73,6 +201,31 @@ def getDifferences(scoreMatrix, speciesName, threshold):
                 continue
             tmp.append(diff)
         differenceList.append(tuple(tmp))
+    return differenceList
+
+
+def orderPair(species, species2):
+    # shorter name first, the second one on ties
+    if len(species) < len(species2):
+        return [species, species2]
+    return [species2, species]
+
+
+def getDifferences(scoreMatrix, speciesName, threshold):
+    """
+    given a list of strings and a scoreMatrix, return the list of difference between
+    those strings with a levenshtein difference of less than threshold
+    returns:
+        namePairs: list of tuples containing strings with distance <2
+        differenceList: list of differences between the tuples in namePairs
+    """
+    namePairs = []
+
+    for idx in range(0, len(scoreMatrix)):
+        for idx2 in range(0, len(scoreMatrix[idx])):
+            if scoreMatrix[idx][idx2] <= threshold and idx < idx2:
+                namePairs.append(orderPair(speciesName[idx], speciesName[idx2]))
+    differenceList = getPairDifferences(namePairs)
 
     return namePairs, differenceList
 
@@ -154,44 +307,80 @@ def defineEditDistanceMatrix3(speciesName, similarityThreshold=4, parallel=False
 
 def defineEditDistanceMatrix(speciesName, similarityThreshold=4, parallel=False):
     """
-    obtains a distance matrix and a pairs of elements that are close
-    in distance, along with the proposed differences
+    obtains the pairs of elements that are close in distance, along
+    with the proposed differences. only the pairs within
+    similarityThreshold are looked at, see similarPairs
     """
     differenceCounter = Counter()
-    futures = []
-    scoreMatrix = np.zeros((len(speciesName), len(speciesName)))
-    scoreMatrix2 = np.zeros((len(speciesName), len(speciesName)))
-    counter = range(0, len(speciesName))
-    """
-    for idx,species in enumerate(speciesName):
-    
-        futures = []
-        with concurrent.futures.ProcessPoolExecutor(max_workers=4) as executor:
-            futures.append(executor.submit(stringToSet, species,idx,scoreMatrix[idx],speciesName))
-        for future in concurrent.futures.as_completed(futures):
-            idx3,row = future.result()
-            counter.remove(idx3)
-            print(len(counter))
-            scoreMatrix[idx3] = row
-    """
-
-    for idx, species in enumerate(speciesName):
-        for idx2, species2 in enumerate(speciesName):
-            if species == species2 or scoreMatrix2[idx][idx2] != 0:
-                continue
-            # comparison = difflib.SequenceMatcher(None,speciesName[idx],speciesName[idx2]).quick_ratio()
-            comparison = levenshtein(speciesName[idx], speciesName[idx2])
-            scoreMatrix2[idx][idx2] = comparison
-            scoreMatrix2[idx2][idx] = scoreMatrix2[idx][idx2]
-
-    namePairs, differenceList = getDifferences(
-        scoreMatrix2, speciesName, similarityThreshold
-    )
+    namePairs = [
+        orderPair(speciesName[idx], speciesName[idx2])
+        for idx, idx2 in similarPairs(speciesName, similarityThreshold)
+    ]
+    differenceList = getPairDifferences(namePairs)
 
     differenceCounter.update(differenceList)
     return namePairs, differenceList, differenceCounter
 
 
+def patternPairs(speciesName, patterns, similarityThreshold, previous=None):
+    """
+    returns the sorted list of (idx, idx2, difference) of the pairs of
+    defineEditDistanceMatrix whose difference is one of the patterns.
+
+    previous is the (speciesName, pairs) of an earlier call with the same
+    patterns and threshold. the pairs of the names in both lists are
+    taken from it and only the pairs with a new name are compared, as
+    long as the names are unique, the old ones are in the same order and
+    at most half of them are new
+    """
+    names = {species: idx for idx, species in enumerate(speciesName)}
+    if previous is not None:
+        oldNames, oldPairs = previous
+        oldSet = set(oldNames)
+        kept = [names[species] for species in oldNames if species in names]
+        new = [idx for idx, species in enumerate(speciesName) if species not in oldSet]
+        if (
+            len(names) < len(speciesName)
+            or len(oldSet) < len(oldNames)
+            or kept != sorted(kept)
+            or len(new) * 2 > len(speciesName)
+        ):
+            previous = None
+    if previous is None:
+        pairs = []
+        for idx, idx2 in similarPairs(speciesName, similarityThreshold):
+            pair = orderPair(speciesName[idx], speciesName[idx2])
+            difference = getPairDifferences([pair])[0]
+            if difference in patterns:
+                pairs.append((idx, idx2, difference))
+        return pairs
+    pairs = [
+        (names[oldNames[idx]], names[oldNames[idx2]], difference)
+        for idx, idx2, difference in oldPairs
+        if oldNames[idx] in names and oldNames[idx2] in names
+    ]
+    new = set(new)
+    for idx in new:
+        for idx2 in range(len(speciesName)):
+            # the pairs of two new names are compared once
+            if idx2 == idx or (idx2 in new and idx2 < idx):
+                continue
+            first, second = sorted((idx, idx2))
+            if (
+                boundedLevenshtein(
+                    speciesName[first], speciesName[second], similarityThreshold
+                )
+                > similarityThreshold
+            ):
+                continue
+            pair = orderPair(speciesName[first], speciesName[second])
+            difference = getPairDifferences([pair])[0]
+            if difference in patterns:
+                pairs.append((first, second, difference))
+    pairs.sort()
+    return pairs
+
+
 def analyzeNamingConventions(
     speciesName, ontologyFile, ontologyDictionary={}, similarityThreshold=4
 ):
@@ -201,9 +390,21 @@ def analyzeNamingConventions(
     # ontology =  loadOntology(ontologyFile)
     ontology = ontologyFile
     finalDifferenceCounter = Counter()
-    namePairs, differenceList, differenceCounter = defineEditDistanceMatrix(
-        speciesName, similarityThreshold
+    # only the pairs whose difference is a pattern are classified, they
+    # are reused from the last atomization of the model, see SCTCache
+    stageKey = fingerprint(similarityThreshold, sorted(ontology["patterns"]))
+    pairs = patternPairs(
+        speciesName,
+        ontology["patterns"],
+        similarityThreshold,
+        sct_cache.previousResult("naming conventions", stageKey),
     )
+    sct_cache.record("naming conventions", stageKey, (list(speciesName), pairs))
+    namePairs = [
+        orderPair(speciesName[idx], speciesName[idx2]) for idx, idx2, _ in pairs
+    ]
+    differenceList = [difference for _, _, difference in pairs]
+    differenceCounter = Counter(differenceList)
 
     for element in differenceCounter:
         if element in ontology["patterns"]:
@@ -257,17 +458,7 @@ def databaseAnalysis(directory, outputFile):
 
         for species in model.getListOfSpecies():
             speciesName.append(species.getName())
-        scoreMatrix = np.zeros((len(speciesName), len(speciesName)))
-        for idx, species in enumerate(speciesName):
-            for idx2, species2 in enumerate(speciesName):
-                if species == species2 or scoreMatrix[idx][idx2] != 0:
-                    continue
-                scoreMatrix[idx][idx2] = levenshtein(
-                    speciesName[idx], speciesName[idx2]
-                )
-                scoreMatrix[idx2][idx] = scoreMatrix[idx][idx2]
-
-        namePairs, differenceList = getDifferences(scoreMatrix, speciesName, 3)
+        namePairs, differenceList, _ = defineEditDistanceMatrix(speciesName, 3)
         differenceCounter.update(differenceList)
         for key, element in zip(differenceList, namePairs):
             if key == ():
@@ -21,6 +21,9 @@ import re
 import marshal
 import functools
 import bionetgen.atomizer.utils.pathwaycommons as pwcm
+from bionetgen.atomizer.utils.webcache import web_cache, run_concurrently
+from bionetgen.atomizer.utils.profiler import profiler
+from bionetgen.atomizer.utils.sctcache import sct_cache, fingerprint, fileFingerprint
 from collections import Counter, defaultdict
 import itertools
 from .atomizerUtils import BindingException
@@ -34,29 +37,37 @@ def isInComplexWith(moleculeSet, parser=None):
     the pathway commons class to see if there's known binding information for those two
     """
     validPairs = []
+    moleculeSet = list(moleculeSet)
+    modelAnnotation = parser.extractModelAnnotation()
+    modelOrganism = (
+        modelAnnotation["BQB_OCCURS_IN"] if "BQB_OCCURS_IN" in modelAnnotation else None
+    )
+    simpleOrganism = (
+        [x.split("/")[-1] for x in modelOrganism] if modelOrganism else None
+    )
+    queries = []
     for element in moleculeSet:
         # if element[0] == element[1]:
         #    return []
 
         name1 = atoAux.getURIFromSBML(element[0], parser, ["uniprot", "go"])
         name2 = atoAux.getURIFromSBML(element[1], parser, ["uniprot", "go"])
-
-        modelAnnotation = parser.extractModelAnnotation()
-        modelOrganism = (
-            modelAnnotation["BQB_OCCURS_IN"]
-            if "BQB_OCCURS_IN" in modelAnnotation
-            else None
-        )
         molecule1 = name1[0].split("/")[-1] if name1 else element[0]
         molecule2 = name2[0].split("/")[-1] if name2 else element[1]
-
-        simpleOrganism = (
-            [x.split("/")[-1] for x in modelOrganism] if modelOrganism else None
-        )
-
-        bindingResults = pwcm.queryBioGridByName(
-            molecule1, molecule2, simpleOrganism, element[0], element[1]
-        )
+        queries.append((molecule1, molecule2, simpleOrganism, element[0], element[1]))
+    # every pair is queried at the same time, the loop below then gets
+    # the results from memory
+    pwcm.prefetch(pwcm.queryBioGridByName, queries)
+    pwcm.prefetch(
+        pwcm.queryBioGridByName,
+        [
+            (element[0], element[1], None, None, None)
+            for element, query in zip(moleculeSet, queries)
+            if not pwcm.queryBioGridByName(*query)
+        ],
+    )
+    for element, query in zip(moleculeSet, queries):
+        bindingResults = pwcm.queryBioGridByName(*query)
         if not bindingResults:
             bindingResults = pwcm.queryBioGridByName(
                 element[0], element[1], None, None, None
@@ -68,21 +79,21 @@ def isInComplexWith(moleculeSet, parser=None):
     # use pathway commosn as fallback since its much slower
     # it is stupid slow. Enable it as a not on default option
     if not validPairs:
+        queries = []
         for element in moleculeSet:
             # if element[0] == element[1]:
             #    return []
 
             name1 = atoAux.getURIFromSBML(element[0], parser, ["uniprot", "go"])
             name2 = atoAux.getURIFromSBML(element[1], parser, ["uniprot", "go"])
-            modelAnnotation = parser.extractModelAnnotation()
-            modelOrganism = (
-                modelAnnotation["BQB_OCCURS_IN"]
-                if "BQB_OCCURS_IN" in modelAnnotation
-                else None
-            )
-            bindingResults = pwcm.isInComplexWith(
-                [element[0], name1], [element[1], name2], organism=modelOrganism
-            )
+            queries.append(([element[0], name1], [element[1], name2]))
+        run_concurrently(
+            lambda query: pwcm.isInComplexWith(*query, organism=modelOrganism),
+            [(query,) for query in queries],
+            jobs=web_cache.pool.size,
+        )
+        for element, query in zip(moleculeSet, queries):
+            bindingResults = pwcm.isInComplexWith(*query, organism=modelOrganism)
             if bindingResults:
                 validPairs.append(element)
     return validPairs
@@ -1185,6 +1196,48 @@ def sanityCheck(database):
             removed.append(repeat[1])
 
 
+def atomizationKey(
+    parser,
+    database,
+    rules,
+    molecules,
+    configurationFile,
+    namingConventions,
+    speciesEquivalences,
+    bioGridFlag,
+):
+    """
+    fingerprint of everything the atomization of a model depends on: the
+    reactions and species as the atomizer reads them, the species and
+    model annotations, the configuration files and the options
+    """
+    annotations = parser.getFullAnnotation()
+    return fingerprint(
+        rules,
+        molecules,
+        sorted(
+            (name, sorted((qualifier, sorted(uris)) for qualifier, uris in x.items()))
+            for name, x in annotations.items()
+        ),
+        sorted(
+            (qualifier, sorted(uris))
+            for qualifier, uris in parser.extractModelAnnotation().items()
+        ),
+        [
+            fileFingerprint(x)
+            for x in (configurationFile, namingConventions, speciesEquivalences)
+        ],
+        bioGridFlag,
+        getattr(database, "pathwaycommons", None),
+        getattr(database, "forceModificationFlag", None),
+    )
+
+
+# database attributes that aren't part of a stored atomization because
+# they can't be pickled, the ones the caller sets up aren't either
+unstoredAttributes = ("parser", "sbmlAnalyzer", "annotationDict", "rawreactions")
+
+
 def transformMolecules(
     parser,
     database,
@@ -1204,21 +1257,50 @@ def transformMolecules(
         configurationFile:
         speciesEquivalences: predefined species
     """
-    """
-    import cProfile, pstats, StringIO
-    pr = cProfile.Profile()
-    pr.enable()
-    """
+    callerAttributes = set(vars(database)) - set(vars(st.Databases()))
     database.parser = parser
-    # ASS - Gotta pass in the option to memoize here
-    sctsolver = resolveSCT.SCTSolver(database, memoizedResolver)
-    database = sctsolver.createSpeciesCompositionGraph(
+    _, rules, _ = parser.getReactions(atomize=True, database=database)
+    molecules, _, _, _, _, _ = parser.getSpecies()
+    # a model that was atomized before with the same species, reactions
+    # and configuration gets the stored atomization, otherwise the
+    # stages reuse what they can from the last run of the same model
+    key = atomizationKey(
         parser,
+        database,
+        rules,
+        molecules,
         configurationFile,
         namingConventions,
-        speciesEquivalences=speciesEquivalences,
-        bioGridFlag=bioGridFlag,
+        speciesEquivalences,
+        bioGridFlag,
     )
+    lineage = fingerprint(getattr(database, "inputFile", None) or parser.model.getId())
+    atomization = sct_cache.begin(lineage, key)
+    if atomization is not None:
+        logMess(
+            "INFO:SCT061",
+            "Reusing the stored atomization of a model with the same species, reactions and configuration",
+        )
+        for name, value in atomization["database"].items():
+            setattr(database, name, value)
+        database.annotationDict = parser.getFullAnnotation()
+        for molecule in database.translator.keys():
+            if molecule not in database.parser.used_molecules:
+                database.parser.used_molecules.append(molecule)
+        return database.translator, atomization["onlySynDec"]
+
+    # ASS - Gotta pass in the option to memoize here
+    sctsolver = resolveSCT.SCTSolver(database, memoizedResolver)
+    with profiler.stage("SCT build"):
+        database = sctsolver.createSpeciesCompositionGraph(
+            parser,
+            configurationFile,
+            namingConventions,
+            speciesEquivalences=speciesEquivalences,
+            bioGridFlag=bioGridFlag,
+            rules=rules,
+            molecules=molecules,
+        )
 
     for element in database.artificialEquivalenceTranslator:
         if element not in database.eequivalenceTranslator:
@@ -1272,33 +1354,36 @@ def transformMolecules(
     database.weights = sorted(
         database.weights, key=lambda rule: (rule[1], len(rule[0]))
     )
-    atomize(
-        database.prunnedDependencyGraph,
-        database.weights,
-        database.translator,
-        database.reactionProperties,
-        database.eequivalenceTranslator2,
-        bioGridFlag,
-        database.sbmlAnalyzer,
-        database,
-        parser,
-    )
+    with profiler.stage("molecule creation"):
+        atomize(
+            database.prunnedDependencyGraph,
+            database.weights,
+            database.translator,
+            database.reactionProperties,
+            database.eequivalenceTranslator2,
+            bioGridFlag,
+            database.sbmlAnalyzer,
+            database,
+            parser,
+        )
+        propagateChanges(database.translator, database.prunnedDependencyGraph)
+
+        # check for isomorphism
+        sanityCheck(database)
     onlySynDec = (
         len([x for x in database.classifications if x not in ["Generation", "Decay"]])
         == 0
     )
-    propagateChanges(database.translator, database.prunnedDependencyGraph)
-
-    # check for isomorphism
-    sanityCheck(database)
-    """
-    pr.disable()
-    s = StringIO.StringIO()
-    sortby = 'cumulative'
-    ps = pstats.Stats(pr, stream=s).sort_stats(sortby)
-    ps.print_stats(10)
-    print s.getvalue()
-    """
+    sct_cache.commit(
+        {
+            "database": {
+                name: value
+                for name, value in vars(database).items()
+                if name not in unstoredAttributes and name not in callerAttributes
+            },
+            "onlySynDec": onlySynDec,
+        }
+    )
     # database.assumptions = deepcopy(assumptions)
     # assumptions.clear()
     # ASS: Adding atomized new molecules to the molecule list
@@ -4,9 +4,138 @@ from . import analyzeSBML
 from collections import Counter, defaultdict
 import itertools
 from copy import deepcopy, copy
-from bionetgen.atomizer.utils.util import logMess, memoize, memoizeMapped
+from bionetgen.atomizer.utils.util import logMess, memoize, memoizeMapped, LRUCache
 from . import atomizationAux as atoAux
 import bionetgen.atomizer.utils.pathwaycommons as pwcm
+from bionetgen.atomizer.utils.profiler import profiler
+
+
+class DependencyGraphIndex:
+    """
+    Resolution tables for one version of a species composition graph.
+    The graph is explored with Tarjan's strongly connected components
+    algorithm, which finishes the components in reverse topological
+    order. Species that can't reach a cycle are unrolled right when
+    their component finishes, from the already unrolled species they
+    depend on, so every species is only unrolled once. Species that
+    can reach a cycle are flagged so the caller can handle them.
+
+    Arguments
+    ---------
+    graph : dict
+        species composition graph, {species: [[candidate, ...], ...]}
+
+    Attributes
+    ----------
+    key : int
+        hash of the graph, the same for graphs with the same content
+    cyclic : dict
+        for every explored species, if it can reach a cycle
+
+    Methods
+    -------
+    resolve(reactant, withModifications=False) : list
+        the unrolled molecule types of the reactant, or the 1:1
+        modifications on the way to them, as
+        SCTSolver.resolveDependencyGraph returns them. None if the
+        reactant can reach a cycle.
+    """
+
+    def __init__(self, graph):
+        # a snapshot, the graph is changed in place by the solver
+        self.options = {}
+        self.leaves = set()
+        for node, options in graph.items():
+            if options == [] or options == [[node]]:
+                self.leaves.add(node)
+            else:
+                self.options[node] = tuple(tuple(option) for option in options)
+        self.key = hash((frozenset(self.options.items()), frozenset(self.leaves)))
+        self.cyclic = {}
+        self.resolved = {False: {}, True: {}}
+        self._index = {}
+
+    def children(self, node):
+        if node not in self.options:
+            return ()
+        return [element for option in self.options[node] for element in option]
+
+    def explore(self, root):
+        # iterative Tarjan, the graph can be deeper than the recursion limit
+        lowlink = {}
+        stack = []
+        onStack = set()
+
+        def visit(node):
+            self._index[node] = lowlink[node] = len(self._index)
+            stack.append(node)
+            onStack.add(node)
+            work.append((node, iter(self.children(node))))
+
+        work = []
+        visit(root)
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in self._index:
+                    visit(child)
+                    break
+                elif child in onStack:
+                    lowlink[node] = min(lowlink[node], self._index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == self._index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        onStack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    self.finish(component)
+
+    def finish(self, component):
+        # every species the component depends on is finished already
+        members = set(component)
+        cyclic = len(component) > 1 or component[0] in self.children(component[0])
+        if not cyclic:
+            cyclic = any(
+                self.cyclic[child]
+                for member in component
+                for child in self.children(member)
+                if child not in members
+            )
+        for member in component:
+            self.cyclic[member] = cyclic
+        if cyclic:
+            return
+        node = component[0]
+        if node not in self.options:
+            self.resolved[False][node] = [[node]]
+            self.resolved[True][node] = []
+            return
+        for withModifications, resolved in self.resolved.items():
+            result = []
+            for option in self.options[node]:
+                for element in option:
+                    result.extend(resolved[element])
+                if len(option) == 1 and withModifications and option[0] != node:
+                    result.append((option[0], node))
+            resolved[node] = result
+
+    def resolve(self, reactant, withModifications=False):
+        if reactant not in self.cyclic:
+            self.explore(reactant)
+        if self.cyclic[reactant]:
+            return None
+        # the tables are shared, callers get their own lists
+        return [
+            list(element) if isinstance(element, list) else element
+            for element in self.resolved[withModifications][reactant]
+        ]
 
 
 class SCTSolver:
@@ -15,6 +144,8 @@ class SCTSolver:
         self.memoizedResolver = memoizedResolver
         self.graph_map = {}
         self.dg = None
+        # indexes of the last few graph versions
+        self.graphIndexes = LRUCache("SCTSolver.graphIndexes", maxsize=8)
 
     def createSpeciesCompositionGraph(
         self,
@@ -23,33 +154,39 @@ class SCTSolver:
         namingConventions,
         speciesEquivalences=None,
         bioGridFlag=False,
+        rules=None,
+        molecules=None,
     ):
         """
         Main method for the SCT creation.
 
         It first does stoichiometry analysis, then lexical...
+        rules and molecules are read from the parser unless they're given
         """
 
-        _, rules, _ = parser.getReactions(atomize=True, database=self.database)
-        molecules, _, _, _, _, _ = parser.getSpecies()
-        self.database.sbmlAnalyzer = analyzeSBML.SBMLAnalyzer(
-            parser,
-            configurationFile,
-            namingConventions,
-            speciesEquivalences,
-            conservationOfMass=True,
-        )
+        if rules is None:
+            _, rules, _ = parser.getReactions(atomize=True, database=self.database)
+        if molecules is None:
+            molecules, _, _, _, _, _ = parser.getSpecies()
+        with profiler.stage("naming conventions"):
+            self.database.sbmlAnalyzer = analyzeSBML.SBMLAnalyzer(
+                parser,
+                configurationFile,
+                namingConventions,
+                speciesEquivalences,
+                conservationOfMass=True,
+            )
 
-        # classify reactions
-        (
-            self.database.classifications,
-            equivalenceTranslator,
-            self.database.eequivalenceTranslator,
-            indirectEquivalenceTranslator,
-            adhocLabelDictionary,
-            lexicalDependencyGraph,
-            userEquivalenceTranslator,
-        ) = self.database.sbmlAnalyzer.classifyReactions(rules, molecules, {})
+            # classify reactions
+            (
+                self.database.classifications,
+                equivalenceTranslator,
+                self.database.eequivalenceTranslator,
+                indirectEquivalenceTranslator,
+                adhocLabelDictionary,
+                lexicalDependencyGraph,
+                userEquivalenceTranslator,
+            ) = self.database.sbmlAnalyzer.classifyReactions(rules, molecules, {})
         self.database.reactionProperties = (
             self.database.sbmlAnalyzer.getReactionProperties()
         )
@@ -233,17 +370,18 @@ class SCTSolver:
             ]
         )
         # recalculate 1:1 equivalences now with binding information
-        (
-            _,
-            _,
-            self.database.eequivalenceTranslator2,
-            _,
-            adhocLabelDictionary,
-            _,
-            _,
-        ) = self.database.sbmlAnalyzer.classifyReactions(
-            rules, molecules, self.database.dependencyGraph
-        )
+        with profiler.stage("naming conventions"):
+            (
+                _,
+                _,
+                self.database.eequivalenceTranslator2,
+                _,
+                adhocLabelDictionary,
+                _,
+                _,
+            ) = self.database.sbmlAnalyzer.classifyReactions(
+                rules, molecules, self.database.dependencyGraph
+            )
         self.database.reactionProperties.update(adhocLabelDictionary)
         # update catalysis equivalences
         # catalysis reactions
@@ -711,17 +849,18 @@ class SCTSolver:
             )
 
         # initialize and remove zero elements
-        (
-            self.database.prunnedDependencyGraph,
-            self.database.weights,
-            unevenElementDict,
-            self.database.artificialEquivalenceTranslator,
-        ) = self.consolidateDependencyGraph(
-            self.database.dependencyGraph,
-            equivalenceTranslator,
-            self.database.eequivalenceTranslator,
-            self.database.sbmlAnalyzer,
-        )
+        with profiler.stage("SCT resolution"):
+            (
+                self.database.prunnedDependencyGraph,
+                self.database.weights,
+                unevenElementDict,
+                self.database.artificialEquivalenceTranslator,
+            ) = self.consolidateDependencyGraph(
+                self.database.dependencyGraph,
+                equivalenceTranslator,
+                self.database.eequivalenceTranslator,
+                self.database.sbmlAnalyzer,
+            )
         return self.database
 
     def bindingReactionsAnalysis(self, dependencyGraph, reaction, classification):
@@ -972,6 +1111,8 @@ class SCTSolver:
             modifiedElementsPerCandidate = []
             unevenElements = []
             candidateDict = {}
+            # the graph doesn't change here, so all candidates share one index
+            index = self.graphIndex(dependencyGraph)
             for individualAnswer in candidates:
                 try:
                     tmpAnswer = []
@@ -987,11 +1128,11 @@ class SCTSolver:
                             continue
                         # associate elements in the candidate description with their
                         # modified version
-                        rootChemical = self.resolveDependencyGraph(
-                            dependencyGraph, chemical
+                        rootChemical = self.resolveWithIndex(
+                            index, dependencyGraph, chemical, False
                         )
-                        mod = self.resolveDependencyGraph(
-                            dependencyGraph, chemical, True
+                        mod = self.resolveWithIndex(
+                            index, dependencyGraph, chemical, True
                         )
                         if mod != []:
                             modifiedElements.extend(mod)
@@ -1244,6 +1385,20 @@ class SCTSolver:
                         # modificationCandidates = {}
                         # if modificationCandidates == {}:
 
+                        # look up the active sites of all candidates at once
+                        activeQueries = []
+                        for individualCandidate in tmpCandidates:
+                            for tmpCandidate in individualCandidate:
+                                uniprotkey = atoAux.getURIFromSBML(
+                                    tmpCandidate, self.database.parser, ["uniprot"]
+                                )
+                                if len(uniprotkey) > 0:
+                                    activeQueries.append(
+                                        (uniprotkey[0].split("/")[-1], None)
+                                    )
+                                elif len(tmpCandidate) >= 3:
+                                    activeQueries.append((tmpCandidate, None))
+                        pwcm.prefetch(pwcm.queryActiveSite, activeQueries)
                         activeCandidates = []
                         for individualCandidate in tmpCandidates:
                             for tmpCandidate in individualCandidate:
@@ -1726,10 +1881,12 @@ class SCTSolver:
         [['A', 2], ['C', 2], ['B', 2], ['B_C', 5], ['A_B', 5], ['A_B_C', 13]]
         """
         weights = []
+        # the graph doesn't change here, so all species share one index
+        index = self.graphIndex(dependencyGraph)
         for element in dependencyGraph:
-            path = self.resolveDependencyGraph(dependencyGraph, element)
+            path = self.resolveWithIndex(index, dependencyGraph, element, False)
             try:
-                path2 = self.resolveDependencyGraph(dependencyGraph, element, True)
+                path2 = self.resolveWithIndex(index, dependencyGraph, element, True)
             except atoAux.CycleError:
                 path2 = []
             # ASS: Swapping to iterative version of the function
@@ -1740,42 +1897,24 @@ class SCTSolver:
         weights = sorted(weights, key=lambda rule: (rule[1], len(rule[0])))
         return weights
 
-    # ASS: New method to make hashes from graphs. Some key points
-    # 1) sorting is done to ensure same graph gives the same key, consistently
-    # 2) python internal hashing function is used for the hashing
-    # 3) should be very collision proof
     def make_key_from_graph(self, graph):
-        hashable_tuples = []
-        # If graph is empty just return the empty tuple result
-        if len(graph) == 0:
-            return marshal.dumps(hashable_tuples)
-        # So we don't modify original graph
-        tmpGraph = deepcopy(graph)
-        # This turns the graph into a traditional graph implementation
-        # where there are no edges that go to nodes that do not exist in the
-        # graph, I'm making sure every node exists in the graph itself
-        all_elems = set(
-            [item[0] for sublist in tmpGraph.values() for item in sublist if item]
-        )
-        for elem in all_elems:
-            try:
-                a = tmpGraph[elem]
-            except KeyError:
-                tmpGraph[elem] = []
-        # Now we should have a traditional graph implementation
-        # I also want to unroll every element to turn this into a hashable
-        # tuple of tuples type deal
-        for key in sorted(tmpGraph):
-            tmpGraph[key] = functools.reduce(
-                lambda x, y: x + y, sorted(tmpGraph[key]), []
-            )
-        # Now we can turn this into a proper hashable object
-        for key in sorted(tmpGraph):
-            hashable_tuples.append((key, tuple(tmpGraph[key])))
-        # Turn the list into tuples to it's hashable
-        hashable_tuples = tuple(hashable_tuples)
-        # return hash
-        return hashable_tuples.__hash__()
+        """
+        hash of a species composition graph, the same for graphs with
+        the same content
+        """
+        return DependencyGraphIndex(graph).key
+
+    def graphIndex(self, dependencyGraph):
+        """
+        resolution index of the current version of a species
+        composition graph, shared by all queries on that version
+        """
+        index = DependencyGraphIndex(dependencyGraph)
+        cached = self.graphIndexes.get(index.key)
+        if cached is not None:
+            return cached
+        self.graphIndexes.put(index.key, index)
+        return index
 
     def resolveDependencyGraph(
         self, dependencyGraph, reactant, withModifications=False
@@ -1805,7 +1944,22 @@ class SCTSolver:
         >>> sorted(dummy.resolveDependencyGraph(dependencyGraph2,'A_B_C'))
         [['A'], ['A'], ['B'], ['B'], ['C'], ['C']]
         """
-        gkey = self.make_key_from_graph(dependencyGraph)
+        return self.resolveWithIndex(
+            self.graphIndex(dependencyGraph),
+            dependencyGraph,
+            reactant,
+            withModifications,
+        )
+
+    def resolveWithIndex(self, index, dependencyGraph, reactant, withModifications):
+        topCandidate = index.resolve(reactant, withModifications)
+        if topCandidate is not None:
+            return topCandidate
+        # species that can reach a cycle are unrolled along every path,
+        # cutting the path where it repeats a species
+        if withModifications:
+            raise atoAux.CycleError([reactant])
+        gkey = index.key
         try:
             self.dg = self.graph_map[gkey]
         except KeyError:
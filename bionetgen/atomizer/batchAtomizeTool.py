@@ -0,0 +1,227 @@
+import multiprocessing, os, sys, time, traceback
+from multiprocessing.connection import wait
+
+from bionetgen.core.utils.logging import BNGLogger
+
+# columns of the summary table
+SUMMARY_FIELDS = [
+    "input",
+    "output",
+    "status",
+    "seconds",
+    "reactions",
+    "species",
+    "error",
+]
+
+
+def findSBMLFiles(directory):
+    """
+    SBML files in a directory, all .xml and .sbml files
+    """
+    return sorted(
+        os.path.join(directory, f)
+        for f in os.listdir(directory)
+        if f.endswith((".xml", ".sbml")) and os.path.isfile(os.path.join(directory, f))
+    )
+
+
+def _atomizeOne(inputFile, outputFile, options, conn):
+    # runs in its own process, everything the atomizer prints or logs
+    # goes to the log file of this input file
+    logFile = outputFile + ".log"
+    with open(logFile, "w") as f:
+        os.dup2(f.fileno(), 1)
+        os.dup2(f.fileno(), 2)
+    sys.stdout = os.fdopen(1, "w", buffering=1)
+    sys.stderr = os.fdopen(2, "w", buffering=1)
+    result = {"status": "failed", "reactions": "", "species": "", "error": ""}
+    try:
+        from bionetgen.atomizer import AtomizeTool
+        from bionetgen.atomizer.utils.util import logMess
+
+        # module level log state starts empty for every file
+        logMess.log = []
+        logMess.counter = -1
+        options = dict(options)
+        options["output"] = outputFile
+        # profiles go next to the output of every file
+        if options.get("profile"):
+            options["profile"] = True
+        if options.get("profile_stats"):
+            options["profile_stats"] = outputFile + ".prof"
+        returnArray = AtomizeTool(input_file=inputFile, options_dict=options).run()
+        if returnArray:
+            result["status"] = "ok"
+            result["reactions"] = returnArray.rlength
+            result["species"] = returnArray.slength
+        else:
+            result["error"] = "no translation, see the log file"
+    except Exception as e:
+        traceback.print_exc()
+        result["error"] = f"{type(e).__name__}: {e}"
+    sys.stdout.flush()
+    sys.stderr.flush()
+    conn.send(result)
+    conn.close()
+
+
+class BatchAtomizeTool:
+    """
+    Atomizes many SBML files, each in its own process with up to
+    jobs files at a time. Every file gets a fresh atomizer state and its
+    own log file next to the BNGL output, files that take longer than
+    timeout seconds are stopped. The largest files are started first
+    so a long one doesn't end up running alone at the end.
+
+    Usage: BatchAtomizeTool(["a.xml", "b.xml"], "out", jobs=4).run()
+           BatchAtomizeTool(findSBMLFiles("models"), "out", timeout=600).run()
+
+    Arguments
+    ---------
+    input_files : list[str]
+        paths to the SBML files
+    output_dir : str
+        folder the BNGL files, logs and summary are written to, the
+        input files need different names without their extension
+    jobs : int
+        number of files atomized at the same time
+    timeout : float
+        (optional) seconds after which a file is stopped
+    options_dict : dict
+        AtomizeTool options used for every file, e.g. {"atomize": True}
+
+    Attributes
+    ----------
+    results : list[dict]
+        one result per input file in the order of input_files, with
+        the fields of SUMMARY_FIELDS. status is "ok", "failed" or
+        "timeout"
+    summary_file : str
+        path of the tab separated summary table
+
+    Methods
+    -------
+    run() : list[dict]
+        atomizes the files, writes the summary and returns the results
+    write_summary() : None
+        writes the results as a tab separated table to summary_file
+    """
+
+    def __init__(
+        self,
+        input_files,
+        output_dir,
+        jobs=1,
+        timeout=None,
+        options_dict=None,
+        app=None,
+    ):
+        self.app = app
+        self.logger = BNGLogger(app=self.app)
+        self.input_files = list(input_files)
+        self.output_dir = output_dir
+        self.jobs = max(1, jobs)
+        self.timeout = timeout
+        self.options = dict(options_dict) if options_dict is not None else {}
+        # a.xml and a.sbml would overwrite each other's output
+        outputs = {}
+        for inputFile in self.input_files:
+            outputs.setdefault(self._output_file(inputFile), []).append(inputFile)
+        clashes = [files for files in outputs.values() if len(files) > 1]
+        if clashes:
+            raise ValueError(
+                "Input files with the same name would write the same output: "
+                + "; ".join(", ".join(files) for files in clashes)
+            )
+        self.summary_file = os.path.join(output_dir, "atomize_summary.tsv")
+        self.results = []
+
+    def _output_file(self, inputFile):
+        name = os.path.splitext(os.path.basename(inputFile))[0]
+        return os.path.join(self.output_dir, name + ".bngl")
+
+    def _start(self, inputFile):
+        outputFile = self._output_file(inputFile)
+        parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(
+            target=_atomizeOne,
+            args=(inputFile, outputFile, self.options, child_conn),
+            daemon=True,
+        )
+        process.start()
+        # only the child writes, so the parent sees EOF if it dies
+        child_conn.close()
+        self.logger.debug(
+            f"started atomizing {inputFile}",
+            loc=f"{__file__} : BatchAtomizeTool._start()",
+        )
+        return parent_conn, (process, inputFile, outputFile, time.time())
+
+    def _finish(self, results, info, result):
+        process, inputFile, outputFile, start = info
+        result["input"] = inputFile
+        result["output"] = outputFile
+        result["seconds"] = round(time.time() - start, 2)
+        results[inputFile] = result
+        self.logger.info(
+            f"{inputFile}: {result['status']} in {result['seconds']} s",
+            loc=f"{__file__} : BatchAtomizeTool.run()",
+        )
+
+    def run(self):
+        if not os.path.isdir(self.output_dir):
+            os.makedirs(self.output_dir)
+        # largest files first
+        pending = sorted(self.input_files, key=os.path.getsize, reverse=True)
+        running = {}
+        results = {}
+        while pending or running:
+            while pending and len(running) < self.jobs:
+                conn, info = self._start(pending.pop(0))
+                running[conn] = info
+            wait_for = None
+            if self.timeout is not None:
+                first_deadline = min(info[3] for info in running.values())
+                wait_for = max(0, first_deadline + self.timeout - time.time())
+            for conn in wait(list(running), timeout=wait_for):
+                info = running.pop(conn)
+                try:
+                    result = conn.recv()
+                except EOFError:
+                    result = None
+                conn.close()
+                info[0].join()
+                if result is None:
+                    # the process died without a result, e.g. a crash
+                    # in libsbml
+                    result = {
+                        "status": "failed",
+                        "error": f"process exited with code {info[0].exitcode}",
+                    }
+                self._finish(results, info, result)
+            if self.timeout is not None:
+                now = time.time()
+                for conn, info in list(running.items()):
+                    if now - info[3] >= self.timeout:
+                        info[0].kill()
+                        info[0].join()
+                        conn.close()
+                        del running[conn]
+                        result = {
+                            "status": "timeout",
+                            "error": f"stopped after {self.timeout} s",
+                        }
+                        self._finish(results, info, result)
+        self.results = [results[inputFile] for inputFile in self.input_files]
+        self.write_summary()
+        return self.results
+
+    def write_summary(self):
+        with open(self.summary_file, "w") as f:
+            f.write("\t".join(SUMMARY_FIELDS) + "\n")
+            for result in self.results:
+                row = [str(result.get(field, "")) for field in SUMMARY_FIELDS]
+                # keep one row per file
+                row = [value.replace("\t", " ").replace("\n", " ") for value in row]
+                f.write("\t".join(row) + "\n")
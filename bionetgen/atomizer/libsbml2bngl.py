@@ -28,6 +28,7 @@ from bionetgen.atomizer.utils.util import (
     TranslationException,
 )
 from bionetgen.atomizer.utils import consoleCommands
+from bionetgen.atomizer.utils.profiler import profiler
 from bionetgen.atomizer.sbml2bngl import SBML2BNGL
 
 # from biogrid import loadBioGridDict as loadBioGrid
@@ -590,7 +591,8 @@ def postAnalysisHelper(outputFile, bngLocation, database):
     if outputDir != "":
         retval = os.getcwd()
         os.chdir(outputDir)
-    consoleCommands.bngl2xml(outputFile.split(os.sep)[-1])
+    with profiler.stage("BNG2.pl"):
+        consoleCommands.bngl2xml(outputFile.split(os.sep)[-1])
     if outputDir != "":
         os.chdir(retval)
     bngxmlFile = ".".join(outputFile.split(".")[:-1]) + "_bngxml.xml"
@@ -622,22 +624,24 @@ def postAnalyzeFile(
     postAnalysisHelper(outputFile, bngLocation, database)
 
     # recreate file using information from the post analysis
-    returnArray = analyzeHelper(
-        database.document,
-        database.reactionDefinitions,
-        database.useID,
-        outputFile,
-        database.speciesEquivalence,
-        database.atomize,
-        database.translator,
-        database,
-        replaceLocParams=replaceLocParams,
-        obs_map_file=obs_map_file,
-    )
-    with open(outputFile, "w", encoding="UTF-8") as f:
-        f.write(returnArray.finalString)
+    with profiler.stage("rule writing"):
+        returnArray = analyzeHelper(
+            database.document,
+            database.reactionDefinitions,
+            database.useID,
+            outputFile,
+            database.speciesEquivalence,
+            database.atomize,
+            database.translator,
+            database,
+            replaceLocParams=replaceLocParams,
+            obs_map_file=obs_map_file,
+        )
+        with open(outputFile, "w", encoding="UTF-8") as f:
+            f.write(returnArray.finalString)
     # recompute bng-xml file
-    consoleCommands.bngl2xml(outputFile)
+    with profiler.stage("BNG2.pl"):
+        consoleCommands.bngl2xml(outputFile)
     bngxmlFile = ".".join(outputFile.split(".")[:-1]) + "_bngxml.xml"
     # recompute context information
     contextAnalysis = postAnalysis.ModelLearning(bngxmlFile)
@@ -701,11 +705,6 @@ def analyzeFile(
     """
     one of the library's main entry methods. Process data from a file
     """
-    """
-    import cProfile, pstats, StringIO
-    pr = cProfile.Profile()
-    pr.enable()
-    """
     # TODO: replace this setup log with our own logging system
     # setupLog(
     #     outputFile + ".log", getattr(logging, logLevel.upper()), quietMode=quietMode
@@ -713,29 +712,32 @@ def analyzeFile(
 
     logMess.log = []
     logMess.counter = -1
-    reader = libsbml.SBMLReader()
-    document = reader.readSBMLFromFile(bioNumber)
+    with profiler.stage("read SBML"):
+        reader = libsbml.SBMLReader()
+        document = reader.readSBMLFromFile(bioNumber)
 
-    if document.getModel() == None:
-        print(
-            "l714 - File {0} could not be recognized as a valid SBML file".format(
-                bioNumber
+        if document.getModel() == None:
+            print(
+                "l714 - File {0} could not be recognized as a valid SBML file".format(
+                    bioNumber
+                )
             )
+            return
+        parser = SBML2BNGL(
+            document.getModel(),
+            useID,
+            replaceLocParams=replaceLocParams,
+            obs_map_file=obs_map_file,
         )
-        return
-    parser = SBML2BNGL(
-        document.getModel(),
-        useID,
-        replaceLocParams=replaceLocParams,
-        obs_map_file=obs_map_file,
-    )
-    parser.setConversion(not noConversion)
+        parser.setConversion(not noConversion)
     database = structures.Databases()
     database.assumptions = defaultdict(set)
     database.forceModificationFlag = True
     database.pathwaycommons = pathwaycommons
     database.ignore = ignore
     database.assumptions = defaultdict(set)
+    # atomizations of earlier versions of the file are reused, see SCTCache
+    database.inputFile = os.path.abspath(bioNumber)
 
     bioGridDict = {}
     if bioGrid:
@@ -748,15 +750,16 @@ def analyzeFile(
     translator = {}
     try:
         if atomize:
-            translator, onlySynDec = mc.transformMolecules(
-                parser,
-                database,
-                reactionDefinitions,
-                namingConventions,
-                speciesEquivalence,
-                bioGrid,
-                memoizedResolver,
-            )
+            with profiler.stage("atomization"):
+                translator, onlySynDec = mc.transformMolecules(
+                    parser,
+                    database,
+                    reactionDefinitions,
+                    namingConventions,
+                    speciesEquivalence,
+                    bioGrid,
+                    memoizedResolver,
+                )
     except TranslationException as e:
         print(
             "Found an error in {0}. Check log for more details. Use -I to ignore translation errors".format(
@@ -770,14 +773,6 @@ def analyzeFile(
         return
 
     # process other sections of the sbml file (functions reactions etc.)
-    """
-    pr.disable()
-    s = StringIO.StringIO()
-    sortby = 'cumulative'
-    ps = pstats.Stats(pr, stream=s).sort_stats(sortby)
-    ps.print_stats(10)
-    print(s.getvalue())
-    """
     database.document = document
     database.reactionDefinitions = reactionDefinitions
     database.useID = useID
@@ -785,21 +780,22 @@ def analyzeFile(
     database.atomize = atomize
     database.isConversion = not noConversion
 
-    returnArray = analyzeHelper(
-        document,
-        reactionDefinitions,
-        useID,
-        outputFile,
-        speciesEquivalence,
-        atomize,
-        translator,
-        database,
-        replaceLocParams=replaceLocParams,
-        obs_map_file=obs_map_file,
-    )
+    with profiler.stage("rule writing"):
+        returnArray = analyzeHelper(
+            document,
+            reactionDefinitions,
+            useID,
+            outputFile,
+            speciesEquivalence,
+            atomize,
+            translator,
+            database,
+            replaceLocParams=replaceLocParams,
+            obs_map_file=obs_map_file,
+        )
 
-    with open(outputFile, "w", encoding="UTF-8") as f:
-        f.write(returnArray.finalString)
+        with open(outputFile, "w", encoding="UTF-8") as f:
+            f.write(returnArray.finalString)
     # with open('{0}.dict'.format(outputFile), 'wb') as f:
     #    pickle.dump(returnArray[-1], f)
     model = returnArray.model
@@ -966,9 +962,10 @@ def analyzeHelper(
     parser.setConversion(database.isConversion)
     #
     param, zparam = parser.getParameters()
+    paramNames = set(x.split(" ")[0] for x in param)
     rawSpecies = {}
     for species in parser.model.getListOfSpecies():
-        rawtemp = parser.getRawSpecies(species, [x.split(" ")[0] for x in param])
+        rawtemp = parser.getRawSpecies(species, paramNames)
         rawSpecies[rawtemp["identifier"]] = rawtemp
     parser.reset()
 
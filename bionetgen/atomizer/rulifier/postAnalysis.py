@@ -6,24 +6,10 @@ import itertools
 from copy import copy
 from bionetgen.atomizer.utils import readBNGXML
 
-import functools
-import marshal
+from bionetgen.atomizer.utils.util import pmemoize as memoize
 
 
-def memoize(obj):
-    cache = obj.cache = {}
-
-    @functools.wraps(obj)
-    def memoizer(*args, **kwargs):
-        key = marshal.dumps([args, kwargs])
-        if key not in cache:
-            cache[key] = obj(*args, **kwargs)
-        return cache[key]
-
-    return memoizer
-
-
-@memoize
+@memoize(maxsize=10000)
 def resolveEntry(dependencyGraph, moleculeSet):
     """
     resolve an entry to its basic components according to dependency graph
@@ -12,7 +12,7 @@ import re, sympy
 from collections import Counter
 from collections import defaultdict
 import math as pymath
-from bionetgen.atomizer.utils.util import logMess, TranslationException
+from bionetgen.atomizer.utils.util import logMess, TranslationException, LRUCache
 import libsbml
 from bionetgen.atomizer.bngModel import bngModel
 
@@ -22,6 +22,11 @@ from sympy.abc import _clash
 from sympy.printing.str import StrPrinter
 from sympy.core.sympify import SympifyError
 
+try:
+    import symengine
+except ImportError:
+    symengine = None
+
 # Define 2 and 3 argument functions
 # for sympy parsing
 class sympyPiece(Function):
@@ -122,6 +127,118 @@ def unrollSBMLFunction(function, sbmlFunctions):
     return function
 
 
+class ExpressionCache:
+    """
+    Sympy work done on the kinetic laws of a model. Reactions often
+    share rate laws and function definitions, so the expression parsed
+    from every formula and the results of expanding, splitting and
+    simplifying expressions are kept and reused instead of being
+    computed for every reaction. Polynomials with powers of sums are
+    expanded with symengine if it's installed.
+
+    Usage: cache = ExpressionCache(all_syms)
+           expr = cache.parse("k1 * A * B - k2 * C")
+           cache.simplify(cache.expand(expr))
+
+    Arguments
+    ---------
+    symbols : dict
+        the names sympify uses for the formulas, every name in a formula
+        has to be in it before the formula is parsed
+    maxsize : int
+        maximum number of expressions and results kept
+    backend : str
+        (optional) "symengine" or "sympy", the expansion backend.
+        Defaults to symengine if it can be imported.
+
+    Methods
+    -------
+    cached(operation, expr, function) : object
+        function(expr), computed once for every operation name and
+        expression
+    parse(form) : sympy.Expr
+        sympified formula, formulas that only differ in white space
+        share an entry
+    atoms(expr) : set
+        the atoms of an expression
+    expand(expr) : sympy.Expr
+        sympy.expand of the expression
+    numer_denom(expr) : tuple
+        numerator and denominator of the expression
+    simplify(expr) : sympy.Expr
+        the expression with its numbers made exact, evaluated and
+        simplified
+    """
+
+    # nodes symengine can expand with the same result as sympy
+    polynomial_types = (
+        sympy.Symbol,
+        sympy.Number,
+        sympy.Add,
+        sympy.Mul,
+        sympy.Pow,
+    )
+
+    def __init__(self, symbols, maxsize=10000, backend=None) -> None:
+        self.symbols = symbols
+        if backend is None:
+            backend = "symengine" if symengine is not None else "sympy"
+        self.backend = backend
+        self.expressions = LRUCache("SBML2BNGL.expressions", maxsize=maxsize)
+        self.results = LRUCache("SBML2BNGL.expressionResults", maxsize=maxsize)
+
+    def cached(self, operation, expr, function):
+        # older sympy versions consider 2 and 2.0 equal, the printed
+        # form keeps them apart
+        key = (operation, expr, str(expr))
+        result = self.results.get(key, self)
+        if result is self:
+            result = function(expr)
+            self.results.put(key, result)
+        return result
+
+    def parse(self, form):
+        key = "".join(form.split())
+        expr = self.expressions.get(key)
+        if expr is None:
+            expr = sympy.sympify(form, locals=self.symbols)
+            self.expressions.put(key, expr)
+        return expr
+
+    def atoms(self, expr):
+        return self.cached("atoms", expr, lambda x: x.atoms())
+
+    def _symengine_expand(self, expr):
+        # only polynomials with powers of sums are worth converting,
+        # symengine doesn't expand denominators like sympy does
+        powers = False
+        for node in sympy.preorder_traversal(expr):
+            if not isinstance(node, self.polynomial_types):
+                return False
+            if node.is_Pow:
+                if not node.exp.is_Integer:
+                    return False
+                if not node.base.is_Atom:
+                    if node.exp < 0:
+                        return False
+                    powers = powers or (node.base.is_Add and bool(node.exp > 1))
+        return powers
+
+    def _expand(self, expr):
+        if self.backend == "symengine" and self._symengine_expand(expr):
+            return sympy.sympify(symengine.expand(symengine.sympify(expr)))
+        return sympy.expand(expr)
+
+    def expand(self, expr):
+        return self.cached("expand", expr, self._expand)
+
+    def numer_denom(self, expr):
+        return self.cached("numer_denom", expr, lambda x: x.as_numer_denom())
+
+    def simplify(self, expr):
+        return self.cached("simplify", expr, lambda x: x.nsimplify().evalf().simplify())
+
+
 class SBML2BNGL:
     """
     contains methods for extracting and formatting those sbml elements
@@ -143,7 +260,7 @@ class SBML2BNGL:
         self.isConversion = True
         self.boundaryConditionVariables = []
         self.speciesDictionary = {}
-        self.speciesMemory = []
+        self.speciesMemory = set()
         self.speciesAnnotationDict = None
         self.reactionDictionary = {}
         self.speciesAnnotation = None
@@ -164,6 +281,7 @@ class SBML2BNGL:
         self.noCompartment = None
         # multi compartment warning flag
         self.multi_comp_warn = False
+        self.buildIndexes()
         self.check_noCompartment()
 
         self.getSpecies()
@@ -185,6 +303,7 @@ class SBML2BNGL:
         self.all_syms["sympyAnd"] = sympyAnd
         self.all_syms["sympyOr"] = sympyOr
         self.all_syms["sympyNot"] = sympyNot
+        self.expressionCache = ExpressionCache(self.all_syms)
         # We are trying to replace things that we know
         # are only in assignment rules in functions
         self.only_assignment_dict = {}
@@ -204,7 +323,7 @@ class SBML2BNGL:
         self.tags = {}
         self.boundaryConditionVariables = []
         self.speciesDictionary = {}
-        self.speciesMemory = []
+        self.speciesMemory = set()
         self.getSpecies()
         self.reactionDictionary = {}
 
@@ -277,11 +396,32 @@ class SBML2BNGL:
         self.bngModel.metaString = metaString
         return metaString
 
-    def isSameNameDifferentCompartment(self, name):
-        speciesList = []
+    def buildIndexes(self):
+        """
+        indexes the SBML elements that are looked up by id, name or
+        compartment, libsbml can only find them by going through the
+        whole list
+        """
+        self.speciesById = {}
+        self.speciesByName = defaultdict(list)
+        self.speciesByCompartment = defaultdict(list)
         for species in self.model.getListOfSpecies():
-            if species.getName() == name:
-                speciesList.append(species.getCompartment())
+            self.speciesById[species.getId()] = species
+            self.speciesByName[species.getName()].append(species)
+            self.speciesByCompartment[species.getCompartment()].append(species)
+        self.compartmentsById = {
+            compartment.getId(): compartment
+            for compartment in self.model.getListOfCompartments()
+        }
+        self.parametersById = {
+            parameter.getId(): parameter
+            for parameter in self.model.getListOfParameters()
+        }
+
+    def isSameNameDifferentCompartment(self, name):
+        speciesList = [
+            species.getCompartment() for species in self.speciesByName.get(name, [])
+        ]
 
         return len(speciesList) == len(set(speciesList))
 
@@ -339,7 +479,7 @@ class SBML2BNGL:
         # by compartment
         if logEntries and standardizedName != "0":
             if standardizedName in self.speciesMemory:
-                if len(list(self.model.getListOfCompartments())) == 1:
+                if len(self.compartmentsById) == 1:
                     standardizedName += "_" + species.getId()
                 else:
                     # we can differentiate by compartment tag, no need to attach it to the name
@@ -347,7 +487,7 @@ class SBML2BNGL:
                     # changing compartment information. If not, use id to differentiate.
                     if not self.isSameNameDifferentCompartment(species.getName()):
                         standardizedName += "_" + species.getId()
-            self.speciesMemory.append(standardizedName)
+            self.speciesMemory.add(standardizedName)
 
         if boundaryCondition:
             if standardizedName not in self.boundaryConditionVariables:
@@ -588,10 +728,9 @@ class SBML2BNGL:
         return rateR, numFactors
 
     def isAmount(self, reactantName):
-        for species in self.model.getListOfSpecies():
-            if species.getName() == reactantName:
-                if species.isSetInitialAmount():
-                    return True
+        for species in self.speciesByName.get(reactantName, []):
+            if species.isSetInitialAmount():
+                return True
         return False
 
     def calculate_factor(self, react, prod, expr, removed):
@@ -639,7 +778,6 @@ class SBML2BNGL:
 
     def find_all_symbols(self, math, reactionID):
         time_warn = False
-        curr_keys = list(self.all_syms.keys())
         if math is None:
             logMess(
                 "ERROR:SIM211",
@@ -690,7 +828,7 @@ class SBML2BNGL:
                             "At least one reactions kinetic law is using the time function. The time functionality in BNG might not work as expected and throw off the translation.",
                         )
             if name is not None:
-                if name not in curr_keys:
+                if name not in self.all_syms:
                     self.all_syms[name] = sympy.symbols(name)
         # let's parse the formula and get non-numerical symbols
         form = libsbml.formulaToString(math)
@@ -699,9 +837,12 @@ class SBML2BNGL:
         for it in replace_dict.items():
             form = form.replace(it[0], it[1])
         # Let's also pool this in used_symbols
-        for sym in self.all_syms.keys():
-            if sym not in self.used_symbols:
-                self.used_symbols.append(sym)
+        if len(self.used_symbols) < len(self.all_syms):
+            usedSymbols = set(self.used_symbols)
+            for sym in self.all_syms.keys():
+                if sym not in usedSymbols:
+                    usedSymbols.add(sym)
+                    self.used_symbols.append(sym)
         # Sympy doesn't allow and/not/or to be used
         # outside what it deems to be acceptable
         # TODO: Replace all of these with regexp
@@ -788,7 +929,7 @@ class SBML2BNGL:
         # SymPy is wonderful, _clash1 avoids built-ins like E, I etc
         # FIXME:can we adjust the assignment rule stuff here?
         try:
-            sym = sympy.sympify(form, locals=self.all_syms)
+            sym = self.expressionCache.parse(form)
         except SympifyError as e:
             logMess(
                 "ERROR:SYMP001",
@@ -802,17 +943,17 @@ class SBML2BNGL:
         # compartment is on what side which is not currently
         # being provided to this function
         for comp in compartments_to_remove:
-            if comp in sym.atoms():
+            if comp in self.expressionCache.atoms(sym):
                 # Further issue, I know that this should be
                 # a multiplication but for BMD2 this is actually a
                 # problem? In fact, it looks like this is the case
                 # for regular mass action in SBML?
                 # This doesn't look right and it is a current
                 # hack?
-                n, d = sym.as_numer_denom()
-                if comp in n.atoms():
+                n, d = self.expressionCache.numer_denom(sym)
+                if comp in self.expressionCache.atoms(n):
                     sym = sym / comp
-                elif comp in d.atoms():
+                elif comp in self.expressionCache.atoms(d):
                     sym = sym * comp
                 else:
                     pass
@@ -825,14 +966,16 @@ class SBML2BNGL:
             return rate, "", 1, 1, False, split_rxn
 
         # expand and take the terms out as left and right
-        exp = sympy.expand(sym)
+        exp = self.expressionCache.expand(sym)
         # This shows if we can get X - Y
         ###### SPLIT RXN #######
         # TODO: Figure out if something CAN be mass action
         # and if not, just skip the rest and use split_rxn
         ###### SPLIT RXN #######
         if exp.is_Add:
-            react_expr, prod_expr = self.gather_terms(exp)
+            react_expr, prod_expr = self.expressionCache.cached(
+                "terms", exp, self.gather_terms
+            )
             # l,r = exp.as_two_terms()
             # Let's also ensure that we have a + and - term
             # if str(l).startswith("-") or str(r).startswith("-"):
@@ -874,7 +1017,7 @@ class SBML2BNGL:
 
                 # Check if we can get 0 in the denominator
                 add_eps_react = False
-                n, d = react_expr.as_numer_denom()
+                n, d = self.expressionCache.numer_denom(react_expr)
                 for ibol, bol in enumerate(react_symbols):
                     if bol in d.atoms():
                         d = d.subs(bol, 0)
@@ -898,7 +1041,7 @@ class SBML2BNGL:
 
                 # Check if we can get 0 in the denominator
                 add_eps_prod = False
-                n, d = prod_expr.as_numer_denom()
+                n, d = self.expressionCache.numer_denom(prod_expr)
                 for ibol, bol in enumerate(prod_symbols):
                     if bol in d.atoms():
                         d = d.subs(bol, 0)
@@ -918,8 +1061,8 @@ class SBML2BNGL:
                 # if so set the nl/nr values accordingly
 
                 # Reproducing current behavior + expansion
-                re_proc = react_expr.nsimplify().evalf().simplify()
-                pe_proc = prod_expr.nsimplify().evalf().simplify()
+                re_proc = self.expressionCache.simplify(react_expr)
+                pe_proc = self.expressionCache.simplify(prod_expr)
 
                 # Adding epsilon if we have to
                 if add_eps_react:
@@ -978,7 +1121,7 @@ class SBML2BNGL:
 
             # Check if we can get the denominator to be 0
             add_eps_react = False
-            n, d = react_expr.as_numer_denom()
+            n, d = self.expressionCache.numer_denom(react_expr)
             for ibol, bol in enumerate(react_symbols):
                 if bol in d.atoms():
                     d = d.subs(bol, 0)
@@ -991,7 +1134,7 @@ class SBML2BNGL:
                 for it in replace_dict.items():
                     rate = rate.replace(it[1], it[0])
                 return rate, "", 1, 1, False, split_rxn
-            re_proc = react_expr.nsimplify().evalf().simplify()
+            re_proc = self.expressionCache.simplify(react_expr)
             if add_eps_react:
                 # n,d = re_proc.as_numer_denom()
                 # rateL = "(" + str(n) + ")/(" + str(d) + "+__epsilon__)"
@@ -1248,6 +1391,10 @@ class SBML2BNGL:
 
             # we need to resolve observables BEFORE we do this
             for obs_key in self.obs_map:
+                # the keys are SBML ids, only the ones in the rates can
+                # match and compiling a pattern for every key is slow
+                if obs_key not in rateL and obs_key not in rateR:
+                    continue
                 resL = re.search(r"(\W|^){0}(\W|$)".format(obs_key), rateL)
                 if resL is not None:
                     rateL = re.sub(
@@ -1793,6 +1940,7 @@ class SBML2BNGL:
         functionTitle = "fRate"
         # self.unitDefinitions = self.getUnitDefinitions()
         database.rawreactions = []
+        usedMolecules = set(self.used_molecules)
 
         if len(self.model.getListOfReactions()) == 0:
             logMess(
@@ -1836,10 +1984,12 @@ class SBML2BNGL:
             rule_obj.symm_factors = [sl, sr]
             # Let's add our molecules
             for r in rawRules["reactants"]:
-                if r[0] not in self.used_molecules:
+                if r[0] not in usedMolecules:
+                    usedMolecules.add(r[0])
                     self.used_molecules.append(r[0])
             for p in rawRules["products"]:
-                if p[0] not in self.used_molecules:
+                if p[0] not in usedMolecules:
+                    usedMolecules.add(p[0])
                     self.used_molecules.append(p[0])
 
             if len(rawRules["parameters"]) > 0:
@@ -2211,7 +2361,7 @@ class SBML2BNGL:
         # We might need this for debugging complicated
         # piecewise function forms.
         try:
-            sym = sympy.sympify(form, locals=self.all_syms)
+            sym = self.expressionCache.parse(form)
         except SympifyError as e:
             logMess(
                 "ERROR:SYMP001",
@@ -2222,12 +2372,14 @@ class SBML2BNGL:
         # encoded as a unidirectional rxn
         if not arule.isAssignment():
             # expand and take the terms out as left and right
-            exp = sympy.expand(sym)
+            exp = self.expressionCache.expand(sym)
             rateL = None
             rateR = None
             # This shows if we can get X - Y
             if exp.is_Add:
-                react_expr, prod_expr = self.gather_terms(exp)
+                react_expr, prod_expr = self.expressionCache.cached(
+                    "terms", exp, self.gather_terms
+                )
                 if react_expr is None:
                     # TODO: LogMess this
                     print("no forward reaction rate?")
@@ -2237,14 +2389,14 @@ class SBML2BNGL:
                     prod_expr = prod_expr / var
                     # Check for epsilon
                     add_eps_prod = False
-                    n, d = prod_expr.as_numer_denom()
+                    n, d = self.expressionCache.numer_denom(prod_expr)
                     for bol in d.atoms():
                         d = d.subs(bol, 0)
                     if d == 0:
                         add_eps_prod = True
                     # Reproducing current behavior + expansion
-                    re_proc = react_expr.nsimplify().evalf().simplify()
-                    pe_proc = prod_expr.nsimplify().evalf().simplify()
+                    re_proc = self.expressionCache.simplify(react_expr)
+                    pe_proc = self.expressionCache.simplify(prod_expr)
                     # Adding epsilon if we have to
                     rateL = str(re_proc)
                     if add_eps_prod:
@@ -2261,7 +2413,7 @@ class SBML2BNGL:
             if rateL is None:
                 # if not simply reversible, rely on the SBML spec
                 react_expr = exp
-                re_proc = react_expr.nsimplify().evalf().simplify()
+                re_proc = self.expressionCache.simplify(react_expr)
                 rateL = str(re_proc)
                 rateL = rateL.replace("**", "^")
                 # Make unidirectional
@@ -2435,6 +2587,12 @@ class SBML2BNGL:
         # Going to use this to match names and remove params
         # if need be
         param_map = dict([(x.split()[0], x) for x in parameters])
+        parametersByName = defaultdict(list)
+        for element in parameters:
+            parametersByName[element.split()[0]].append(element)
+        moleculesByName = defaultdict(list)
+        for x in molecules:
+            moleculesByName[molecules[x]["name"]].append(molecules[x])
 
         compartmentList = []
         compartmentList.extend(
@@ -2573,7 +2731,7 @@ class SBML2BNGL:
                     removeParameters.append("{0} 0".format(rawArule[0]))
                     zRules.remove(rawArule[0])
                 else:
-                    for element in parameters:
+                    for element in parametersByName.get(rawArule[0], []):
                         # TODO: if for whatever reason a rate rule
                         # was defined as a parameter that is not 0
                         # remove it. This might not be exact behavior
@@ -2597,11 +2755,7 @@ class SBML2BNGL:
                 if rawArule[0] in zRules:
                     # dont show assignment rules as parameters
                     zRules.remove(rawArule[0])
-                    matches = [
-                        molecules[x]
-                        for x in molecules
-                        if molecules[x]["name"] == rawArule[0]
-                    ]
+                    matches = moleculesByName.get(rawArule[0], [])
 
                     if matches:
                         if matches[0]["isBoundary"]:
@@ -2697,9 +2851,7 @@ class SBML2BNGL:
                     # check if it is defined as an observable
                     # FIXME: This doesn't check for parameter namespace
                     # TODO: What is going on here?
-                    candidates = [
-                        idx for idx, x in enumerate(observablesDict) if rawArule[0] == x
-                    ]
+                    candidates = [rawArule[0]] if rawArule[0] in observablesDict else []
                     assigObsFlag = False
                     for idx in candidates:
                         # if re.search('\s{0}\s'.format(rawArule[0]),observables[idx]):
@@ -2892,7 +3044,7 @@ class SBML2BNGL:
                     "Multiple compartments are used, please note that Atomizer does not automatically try to infer your compartment topology which is important for how rules fire in cBNGL. Make sure your comparment topology is set correctly after translation",
                 )
                 self.multi_comp_warn = True
-        self.speciesMemory = []
+        self.speciesMemory = set()
 
     def getSpecies(self, translator={}, parameters=[]):
         """
@@ -2908,6 +3060,8 @@ class SBML2BNGL:
         # gotta reset the bngModel everytime
         # this function is called
         self.bngModel._reset()
+        # only checked for membership, once per species
+        parameters = set(parameters)
 
         # find concentration units
         unitDefinitions = self.unitDefinitions
@@ -3075,9 +3229,9 @@ class SBML2BNGL:
                         if self.noCompartment:
                             compartmentSize = 1.0
                         else:
-                            compartmentSize = self.model.getCompartment(
+                            compartmentSize = self.compartmentsById[
                                 rawSpecies["compartment"]
-                            ).getSize()
+                            ].getSize()
                         newParameter = compartmentSize * newParameter
                         # temp testing AS
                         spec_obj.val = newParameter
@@ -3270,7 +3424,7 @@ class SBML2BNGL:
 
         annotationInfo["species"] = speciesAnnotationInfo
 
-        self.speciesMemory = []
+        self.speciesMemory = set()
         return (
             list(set(moleculesText)),
             speciesText,
@@ -3329,21 +3483,27 @@ class SBML2BNGL:
         for initialAssignment in self.model.getListOfInitialAssignments():
             symbol = initialAssignment.getSymbol()
             math = libsbml.formulaToString(initialAssignment.getMath())
+            if math is None and len(pparam) > 0:
+                element = next(iter(pparam))
+                logMess(
+                    "ERROR:SIM210",
+                    f"Initial assignment for '{element}' has no math defined",
+                )
+                raise TranslationException(
+                    f"ERROR:SIM210: Initial assignment for '{element}' has no math defined"
+                )
+            # only the species named in the formula need to be replaced,
+            # instead of trying every species on every formula
+            tokens = set(re.findall(r"\w+", math)) if math is not None else set()
             for element in pparam:
-                if math is None:
-                    logMess(
-                        "ERROR:SIM210",
-                        f"Initial assignment for '{element}' has no math defined",
-                    )
-                    raise TranslationException(
-                        f"ERROR:SIM210: Initial assignment for '{element}' has no math defined"
-                    )
-                if element in math:
+                if element in tokens:
+                    value = "({0})".format(pparam[element][0])
                     math = re.sub(
                         r"(\W|^)({0})(\W|$)".format(element),
-                        r"\1({0})\3".format(pparam[element][0]),
+                        r"\1{0}\3".format(value),
                         math,
                     )
+                    tokens.update(re.findall(r"\w+", value))
 
             # removing non bngl math elements  for their equivalents
             math = writer.bnglFunction(math, "", []).split(" = ")[1]
@@ -3489,7 +3649,7 @@ class SBML2BNGL:
         return modelAnnotation
 
     def getSpeciesInfo(self, name):
-        return self.getRawSpecies(self.model.getSpecies(name))
+        return self.getRawSpecies(self.speciesById[name])
 
     def writeLog(self, translator):
         rawSpecies = [self.getRawSpecies(x) for x in self.model.getListOfSpecies()]
@@ -10,6 +10,8 @@ goGrammar = (
 from contextlib import contextmanager
 import sys, os
 
+from .webcache import web_cache
+
 
 @contextmanager
 def suppress_stdout():
@@ -26,8 +28,20 @@ def suppress_stdout():
 
 
 def resolveAnnotation(annotation):
+    key = "annotation " + annotation
+    cached = web_cache.get(key)
+    if cached is not None:
+        return annotation, cached.decode("utf-8")
+    if web_cache.offline:
+        return annotation, ""
     with suppress_stdout():
-        return resolveAnnotationHelper(annotation)
+        annotation, finalAnnotation = resolveAnnotationHelper(annotation)
+    # failed lookups aren't stored so they are tried again next time
+    if finalAnnotation is None:
+        return annotation, ""
+    if isinstance(finalAnnotation, str):
+        web_cache.put(key, finalAnnotation)
+    return annotation, finalAnnotation
 
 
 def resolveAnnotationHelper(annotation):
@@ -138,7 +152,7 @@ def resolveAnnotationHelper(annotation):
             # assert(False)
             finalAnnotation = ""
     except (IOError, KeyError) as e:
-        return annotation, ""
+        return annotation, None
     return annotation, finalAnnotation
 
 
@@ -1,23 +1,29 @@
 import urllib.request, urllib.parse, urllib.error
 import urllib.request, urllib.error, urllib.parse
 import functools
-import marshal
-from .util import logMess
+from .util import logMess, pmemoize
+from .webcache import web_cache, run_concurrently
 import json
 
+# web lookups are few but slow, keep plenty of them
+memoize = functools.partial(pmemoize, maxsize=10000)
 
-def memoize(obj):
-    cache = obj.cache = {}
 
-    @functools.wraps(obj)
-    def memoizer(*args, **kwargs):
-        # key = str(args) + str(kwargs)
-        key = marshal.dumps([str(obj), args, kwargs])
-        if key not in cache:
-            cache[key] = obj(*args, **kwargs)
-        return cache[key]
-
-    return memoizer
+def prefetch(function, argumentList):
+    """
+    Runs a memoized lookup for all the given arguments at the same
+    time, skipping repeated arguments and ones already looked up, so
+    the calls that follow are answered from memory.
+    """
+    queries = {}
+    for arguments in argumentList:
+        arguments = tuple(arguments)
+        key = function.cacheKey(*arguments)
+        if key not in function.cache:
+            queries[key] = arguments
+    # lookups that fail are run again, and report the problem, when
+    # they're called
+    run_concurrently(function, list(queries.values()), jobs=web_cache.pool.size)
 
 
 '''
@@ -57,7 +63,7 @@ def queryBioGridByName(name1, name2, organism, truename1, truename2):
         # and not an organism taxonomy identifier
         data = urllib.parse.urlencode(d).encode("utf-8")
         try:
-            response = urllib.request.urlopen(url, data=data).read()
+            response = web_cache.fetch(url, data=data)
         except urllib.error.HTTPError:
             logMess(
                 "ERROR:MSC02",
@@ -76,7 +82,7 @@ def queryBioGridByName(name1, name2, organism, truename1, truename2):
         }
         data = urllib.parse.urlencode(d).encode("utf-8")
         try:
-            response = urllib.request.urlopen(url, data=data).read()
+            response = web_cache.fetch(url, data=data)
         except urllib.error.HTTPError:
             logMess("ERROR:MSC02", "A connection could not be established to biogrid")
             return False
@@ -163,9 +169,7 @@ def queryActiveSite(nameStr, organism):
             xparams = urllib.parse.urlencode(xparams).encode("utf-8")
             try:
                 xparams = urllib.parse.urlencode(xparams).encode("utf-8")
-                req = urllib.request.Request(url)
-                with urllib.request.urlopen(req, data=xparams) as f:
-                    response = f.read().decode("utf-8")
+                response = web_cache.fetch(url, data=xparams).decode("utf-8")
             except urllib.error.HTTPError:
                 logMess(
                     "ERROR:MSC03", "A connection could not be established to uniprot"
@@ -183,9 +187,7 @@ def queryActiveSite(nameStr, organism):
             }
             xparams = urllib.parse.urlencode(xparams).encode("utf-8")
             try:
-                req = urllib.request.Request(url, data=xparams)
-                with urllib.request.urlopen(req) as f:
-                    response = f.read().decode("utf-8")
+                response = web_cache.fetch(url, data=xparams).decode("utf-8")
             except urllib.error.HTTPError:
                 logMess(
                     "ERROR:MSC03", "A connection could not be established to uniprot"
@@ -219,7 +221,7 @@ def name2uniprot(nameStr, organism):
         }
         data = urllib.parse.urlencode(d).encode("utf-8")
         try:
-            response = urllib.request.urlopen(url, data=data).read()
+            response = web_cache.fetch(url, data=data)
         except urllib.error.HTTPError:
             logMess("ERROR:MSC03", "A connection could not be established to uniprot")
             return None
@@ -234,7 +236,7 @@ def name2uniprot(nameStr, organism):
         }
         data = urllib.parse.urlencode(d).encode("utf-8")
         try:
-            response = urllib.request.urlopen(url, data=data).read()
+            response = web_cache.fetch(url, data=data)
         except urllib.error.HTTPError:
             return None
     parsedData = [x.split("\t") for x in str(response).split("\n")][1:]
@@ -262,7 +264,7 @@ def getReactomeBondByUniprot(uniprot1, uniprot2):
     data = urllib.parse.urlencode(d).encode("utf-8")
     # query reactome
     try:
-        response = urllib.request.urlopen(url, data=data).read()
+        response = web_cache.fetch(url, data=data)
     except urllib.error.HTTPError:
         # logMess('ERROR:pathwaycommons','A connection could not be established to pathwaycommons')
         return None
@@ -0,0 +1,155 @@
+import json, sys, time, tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def maxRSS():
+    """
+    highest resident memory of the process so far in MB, None if the
+    platform doesn't report it
+    """
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    scale = 2**20 if sys.platform == "darwin" else 2**10
+    return round(maxrss / scale, 2)
+
+
+class StageProfiler:
+    """
+    Wall time and memory of the stages of an atomizer run. The stages
+    are marked in the atomizer code with profiler.stage(name), which
+    does nothing unless the profiler was started. Stages inside other
+    stages are reported as "outer/inner" and a stage that runs more
+    than once (e.g. rule writing, which post-analysis repeats) is added
+    up. Every stage records the process maximum RSS when it ends. With
+    memory=True the peak of the Python allocations inside each stage is
+    traced with tracemalloc as well, which slows down allocation heavy
+    stages several times, so the times of such a run are only useful
+    relative to each other.
+
+    Usage: profiler.start()
+           with profiler.stage("read SBML"):
+               ...
+           report = profiler.stop()
+
+    Attributes
+    ----------
+    enabled : bool
+        True between start() and stop()
+    memory : bool
+        True if the allocations are traced
+    stages : dict
+        for every stage path the number of calls, the total seconds,
+        the maximum RSS in MB and, if traced, the peak memory in MB
+
+    Methods
+    -------
+    start(memory=False) : None
+        clears the recorded stages and starts timing, and tracing
+        memory if asked to
+    stage(name) : context manager
+        records the time and memory of the code inside it
+    stop() : dict
+        stops the profiler and returns the report, the total seconds,
+        memory and stages
+    write(report, path) : None
+        writes a report as JSON
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.memory = False
+        self.stages = {}
+        self._stack = []
+        self._peaks = [0]
+        self._start = None
+        self._traced = False
+
+    def start(self, memory=False):
+        self.stages = {}
+        self._stack = []
+        self._peaks = [0]
+        self.memory = memory
+        # somebody else might be tracing already
+        self._traced = memory and not tracemalloc.is_tracing()
+        if self._traced:
+            tracemalloc.start()
+        self._reset_peak()
+        self._start = time.perf_counter()
+        self.enabled = True
+
+    def _peak(self):
+        if not self.memory:
+            return 0
+        return tracemalloc.get_traced_memory()[1]
+
+    def _reset_peak(self):
+        # python 3.9+, the peaks are since the start otherwise
+        if self.memory and hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        # keep the peak of the enclosing stage before it's reset
+        self._peaks[-1] = max(self._peaks[-1], self._peak())
+        self._reset_peak()
+        self._stack.append(name)
+        self._peaks.append(0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            peak = max(self._peaks.pop(), self._peak())
+            path = "/".join(self._stack)
+            self._stack.pop()
+            entry = self.stages.setdefault(path, {"calls": 0, "seconds": 0.0})
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            rss = maxRSS()
+            if rss is not None:
+                entry["max_rss_mb"] = rss
+            if self.memory:
+                entry["peak_memory_mb"] = max(
+                    entry.get("peak_memory_mb", 0.0), peak / 2**20
+                )
+            self._peaks[-1] = max(self._peaks[-1], peak)
+            self._reset_peak()
+
+    def stop(self):
+        seconds = time.perf_counter() - self._start
+        peak = max(self._peaks[0], self._peak())
+        if self._traced:
+            tracemalloc.stop()
+        self.enabled = False
+        stages = {}
+        for path, entry in self.stages.items():
+            stages[path] = {
+                field: round(value, 4) if isinstance(value, float) else value
+                for field, value in entry.items()
+            }
+        report = {"seconds": round(seconds, 4), "stages": stages}
+        rss = maxRSS()
+        if rss is not None:
+            report["max_rss_mb"] = rss
+        if self.memory:
+            report["peak_memory_mb"] = round(peak / 2**20, 2)
+        return report
+
+    @staticmethod
+    def write(report, path):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=4)
+
+
+# shared by the atomizer code in the process
+profiler = StageProfiler()
@@ -0,0 +1,255 @@
+import hashlib, os, pickle, sqlite3, threading, time
+
+from bionetgen.core.utils.logging import BNGLogger
+from bionetgen.core.utils.utils import cache_dir
+from bionetgen.core.version import get_version
+
+
+def fingerprint(*parts):
+    """
+    Hex digest of the repr of parts. Dictionaries and sets have to be
+    given sorted so equal inputs get the same fingerprint.
+    """
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+def fileFingerprint(path):
+    """
+    Fingerprint of the contents of a file, or None if there's no file
+    """
+    if path is None or not os.path.isfile(path):
+        return fingerprint(path)
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def sourceFingerprint(folder=None):
+    """
+    Fingerprint of the python sources of the atomizer, so stored
+    atomizations aren't used after the code changes
+    """
+    if folder is None:
+        folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    digest = hashlib.sha1()
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.endswith(".py"):
+                continue
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, folder).encode("utf-8"))
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+class SCTCache:
+    """
+    Disk backed store of the atomization results of earlier runs, so a
+    model that is atomized again after an edit only recomputes what the
+    edit changed. A run is keyed by the fingerprint of its species,
+    reactions and configuration. If a model with the same fingerprint
+    was atomized before, its translator, dependency graphs and species
+    structures are reused as they are. Otherwise the run starts from the
+    snapshot of the previous run of the same model (the lineage, e.g.
+    the input file) and the stages that record their results here
+    reuse the parts of them that don't depend on the edit. Snapshots are
+    kept in a sqlite file, one per lineage.
+
+    Usage: sct_cache.configure(path="sct.sqlite")
+           atomization = sct_cache.begin(lineage, key)
+           previous = sct_cache.previousResult("naming", stageKey)
+           sct_cache.record("naming", stageKey, result)
+           sct_cache.commit(atomization)
+
+    Arguments
+    ---------
+    path : str
+        (optional) path to the sqlite file, defaults to sct_cache.sqlite
+        in the PyBNG cache folder
+    enabled : bool
+        False to neither use nor store any snapshot
+
+    Attributes
+    ----------
+    hits : int
+        number of runs whose atomization was reused as a whole
+    misses : int
+        number of runs that were atomized
+
+    Methods
+    -------
+    configure(path=None, enabled=None) : None
+        changes the sqlite file or turns the cache on and off
+    begin(lineage, key) : object
+        starts recording a run and returns the stored atomization for
+        key, or None if it has to be computed
+    previousResult(stage, key) : object
+        result the stage recorded for key in the previous run of the
+        lineage, None if there's none
+    record(stage, key, value) : None
+        keeps the result of a stage for the next run of the lineage
+    commit(atomization) : None
+        stores the atomization and the recorded stage results of the
+        run as the snapshot of its lineage
+    abort() : None
+        ends the run without storing anything
+    clear() : None
+        deletes every snapshot
+    """
+
+    # stored results of other versions or atomizer sources aren't used
+    version = fingerprint(get_version(), sourceFingerprint())
+
+    def __init__(self, path=None, enabled=True) -> None:
+        self.logger = BNGLogger()
+        self.path = path
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._run = None
+        self._previous = None
+
+    def configure(self, path=None, enabled=None):
+        if path is not None and path != self.path:
+            self.path = path
+            self._db = None
+        if enabled is not None:
+            self.enabled = enabled
+
+    def _connect(self):
+        # connections can't be shared with forked processes
+        if self._db is not None and self._pid == os.getpid():
+            return self._db
+        path = self.path
+        if path is None:
+            path = os.path.join(cache_dir(), "sct_cache.sqlite")
+        try:
+            if path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots "
+                "(key TEXT PRIMARY KEY, value BLOB, created REAL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS lineages "
+                "(lineage TEXT PRIMARY KEY, key TEXT)"
+            )
+            self._db.commit()
+        except (OSError, sqlite3.Error) as e:
+            self.logger.warning(
+                f"Can't use the SCT cache at {path}, results won't be stored: {e}",
+                loc=f"{__file__} : SCTCache._connect()",
+            )
+            self._db = None
+        self._pid = os.getpid()
+        return self._db
+
+    def _load(self, query, argument):
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return None
+            row = db.execute(query, (argument,)).fetchone()
+        if row is None:
+            return None
+        try:
+            snapshot = pickle.loads(bytes(row[0]))
+        except Exception as e:
+            self.logger.debug(
+                f"Ignoring a snapshot that can't be read: {e}",
+                loc=f"{__file__} : SCTCache._load()",
+            )
+            return None
+        if snapshot.get("version") != self.version:
+            return None
+        return snapshot
+
+    def begin(self, lineage, key):
+        self._run = None
+        self._previous = None
+        if not self.enabled:
+            return None
+        snapshot = self._load("SELECT value FROM snapshots WHERE key = ?", key)
+        if snapshot is not None:
+            self.hits += 1
+            with self._lock:
+                # the lineage continues from this snapshot
+                db = self._connect()
+                db.execute(
+                    "INSERT OR REPLACE INTO lineages VALUES (?, ?)", (lineage, key)
+                )
+                db.commit()
+            return snapshot["atomization"]
+        self.misses += 1
+        self._previous = self._load(
+            "SELECT snapshots.value FROM lineages JOIN snapshots "
+            "ON lineages.key = snapshots.key WHERE lineages.lineage = ?",
+            lineage,
+        )
+        self._run = {"lineage": lineage, "key": key, "results": {}}
+        return None
+
+    def previousResult(self, stage, key):
+        if self._run is None or self._previous is None:
+            return None
+        return self._previous["results"].get((stage, key))
+
+    def record(self, stage, key, value):
+        if self._run is not None:
+            self._run["results"][(stage, key)] = value
+
+    def commit(self, atomization):
+        run, self._run, self._previous = self._run, None, None
+        if run is None:
+            return
+        snapshot = {
+            "version": self.version,
+            "results": run["results"],
+            "atomization": atomization,
+        }
+        try:
+            value = pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            self.logger.debug(
+                f"Not storing a snapshot that can't be pickled: {e}",
+                loc=f"{__file__} : SCTCache.commit()",
+            )
+            return
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return
+            db.execute(
+                "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?)",
+                (run["key"], sqlite3.Binary(value), time.time()),
+            )
+            db.execute(
+                "INSERT OR REPLACE INTO lineages VALUES (?, ?)",
+                (run["lineage"], run["key"]),
+            )
+            # the snapshots no lineage continues from
+            db.execute(
+                "DELETE FROM snapshots WHERE key NOT IN (SELECT key FROM lineages)"
+            )
+            db.commit()
+
+    def abort(self):
+        self._run = None
+        self._previous = None
+
+    def clear(self):
+        with self._lock:
+            db = self._connect()
+            if db is not None:
+                db.execute("DELETE FROM lineages")
+                db.execute("DELETE FROM snapshots")
+                db.commit()
+
+
+# shared by the atomizer stages in the process
+sct_cache = SCTCache()
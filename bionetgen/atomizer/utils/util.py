@@ -4,6 +4,7 @@ Created on Sun Mar 25 21:26:49 2012
 
 @author: proto
 """
+
 from __future__ import division
 import json
 from functools import partial
@@ -29,21 +30,147 @@ import operator
 import os
 from subprocess import call
 import functools
-import pylru
+import sys
+import threading
+import weakref
+from collections import OrderedDict
 
 logger = BNGLogger()
 
 
-def pmemoize(obj):
-    cache = obj.cache = pylru.lrucache(500)
+class LRUCache(object):
+    """
+    Bounded cache used by the atomizer memoization decorators. It
+    keeps at most maxsize entries and, if maxbytes is given, about
+    maxbytes bytes of keys and values, dropping the least recently
+    used entries first. Hits, misses and evictions are counted and
+    every cache can be cleared at once with clearCaches().
+    """
+
+    def __init__(self, name, maxsize=None, maxbytes=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, _ = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = entrySize(key, value) if self.maxbytes is not None else 0
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            self._data[key] = (value, size)
+            self.nbytes += size
+            while (self.maxsize is not None and len(self._data) > self.maxsize) or (
+                self.maxbytes is not None and self.nbytes > self.maxbytes
+            ):
+                _, (_, oldSize) = self._data.popitem(last=False)
+                self.nbytes -= oldSize
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        return {
+            "entries": len(self._data),
+            "bytes": self.nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# every live cache, so they can be cleared between models
+_caches = weakref.WeakSet()
+_missing = object()
+
+
+def entrySize(key, value):
+    """
+    approximate number of bytes a cache entry holds on to
+    """
+    try:
+        valueSize = len(marshal.dumps(value))
+    except ValueError:
+        valueSize = sys.getsizeof(value)
+    keySize = len(key) if isinstance(key, bytes) else sys.getsizeof(key)
+    return keySize + valueSize
+
+
+def clearCaches():
+    """
+    empties every memoization cache, e.g. before translating another model
+    """
+    for cache in list(_caches):
+        cache.clear()
+
+
+def cacheStats():
+    """
+    hits, misses, evictions, entries and bytes of the memoization
+    caches, summed up by the name of the memoized function
+    """
+    stats = {}
+    for cache in list(_caches):
+        total = stats.setdefault(
+            cache.name,
+            {"entries": 0, "bytes": 0, "hits": 0, "misses": 0, "evictions": 0},
+        )
+        for field, value in cache.stats().items():
+            total[field] += value
+    return stats
+
+
+def pmemoize(obj=None, maxsize=500, maxbytes=None):
+    """
+    memoizes a function in an LRUCache of at most maxsize entries and
+    maxbytes bytes. Used as @pmemoize or @pmemoize(maxsize=1000). All
+    arguments must be serializable with marshal.
+    """
+    if obj is None:
+        return partial(pmemoize, maxsize=maxsize, maxbytes=maxbytes)
+    cache = LRUCache(obj.__qualname__, maxsize=maxsize, maxbytes=maxbytes)
+
+    def cacheKey(*args, **kwargs):
+        return marshal.dumps([args, kwargs])
 
     @functools.wraps(obj)
     def memoizer(*args, **kwargs):
-        key = marshal.dumps([args, kwargs])
-        if key not in cache:
-            cache[key] = obj(*args, **kwargs)
-        return cache[key]
+        key = cacheKey(*args, **kwargs)
+        res = cache.get(key, _missing)
+        if res is _missing:
+            res = obj(*args, **kwargs)
+            cache.put(key, res)
+        return res
 
+    memoizer.cache = cache
+    memoizer.cacheKey = cacheKey
     return memoizer
 
 
@@ -58,8 +185,8 @@ class memoize(object):
 
     This class is meant to be used as a decorator of methods. The return value
     from a given method invocation will be cached on the instance whose method
-    was invoked. All arguments passed to a method decorated with memoize must
-    be hashable.
+    was invoked, in an LRUCache of at most maxsize entries. All arguments
+    passed to a method decorated with memoize must be hashable.
 
     If a memoized method is invoked directly on its class the result will not
     be cached. Instead the method will be invoked like a static method:
@@ -71,6 +198,8 @@ class memoize(object):
     Obj.add_to(1, 2) # returns 3, result is not cached
     """
 
+    maxsize = 10000
+
     def __init__(self, func):
         self.func = func
 
@@ -82,14 +211,20 @@ class memoize(object):
     def __call__(self, *args, **kw):
         obj = args[0]
         try:
-            cache = obj.__cache
+            caches = obj.__cache
         except AttributeError:
-            cache = obj.__cache = {}
-        key = (self.func, marshal.dumps(args[1:]), frozenset(kw.items()))
+            caches = obj.__cache = {}
         try:
-            res = cache[key]
+            cache = caches[self.func]
         except KeyError:
-            res = cache[key] = self.func(*args, **kw)
+            cache = caches[self.func] = LRUCache(
+                self.func.__qualname__, maxsize=self.maxsize
+            )
+        key = (marshal.dumps(args[1:]), frozenset(kw.items()))
+        res = cache.get(key, _missing)
+        if res is _missing:
+            res = self.func(*args, **kw)
+            cache.put(key, res)
         return res
 
 
@@ -102,9 +237,11 @@ class memoizeMapped(object):
     to limit memory usage
     """
 
+    maxsize = 100000
+
     def __init__(self, func):
         self.func = func
-        self.cache = {}
+        self.cache = LRUCache(func.__qualname__, maxsize=self.maxsize)
 
     def __get__(self, obj, objtype=None):
         if obj is None:
@@ -112,33 +249,12 @@ class memoizeMapped(object):
         return partial(self, obj)
 
     def __call__(self, obj, gkey, react, mem, withMod):
-        key1 = gkey
-        key2 = react
         # This memory hash is a bit suspect,
-        key3 = hash(tuple(sorted(mem)))
-        key4 = withMod
-        try:
-            res = self.cache[key1][key2][key3][key4]
-        except KeyError:
-            try:
-                d = self.cache[key1]
-            except KeyError:
-                self.cache[key1] = {}
-            try:
-                d = self.cache[key1][key2]
-            except KeyError:
-                self.cache[key1][key2] = {}
-            try:
-                d = self.cache[key1][key2][key3]
-            except KeyError:
-                self.cache[key1][key2][key3] = {}
-            try:
-                d = self.cache[key1][key2][key3][key4]
-            except KeyError:
-                self.cache[key1][key2][key3][key4] = None
-            res = self.cache[key1][key2][key3][key4] = self.func(
-                obj, gkey, react, mem, withMod
-            )
+        key = (gkey, react, hash(tuple(sorted(mem))), withMod)
+        res = self.cache.get(key, _missing)
+        if res is _missing:
+            res = self.func(obj, gkey, react, mem, withMod)
+            self.cache.put(key, res)
         return res
 
 
@@ -151,7 +267,6 @@ class TranslationException(Exception):
 
 
 class NumericStringParser(object):
-
     """
     Most of this code comes from the fourFn.py pyparsing example
 
@@ -0,0 +1,355 @@
+import json, os, sqlite3, threading, time
+import http.client, urllib.parse, urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+from bionetgen.core.utils.logging import BNGLogger
+from bionetgen.core.utils.utils import cache_dir
+
+
+class OfflineCacheMiss(urllib.error.HTTPError):
+    """
+    Raised in offline mode for a query that isn't in the cache. It's
+    an HTTPError so the lookups handle it like a failed connection.
+    """
+
+    def __init__(self, url):
+        super().__init__(url, 504, "Not in the offline web cache", None, None)
+
+
+def normalize_query(url, data=None):
+    """
+    Cache key of a request. Requests that only differ in the order
+    of their parameters or the case of the scheme and host get the
+    same key.
+    """
+    parts = urllib.parse.urlsplit(url)
+    query = sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values=True))
+    method = "GET"
+    body = []
+    if data is not None:
+        method = "POST"
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+        body = sorted(urllib.parse.parse_qsl(data, keep_blank_values=True))
+    return json.dumps(
+        [method, parts.scheme.lower(), parts.netloc.lower(), parts.path, query, body]
+    )
+
+
+def run_concurrently(function, argumentList, jobs=8):
+    """
+    Calls function(*arguments) for every entry of argumentList with
+    up to jobs calls running at the same time and returns the results
+    in order. A call that raises gives its exception as the result.
+    """
+
+    def call(arguments):
+        try:
+            return function(*arguments)
+        except Exception as e:
+            return e
+
+    argumentList = list(argumentList)
+    if jobs <= 1 or len(argumentList) <= 1:
+        return [call(arguments) for arguments in argumentList]
+    with ThreadPoolExecutor(max_workers=min(jobs, len(argumentList))) as executor:
+        return list(executor.map(call, argumentList))
+
+
+class ConnectionPool:
+    """
+    Bounded pool of keep-alive HTTP(S) connections. At most size
+    requests are sent at the same time and connections to a host are
+    reused by later requests. Connection errors and 5xx responses are
+    retried with an exponential backoff, redirects are followed like
+    urllib does.
+
+    Usage: ConnectionPool(size=8).request(url, data)
+
+    Arguments
+    ---------
+    size : int
+        maximum number of requests at the same time
+    timeout : float
+        seconds to wait for a connection or a response
+    retries : int
+        number of times a failed request is retried
+    backoff : float
+        seconds to wait before the first retry, doubled for every
+        following one
+
+    Methods
+    -------
+    request(url, data=None) : bytes
+        sends a GET, or a POST if data is given, and returns the body.
+        Raises an HTTPError for error responses and a URLError if the
+        host can't be reached.
+    close() : None
+        closes the idle connections
+    """
+
+    redirect_codes = (301, 302, 303, 307, 308)
+    max_redirects = 5
+
+    def __init__(self, size=8, timeout=60, retries=3, backoff=0.5) -> None:
+        self.logger = BNGLogger()
+        self.size = size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._idle = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connection(self, scheme, netloc, reuse=True):
+        with self._lock:
+            # connections can't be shared with forked processes
+            if self._pid != os.getpid():
+                self._idle = {}
+                self._pid = os.getpid()
+            idle = self._idle.get((scheme, netloc))
+            if reuse and idle:
+                return idle.pop(), True
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(netloc, timeout=self.timeout)
+        else:
+            conn = http.client.HTTPConnection(netloc, timeout=self.timeout)
+        return conn, False
+
+    def _send(self, method, url, data):
+        parts = urllib.parse.urlsplit(url)
+        selector = parts.path or "/"
+        if parts.query:
+            selector += "?" + parts.query
+        headers = {"User-Agent": "PyBioNetGen"}
+        if data is not None:
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        conn, reused = self._connection(parts.scheme, parts.netloc)
+        while True:
+            try:
+                conn.request(method, selector, body=data, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+                break
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                if not reused:
+                    raise
+                # the server closed the idle connection, use a new one
+                conn, reused = self._connection(parts.scheme, parts.netloc, False)
+        if response.will_close:
+            conn.close()
+        else:
+            with self._lock:
+                self._idle.setdefault((parts.scheme, parts.netloc), []).append(conn)
+        return response, body
+
+    def _request(self, url, data):
+        method = "GET" if data is None else "POST"
+        for _ in range(self.max_redirects + 1):
+            with self._slots:
+                response, body = self._send(method, url, data)
+            if response.status in self.redirect_codes:
+                url = urllib.parse.urljoin(url, response.getheader("Location", ""))
+                if response.status in (301, 302, 303) and method == "POST":
+                    method = "GET"
+                    data = None
+                continue
+            if response.status >= 400:
+                raise urllib.error.HTTPError(
+                    url, response.status, response.reason, response.headers, None
+                )
+            return body
+        raise urllib.error.HTTPError(
+            url, response.status, "Too many redirects", response.headers, None
+        )
+
+    def request(self, url, data=None):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        for attempt in range(self.retries + 1):
+            try:
+                return self._request(url, data)
+            except urllib.error.HTTPError as e:
+                if e.code < 500 or attempt == self.retries:
+                    raise
+                error = e
+            except (OSError, http.client.HTTPException) as e:
+                if attempt == self.retries:
+                    raise urllib.error.URLError(e)
+                error = e
+            delay = self.backoff * 2**attempt
+            self.logger.debug(
+                f"{url} failed with {error}, retrying in {delay} s",
+                loc=f"{__file__} : ConnectionPool.request()",
+            )
+            time.sleep(delay)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+class WebCache:
+    """
+    Disk backed cache of the web service responses the atomizer uses
+    (Pathway Commons, BioGRID, UniProt, annotation lookups). Responses
+    are stored in a sqlite file keyed by the normalized query, so they
+    are shared by all processes using the same file and survive between
+    runs. Entries older than ttl seconds are fetched again. In offline
+    mode nothing is fetched, every entry is used regardless of its age
+    and queries that aren't cached fail like a lost connection.
+
+    Usage: web_cache.configure(offline=True)
+           response = web_cache.fetch(url, data)
+
+    Arguments
+    ---------
+    path : str
+        (optional) path to the sqlite file, defaults to web_cache.sqlite
+        in the PyBNG cache folder
+    ttl : float
+        seconds a response is used for, None to keep them forever
+    offline : bool
+        only replay cached responses
+    connections : int
+        maximum number of requests sent at the same time
+
+    Attributes
+    ----------
+    hits : int
+        number of lookups answered from the cache
+    misses : int
+        number of lookups that weren't in the cache
+    pool : ConnectionPool
+        the connections responses are fetched with
+
+    Methods
+    -------
+    configure(path=None, ttl=None, offline=None, connections=None) : None
+        changes the cache file, ttl, offline mode or connection limit
+    get(key) : bytes
+        returns the stored value for the key or None
+    put(key, value) : None
+        stores the value (bytes or str) for the key
+    fetch(url, data=None) : bytes
+        returns the response body of a GET, or a POST if data is
+        given, from the cache or the web
+    fetch_all(requests) : list
+        fetches a list of (url, data) requests at the same time and
+        returns the bodies in order, or the exception of a request
+        that failed
+    clear() : None
+        deletes every stored response
+    """
+
+    default_ttl = 30 * 24 * 3600
+
+    def __init__(
+        self, path=None, ttl=default_ttl, offline=False, connections=8
+    ) -> None:
+        self.logger = BNGLogger()
+        self.path = path
+        self.ttl = ttl
+        self.offline = offline
+        self.pool = ConnectionPool(size=connections)
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def configure(self, path=None, ttl=None, offline=None, connections=None):
+        if path is not None and path != self.path:
+            self.path = path
+            self._db = None
+        if ttl is not None:
+            self.ttl = ttl
+        if offline is not None:
+            self.offline = offline
+        if connections is not None and connections != self.pool.size:
+            self.pool.close()
+            self.pool = ConnectionPool(size=connections)
+
+    def _connect(self):
+        # connections can't be shared with forked processes
+        if self._db is not None and self._pid == os.getpid():
+            return self._db
+        path = self.path
+        if path is None:
+            path = os.path.join(cache_dir(), "web_cache.sqlite")
+        try:
+            if path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS web_responses "
+                "(key TEXT PRIMARY KEY, value BLOB, created REAL)"
+            )
+            self._db.commit()
+        except (OSError, sqlite3.Error) as e:
+            self.logger.warning(
+                f"Can't use the web cache at {path}, responses won't be stored: {e}",
+                loc=f"{__file__} : WebCache._connect()",
+            )
+            self._db = None
+        self._pid = os.getpid()
+        return self._db
+
+    def get(self, key):
+        with self._lock:
+            db = self._connect()
+            row = None
+            if db is not None:
+                row = db.execute(
+                    "SELECT value, created FROM web_responses WHERE key = ?", (key,)
+                ).fetchone()
+        if row is not None:
+            value, created = row
+            if self.offline or self.ttl is None or time.time() - created <= self.ttl:
+                self.hits += 1
+                return bytes(value)
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        with self._lock:
+            db = self._connect()
+            if db is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO web_responses VALUES (?, ?, ?)",
+                    (key, sqlite3.Binary(value), time.time()),
+                )
+                db.commit()
+
+    def fetch(self, url, data=None):
+        key = normalize_query(url, data)
+        value = self.get(key)
+        if value is not None:
+            return value
+        if self.offline:
+            raise OfflineCacheMiss(url)
+        self.logger.debug(f"fetching {url}", loc=f"{__file__} : WebCache.fetch()")
+        value = self.pool.request(url, data=data)
+        self.put(key, value)
+        return value
+
+    def fetch_all(self, requests):
+        return run_concurrently(self.fetch, requests, jobs=self.pool.size)
+
+    def clear(self):
+        with self._lock:
+            db = self._connect()
+            if db is not None:
+                db.execute("DELETE FROM web_responses")
+                db.commit()
+
+
+# shared by all atomizer lookups in the process
+web_cache = WebCache()
@@ -72,6 +72,11 @@ class BNGDefaults:
         # cvode paths
         CONFIG["bionetgen"]["cvode_lib"] = None
         CONFIG["bionetgen"]["cvode_include"] = None
+        # optional KLU paths for the sparse solver
+        CONFIG["bionetgen"]["klu_lib"] = None
+        CONFIG["bionetgen"]["klu_include"] = None
+        # True for SUNDIALS 2.7 sparse matrices, None checks the headers
+        CONFIG["bionetgen"]["sundials_sls_indexvals"] = None
         # set attributes
         self.bng_path = os.path.join(lib_path, bng_name)
         self.lib_path = lib_path
@@ -91,3 +96,23 @@ class BNGDefaults:
 
 
 defaults = BNGDefaults()
+
+# app configuration, see get_config
+_app_config = None
+
+
+def get_config():
+    """
+    Returns the "bionetgen" section of the CLI app configuration,
+    the defaults above updated with the user's config files. The
+    cement app is only set up the first time this is called and
+    the configuration is shared by everything in the process.
+    """
+    global _app_config
+    if _app_config is None:
+        from bionetgen.main import BioNetGen
+
+        app = BioNetGen()
+        app.setup()
+        _app_config = app.config["bionetgen"]
+    return _app_config
@@ -38,6 +38,27 @@ class BNGParseError(BNGError):
         super().__init__(self.message)
 
 
+class BNGPatternError(BNGError):
+    """Error related to parsing a BNG pattern string."""
+
+    def __init__(self, pattern, position, message="Can't parse the pattern"):
+        self.pattern = pattern
+        self.position = position
+        self.message = (
+            f"{message} at position {position}:\n{pattern}\n{' ' * position}^"
+        )
+        super().__init__(self.message)
+
+
+class BNGExpressionError(BNGError):
+    """Error related to parsing or evaluating a math expression."""
+
+    def __init__(self, expression, message="There was an issue with the expression"):
+        self.expression = expression
+        self.message = f"{message}: {expression}"
+        super().__init__(self.message)
+
+
 class BNGFileError(BNGError):
     """Error related to the BNGL file."""
 
@@ -82,6 +103,25 @@ class BNGRunError(BNGError):
         super().__init__(self.message)
 
 
+class BNGWorkerError(BNGError):
+    """Error related to a BNG2.pl console worker process."""
+
+    def __init__(
+        self,
+        command,
+        message="The BNG2.pl console worker stopped responding",
+        output=None,
+    ):
+        self.command = command
+        self.output = output
+        full_msg = f"Tried to send command: {command}\n"
+        full_msg += message + "\n"
+        if output is not None:
+            full_msg += f"Output was: {output}\n"
+        self.message = full_msg
+        super().__init__(self.message)
+
+
 class BNGCompileError(BNGError):
     """Error related to compiling C/Py file of BNG model."""
 
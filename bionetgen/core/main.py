@@ -94,6 +94,9 @@ def runAtomizeTool(app):
     # run AtomizeTool
     from bionetgen.atomizer import AtomizeTool
 
+    if os.path.isdir(args.input):
+        runBatchAtomizeTool(app)
+        return
     app.log.debug("Instantiating AtomizeTool object", f"{__file__} : runAtomizeTool()")
     a = AtomizeTool(parser_namespace=args, app=app)
     # do config specific stuff here if need be, or remove the config requirement
@@ -129,6 +132,49 @@ def runAtomizeTool(app):
                 G.write_graph(f"{model_name}_{graph_name}.graphml", pretty_print=True)
 
 
+def runBatchAtomizeTool(app):
+    """
+    Uses BatchAtomizeTool class to atomize every SBML file in
+    the input folder
+    """
+    args = app.pargs
+    from bionetgen.atomizer import BatchAtomizeTool
+    from bionetgen.atomizer.batchAtomizeTool import findSBMLFiles
+
+    # every AtomizeTool option given on the command line
+    options = {
+        key: value
+        for key, value in vars(args).items()
+        if key not in ("input", "output", "jobs", "timeout")
+    }
+    # the workers run without the app, so they get the log level
+    # resolved here
+    if args.debug:
+        options["log_level"] = "DEBUG"
+    elif args.log_level is None:
+        options["log_level"] = "INFO"
+    app.log.debug(
+        "Instantiating BatchAtomizeTool object", f"{__file__} : runBatchAtomizeTool()"
+    )
+    batch = BatchAtomizeTool(
+        findSBMLFiles(args.input),
+        args.output,
+        jobs=args.jobs,
+        timeout=args.timeout,
+        options_dict=options,
+        app=app,
+    )
+    app.log.debug("Atomizing", f"{__file__} : runBatchAtomizeTool()")
+    results = batch.run()
+    failed = [result for result in results if result["status"] != "ok"]
+    print(
+        f"Atomized {len(results) - len(failed)} of {len(results)} files, "
+        f"summary written to {batch.summary_file}"
+    )
+    for result in failed:
+        print(f"{result['status']}: {result['input']} {result['error']}")
+
+
 def printInfo(app):
     """
     Uses BNGInfo class to print BioNetGen information using
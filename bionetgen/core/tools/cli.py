@@ -18,6 +18,11 @@ class BNGCLI:
         path to the output folder to run the model in
     bngpath : str
         path to BioNetGen folder where BNG2.pl lives
+    pool : BNGWorkerPool
+        (optional) pool of BNG2.pl console workers to run the model
+        on, True uses the pool shared by the process. The pool isn't
+        used if a timeout is given, the workers can't stop a job
+        after timeout seconds so BNG2.pl is run directly.
 
     Methods
     -------
@@ -34,6 +39,7 @@ class BNGCLI:
         log_file=None,
         timeout=None,
         app=None,
+        pool=None,
     ):
         self.app = app
         self.logger = BNGLogger(app=self.app)
@@ -68,6 +74,13 @@ class BNGCLI:
         self.suppress = suppress
         self.log_file = log_file
         self.timeout = timeout
+        if timeout is not None:
+            pool = None
+        if pool is True:
+            from bionetgen.core.utils.workers import get_worker_pool
+
+            pool = get_worker_pool(self.bng_exec)
+        self.pool = pool
 
     def _set_output(self, output):
         self.logger.debug(
@@ -82,6 +95,33 @@ class BNGCLI:
             os.mkdir(output)
             os.chdir(output)
 
+    def _run_on_pool(self, model_file):
+        # returns a None return code if the pool couldn't run the
+        # model, it's then run with BNG2.pl directly
+        from bionetgen.core.utils.utils import ActionList
+        from bionetgen.core.utils.workers import model_actions
+        from bionetgen.core.exc import BNGWorkerError
+
+        self.logger.debug(
+            "Running the model on the worker pool",
+            loc=f"{__file__} : BNGCLI._run_on_pool()",
+        )
+        with open(model_file, "r", encoding="UTF-8") as f:
+            actions = model_actions(f.read(), ActionList().possible_types)
+        try:
+            out = self.pool.run(model_file, actions=actions, output_dir=os.getcwd())
+        except BNGRunError as e:
+            return 1, e.stdout.split("\n")
+        except BNGWorkerError as e:
+            self.logger.warning(
+                f"BNG2.pl worker failed, running BNG2.pl directly: {e.message}",
+                loc=f"{__file__} : BNGCLI._run_on_pool()",
+            )
+            return None, None
+        if not self.suppress:
+            print("\n".join(out))
+        return 0, out
+
     def run(self):
         self.logger.debug("Running", loc=f"{__file__} : BNGCLI.run()")
         from bionetgen.core.utils.utils import run_command
@@ -118,8 +158,12 @@ class BNGCLI:
             fname = os.path.basename(self.inp_path)
             fname = fname.replace(".bngl", "")
             command = ["perl", self.bng_exec, self.inp_path]
-        self.logger.debug("Running command", loc=f"{__file__} : BNGCLI.run()")
-        rc, out = run_command(command, suppress=self.suppress, timeout=self.timeout)
+        rc = None
+        if self.pool is not None:
+            rc, out = self._run_on_pool(command[-1])
+        if rc is None:
+            self.logger.debug("Running command", loc=f"{__file__} : BNGCLI.run()")
+            rc, out = run_command(command, suppress=self.suppress, timeout=self.timeout)
         if self.log_file is not None:
             self.logger.debug("Setting up log file", loc=f"{__file__} : BNGCLI.run()")
             # test if we were given a path
@@ -164,6 +208,8 @@ class BNGCLI:
                 os.environ["BNGPATH"] = self.old_bngpath
             if hasattr(out, "stdout"):
                 stdout_str = out.stdout.decode("utf-8")
+            elif isinstance(out, list):
+                stdout_str = "\n".join(out)
             else:
                 stdout_str = None
             if hasattr(out, "stdout"):
@@ -1,6 +1,7 @@
-import os
+import os, itertools
 import numpy as np
 
+from bionetgen.core.exc import BNGFileError
 from bionetgen.core.utils.logging import BNGLogger
 
 
@@ -24,6 +25,12 @@ class BNGResult:
     load(fpath)
         loads in the direct path to the file and returns
         numpy.recarray
+    observables_from_species(network, cdat=None, chunk_size=10000)
+        computes the observables of a network from a cdat file
+        using the groups block of the network, returns numpy.recarray
+    observables_from_patterns(network, observables, cdat=None, chunk_size=10000)
+        computes new observables from a cdat file by matching their
+        patterns against the species of the network, returns numpy.recarray
     """
 
     def __init__(self, path=None, direct_path=None, app=None):
@@ -176,3 +183,158 @@ class BNGResult:
         return np.rec.array(
             np.loadtxt(path, dtype={"names": names, "formats": formats})
         )
+
+    def observables_from_species(self, network, cdat=None, chunk_size=10000):
+        """
+        Computes all observables defined in the groups block of a network
+        from a cdat species trajectory. The groups block is turned into a
+        sparse groups x species weight matrix and applied to the cdat file
+        chunk by chunk, so the full species trajectory never has to be
+        loaded into memory.
+
+        Arguments
+        ---------
+        network : Network or str
+            a parsed Network object or the path to a .net file
+        cdat : str
+            (optional) either the name of a loaded cdat (key of cnames)
+            or a path to a cdat file. Can be omitted if this object
+            points to a single cdat file.
+        chunk_size : int
+            number of time points to read from the cdat file at a time
+
+        Returns
+        -------
+        numpy.recarray
+            a record array with a time column and one column per group,
+            in the same format as a loaded gdat file
+        """
+        if isinstance(network, str):
+            from bionetgen.network.network import Network
+
+            network = Network(network)
+        cdat_path = self._find_cdat(cdat)
+        self.logger.debug(
+            f"Computing observables from {cdat_path}",
+            loc=f"{__file__} : BNGResult.observables_from_species()",
+        )
+        names, rows, cols, weights = network.groups.sparse_matrix()
+        return self._species_matrix_product(
+            cdat_path, names, rows, cols, weights, chunk_size=chunk_size
+        )
+
+    def observables_from_patterns(
+        self, network, observables, cdat=None, chunk_size=10000
+    ):
+        """
+        Computes observables that weren't part of the simulated model
+        from a cdat species trajectory. The patterns of each observable are
+        matched against every species of the network and the resulting
+        sparse observables x species matrix is applied to the cdat file
+        the same way observables_from_species does. Match results are
+        cached on the network so repeated calls are cheap.
+
+        Arguments
+        ---------
+        network : Network or str
+            a parsed Network object or the path to a .net file
+        observables : ObservableBlock or list[Observable]
+            the observables to compute, e.g. the observables block of a
+            bngmodel or a list of Observable objects
+        cdat : str
+            (optional) either the name of a loaded cdat (key of cnames)
+            or a path to a cdat file
+        chunk_size : int
+            number of time points to read from the cdat file at a time
+
+        Returns
+        -------
+        numpy.recarray
+            a record array with a time column and one column per observable
+        """
+        if isinstance(network, str):
+            from bionetgen.network.network import Network
+
+            network = Network(network)
+        if hasattr(observables, "items"):
+            observables = list(observables.items.values())
+        cdat_path = self._find_cdat(cdat)
+        self.logger.debug(
+            f"Computing observables from patterns for {cdat_path}",
+            loc=f"{__file__} : BNGResult.observables_from_patterns()",
+        )
+        names, rows, cols, weights = network.matcher.sparse_matrix(observables)
+        return self._species_matrix_product(
+            cdat_path, names, rows, cols, weights, chunk_size=chunk_size
+        )
+
+    def _find_cdat(self, cdat=None):
+        """
+        Resolves the path to a cdat file from a cdat name, a path
+        or the files this object was pointed to.
+        """
+        if cdat is None:
+            if hasattr(self, "direct_path") and self.file_extension == ".cdat":
+                return self.direct_path
+            if len(self.cnames) == 1:
+                cdat = list(self.cnames.keys())[0]
+            else:
+                raise BNGFileError(
+                    None,
+                    message="Can't determine which cdat file to use, please supply the cdat argument",
+                )
+        if cdat in self.cnames:
+            return os.path.join(self.path, self.cnames[cdat])
+        if os.path.isfile(cdat):
+            return cdat
+        raise BNGFileError(cdat, message=f"cdat file {cdat} not found")
+
+    def _species_matrix_product(
+        self, cdat_path, names, rows, cols, weights, chunk_size=10000
+    ):
+        """
+        Streams a cdat file and multiplies each chunk of the species
+        trajectory with a sparse matrix given in coordinate form, rows
+        index into names and cols are 0-indexed species. Returns a
+        record array with the time column followed by one column per name.
+        """
+        # sort the non-zero entries by row so each row is a contiguous
+        # segment and we can sum segments with a single reduceat call
+        rows = np.asarray(rows, dtype=np.int64)
+        order = np.argsort(rows, kind="stable")
+        rows = rows[order]
+        cols = np.asarray(cols, dtype=np.int64)[order]
+        weights = np.asarray(weights, dtype=np.float64)[order]
+        row_ids, starts = np.unique(rows, return_index=True)
+        chunks = []
+        with open(cdat_path, "r") as f:
+            header = f.readline()
+            if not header.startswith("#"):
+                raise BNGFileError(
+                    cdat_path, message="No header line that starts with #"
+                )
+            # first column is time
+            n_species = len(header.replace("#", "").split()) - 1
+            if len(cols) > 0 and cols.max() >= n_species:
+                raise BNGFileError(
+                    cdat_path,
+                    message=f"Species index {cols.max() + 1} is out of bounds for cdat file with {n_species} species",
+                )
+            while True:
+                lines = list(itertools.islice(f, chunk_size))
+                if len(lines) == 0:
+                    break
+                data = np.loadtxt(lines, ndmin=2)
+                result = np.zeros((data.shape[0], len(names) + 1))
+                result[:, 0] = data[:, 0]
+                if len(cols) > 0:
+                    contrib = data[:, cols + 1] * weights
+                    result[:, row_ids + 1] = np.add.reduceat(contrib, starts, axis=1)
+                chunks.append(result)
+        if len(chunks) > 0:
+            result = np.concatenate(chunks)
+        else:
+            result = np.zeros((0, len(names) + 1))
+        return np.rec.fromarrays(
+            result.T, names=["time"] + list(names), formats=["f8"] * (len(names) + 1)
+        )
@@ -1,4 +1,4 @@
-import colorlog
+import colorlog, logging
 
 # global log level, can be set using
 # from bionetgen.core.utils import logging
@@ -41,17 +41,27 @@ class BNGLogger:
         error reporting. for cement app this will be passed directly
         to app.log, for regular logging this will be parsed to get
         the right logger
-    log_level : str
+    level : str
         this attribute sets the logging level to output. Options are
         the same as regular python logging, "DEBUG", "INFO", "WARNING",
         "ERROR", "CRITICAL"
+    is_debug : bool
+        True if DEBUG level messages are written. This is cached when
+        the level is set so hot code can skip building debug messages
+        with a single check, e.g.
+            if logger.is_debug:
+                logger.debug(f"matched {pattern}", loc=loc)
 
     Methods
     -------
     get_logger : logger
         this method returns the correct logger after parsing the loc string
     debug : None
-        same as all python logging, writes a message at DEBUG level
+        same as all python logging, writes a message at DEBUG level.
+        Messages are only built if they are written, the message can
+        be a %-style format string followed by its arguments, e.g.
+        logger.debug("matched %s", pattern, loc=loc), or a callable
+        returning the message
     info : None
         same as all python logging, writes a message at INFO level
     warning : None
@@ -65,6 +75,8 @@ class BNGLogger:
     def __init__(self, app=None, level="INFO", loc=None):
         self.app = app
         self.loc = loc
+        self._level = None
+        self._is_debug = False
         # global ll overrides everything
         if log_level is not None:
             self.level = log_level
@@ -78,11 +90,41 @@ class BNGLogger:
                 self.level = app.pargs.log_level
                 if self.level != self.app.log.get_level():
                     self.app.log.set_level(self.level)
+            else:
+                self._is_debug = self.app.log.get_level() == "DEBUG"
         # what this is instantiated with is the least
         # at least for now
         else:
             self.level = level
 
+    @property
+    def level(self):
+        return self._level
+
+    @level.setter
+    def level(self, value):
+        self._level = value
+        if isinstance(value, str):
+            value = logging.getLevelName(value.upper())
+        self._is_debug = isinstance(value, int) and value <= logging.DEBUG
+
+    @property
+    def is_debug(self):
+        return self._is_debug
+
+    @staticmethod
+    def format_message(msg, args):
+        """
+        Builds a lazy message, msg can be a callable
+        returning the message and args are formatted
+        into the message with %
+        """
+        if callable(msg):
+            msg = msg()
+        if args:
+            msg = msg % args
+        return msg
+
     def get_logger(self, loc=None):
         """
         From a given loc string returns the correct python
@@ -108,10 +150,13 @@ class BNGLogger:
         logger.setLevel(self.level)
         return logger
 
-    def debug(self, msg, loc=None):
+    def debug(self, msg, *args, loc=None):
         """
         Debug level messages
         """
+        if not self._is_debug:
+            return
+        msg = self.format_message(msg, args)
         if self.app is None:
             logger = self.get_logger(loc=loc)
             if loc is not None:
@@ -122,10 +167,11 @@ class BNGLogger:
         else:
             self.app.log.debug(msg, loc)
 
-    def info(self, msg, loc=None):
+    def info(self, msg, *args, loc=None):
         """
         Info level messages
         """
+        msg = self.format_message(msg, args)
         if self.app is None:
             logger = self.get_logger(loc=loc)
             if loc is not None:
@@ -136,10 +182,11 @@ class BNGLogger:
         else:
             self.app.log.info(msg, loc)
 
-    def warning(self, msg, loc=None):
+    def warning(self, msg, *args, loc=None):
         """
         Warning level messages
         """
+        msg = self.format_message(msg, args)
         if self.app is None:
             logger = self.get_logger(loc=loc)
             if loc is not None:
@@ -150,10 +197,11 @@ class BNGLogger:
         else:
             self.app.log.warning(msg, loc)
 
-    def error(self, msg, loc=None):
+    def error(self, msg, *args, loc=None):
         """
         Error level messages
         """
+        msg = self.format_message(msg, args)
         if self.app is None:
             logger = self.get_logger(loc=loc)
             if loc is not None:
@@ -164,10 +212,11 @@ class BNGLogger:
         else:
             self.app.log.error(msg, loc)
 
-    def critical(self, msg, loc=None):
+    def critical(self, msg, *args, loc=None):
         """
         Critical level messages
         """
+        msg = self.format_message(msg, args)
         if self.app is None:
             logger = self.get_logger(loc=loc)
             if loc is not None:
@@ -1,6 +1,5 @@
-import os, subprocess
+import json, os, shutil, subprocess
 from bionetgen.core.exc import BNGPerlError
-from distutils import spawn
 
 from bionetgen.core.utils.logging import BNGLogger
 
@@ -570,7 +569,7 @@ def find_BNG_path(BNGPATH=None):
         if test_bngexec(bngexec):
             # print("BNG2.pl seems to be working")
             # get the source of BNG2.pl
-            BNGPATH = spawn.find_executable("BNG2.pl")
+            BNGPATH = shutil.which("BNG2.pl")
             BNGPATH, _ = os.path.split(BNGPATH)
     else:
         bngexec = os.path.join(BNGPATH, "BNG2.pl")
@@ -579,9 +578,123 @@ def find_BNG_path(BNGPATH=None):
     return BNGPATH, bngexec
 
 
+# results of executable checks in this process, see check_executable
+_executable_checks = {}
+
+
+def cache_dir():
+    """
+    Folder for files PyBNG keeps between runs, under
+    XDG_CACHE_HOME if it's set and ~/.cache otherwise
+    """
+    base_dir = os.environ.get("XDG_CACHE_HOME")
+    if base_dir is None:
+        base_dir = os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base_dir, "bionetgen")
+
+
+def executable_checks_file():
+    """
+    Path to the file where successful executable checks are
+    stored so that later processes don't need to run them again
+    """
+    return os.path.join(cache_dir(), "executable_checks.json")
+
+
+def _read_executable_checks():
+    try:
+        with open(executable_checks_file(), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_executable_checks(checks):
+    path = executable_checks_file()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write and rename so readers never see half a file
+        tmp_path = f"{path}.{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            json.dump(checks, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def check_executable(path, command):
+    """
+    Runs the command to check that the executable at path works.
+    The result is memoized by the absolute path and modification
+    time of the executable, once per process and, if the check
+    succeeds, on disk in executable_checks_file(). Editing or
+    replacing the executable invalidates the result, see
+    revalidate to run the check again regardless.
+
+    Arguments
+    ---------
+    path : str
+        path to the executable that's checked
+    command : list[str]
+        command to run, the check succeeds if it returns 0
+    """
+    try:
+        path = os.path.abspath(path)
+        key = f"{path}:{os.path.getmtime(path)}:{' '.join(command)}"
+    except OSError:
+        # can't tell if the file changes, just run the check
+        key = None
+    if key is not None:
+        if key in _executable_checks:
+            return _executable_checks[key]
+        if _read_executable_checks().get(key, False):
+            _executable_checks[key] = True
+            return True
+    rc, _ = run_command(command)
+    works = rc == 0
+    if key is not None:
+        _executable_checks[key] = works
+        if works:
+            checks = _read_executable_checks()
+            checks[key] = True
+            _write_executable_checks(checks)
+    return works
+
+
+def revalidate(path=None):
+    """
+    Forgets the memoized checks of the executable at path, or of
+    all executables if path is None, so they are run again the
+    next time they are needed. If path is BNG2.pl it is checked
+    right away and the result is returned.
+
+    Usage: revalidate()
+           revalidate(bngexec)
+
+    Arguments
+    ---------
+    path : str
+        (optional) path to the executable
+    """
+    if path is None:
+        _executable_checks.clear()
+        _write_executable_checks({})
+        return None
+    prefix = os.path.abspath(path) + ":"
+    for checks in (_executable_checks, _read_executable_checks()):
+        for key in [key for key in checks if key.startswith(prefix)]:
+            checks.pop(key)
+        if checks is not _executable_checks:
+            _write_executable_checks(checks)
+    if os.path.basename(path) == "BNG2.pl":
+        return test_bngexec(path)
+    return None
+
+
 def test_perl(app=None, perl_path=None):
     """
-    Test if perl is working
+    Test if perl is working, the result is memoized
+    see check_executable
 
     Arguments
     ---------
@@ -592,19 +705,18 @@ def test_perl(app=None, perl_path=None):
     logger.debug("Checking if perl is installed.", loc=f"{__file__} : test_perl()")
     # find path to perl binary
     if perl_path is None:
-        perl_path = spawn.find_executable("perl")
+        perl_path = shutil.which("perl")
     if perl_path is None:
         raise BNGPerlError
     # check if perl is actually working
-    command = [perl_path, "-v"]
-    rc, _ = run_command(command)
-    if rc != 0:
+    if not check_executable(perl_path, [perl_path, "-v"]):
         raise BNGPerlError
 
 
 def test_bngexec(bngexec):
     """
-    A simple function that test if BNG2.pl given runs
+    A simple function that test if BNG2.pl given runs, the
+    result is memoized, see check_executable
 
     Usage: test_bngexec(path)
 
@@ -613,12 +725,7 @@ def test_bngexec(bngexec):
     bngexec : str
         path to BNG2.pl to test
     """
-    command = ["perl", bngexec]
-    rc, _ = run_command(command)
-    if rc == 0:
-        return True
-    else:
-        return False
+    return check_executable(bngexec, ["perl", bngexec])
 
 
 def run_command(command, suppress=True, timeout=None):
@@ -0,0 +1,359 @@
+import atexit, os, queue, re, subprocess, threading
+
+from bionetgen.core.exc import BNGRunError, BNGWorkerError
+from bionetgen.core.utils.logging import BNGLogger
+
+# BNG2.pl prints this, without a newline, when it's ready for input
+PROMPT = "BNG> "
+# console warnings that mean the command didn't go through
+FAILURES = (
+    "WARNING: Problem executing action",
+    "WARNING: Some problem processing",
+    "WARNING: Attempted to load model",
+    "WARNING: Attempt to",
+    "WARNING: Invalid action syntax",
+    "WARNING: Unrecognized input",
+    "WARNING: Error processing command line arguments",
+)
+
+
+def _perl_string(value):
+    # single quoted perl string, nothing in it gets interpolated
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def model_actions(bngl_str, action_types):
+    """
+    Returns the action lines of a BNGL model string in order, as
+    "name(options)" strings the BNG2.pl console can execute.
+    """
+    # joins lines continued with "\" like BNG2.pl does
+    bngl_str = re.sub(r"\\\s*\n", " ", bngl_str)
+    action_re = re.compile(r"^\s*(%s)\s*\((.*)\);?\s*$" % "|".join(action_types))
+    actions = []
+    for line in bngl_str.split("\n"):
+        # comments, but not a # inside a quoted string
+        line = re.sub(r"#(?=(?:[^\"']|\"[^\"]*\"|'[^']*')*$).*", "", line)
+        match = action_re.match(line)
+        if match is not None:
+            actions.append(f"{match.group(1)}({match.group(2).strip()})")
+    return actions
+
+
+class BNGWorker:
+    """
+    A long lived BNG2.pl process in console mode. Commands are
+    written to the process over a pipe and the output is read until
+    the console prompt comes back, so perl and the BNG modules are
+    only started and compiled once for many models.
+
+    Usage: BNGWorker(bngexec).run_job(model_file, actions, output_dir)
+
+    Arguments
+    ---------
+    bngexec : str
+        path to BNG2.pl
+    timeout : float
+        (optional) seconds to wait for a command before the worker
+        is considered stuck and killed
+
+    Attributes
+    ----------
+    process : subprocess.Popen
+        the BNG2.pl process, None if it's not started
+    jobs : int
+        number of jobs the worker has run
+
+    Methods
+    -------
+    start() : None
+        starts BNG2.pl and waits for the first prompt
+    alive() : bool
+        checks if the process is still running
+    command(line) : list[str]
+        sends a console command and returns the output lines, raises
+        a BNGWorkerError if the process dies or times out
+    run_job(model_file, actions=(), output_dir=None) : list[str]
+        loads the model, runs the actions in output_dir, where the
+        results go, and clears the model. Raises a BNGRunError if
+        BNG2.pl reports a problem with the model or an action.
+    close() : None
+        asks the console to quit and stops the process
+    """
+
+    def __init__(self, bngexec, timeout=None) -> None:
+        self.logger = BNGLogger()
+        self.bngexec = bngexec
+        self.timeout = timeout
+        self.process = None
+        self.jobs = 0
+        self._chunks = None
+
+    def start(self):
+        self.logger.debug(
+            f"starting BNG2.pl console worker for {self.bngexec}",
+            loc=f"{__file__} : BNGWorker.start()",
+        )
+        env = dict(os.environ)
+        env["BNGPATH"] = os.path.dirname(os.path.abspath(self.bngexec))
+        self.process = subprocess.Popen(
+            ["perl", self.bngexec, "--console"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            env=env,
+        )
+        # the prompt isn't followed by a newline, so the output is
+        # read in chunks by a thread that can be waited on with a timeout
+        self._chunks = queue.Queue()
+        reader = threading.Thread(
+            target=self._read, args=(self.process.stdout, self._chunks), daemon=True
+        )
+        reader.start()
+        self._read_prompt("--console")
+
+    @staticmethod
+    def _read(stream, chunks):
+        fd = stream.fileno()
+        while True:
+            try:
+                chunk = os.read(fd, 65536)
+            except OSError:
+                chunk = b""
+            chunks.put(chunk)
+            if not chunk:
+                return
+
+    def _read_prompt(self, line):
+        output = b""
+        while not output.endswith(PROMPT.encode()):
+            try:
+                chunk = self._chunks.get(timeout=self.timeout)
+            except queue.Empty:
+                self.kill()
+                raise BNGWorkerError(
+                    line,
+                    message=f"BNG2.pl didn't respond within {self.timeout} seconds",
+                    output=output.decode("utf-8", "replace"),
+                )
+            if not chunk:
+                self.kill()
+                raise BNGWorkerError(
+                    line,
+                    message="BNG2.pl console exited",
+                    output=output.decode("utf-8", "replace"),
+                )
+            output += chunk
+        output = output.decode("utf-8", "replace")[: -len(PROMPT)]
+        return output.splitlines()
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def command(self, line):
+        if not self.alive():
+            raise BNGWorkerError(line, message="BNG2.pl console isn't running")
+        debug = self.logger.is_debug
+        if debug:
+            self.logger.debug(
+                f"sending {line}", loc=f"{__file__} : BNGWorker.command()"
+            )
+        try:
+            self.process.stdin.write((line + "\n").encode("utf-8"))
+            self.process.stdin.flush()
+        except OSError:
+            self.kill()
+            raise BNGWorkerError(line, message="Couldn't write to the BNG2.pl console")
+        lines = self._read_prompt(line)
+        # the console echoes the input when it's not a terminal
+        if len(lines) > 0 and lines[0].strip() == line.strip():
+            lines = lines[1:]
+        return lines
+
+    def _check(self, line, lines, allowed=()):
+        for out_line in lines:
+            if out_line.startswith(FAILURES) and out_line not in allowed:
+                raise BNGRunError(
+                    line,
+                    message=f"BNG2.pl reported a problem: {out_line}",
+                    stdout="\n".join(lines),
+                )
+
+    def run_job(self, model_file, actions=(), output_dir=None):
+        if not self.alive():
+            self.start()
+        self.jobs += 1
+        output = []
+        model_file = os.path.abspath(model_file)
+        if output_dir is None:
+            output_dir = os.getcwd()
+        output_dir = os.path.abspath(output_dir)
+        try:
+            line = f"load {model_file}"
+            lines = self.command(line)
+            output += lines
+            self._check(line, lines)
+            # the console runs actions as perl, so the worker changes
+            # to the output directory here and relative paths in the
+            # actions resolve like in a BNG2.pl run started there.
+            # setOutputDir returns the directory, which the console
+            # reports as a problem even though it was set
+            directory = _perl_string(output_dir)
+            line = (
+                f"action setOutputDir(do {{ chdir({directory})"
+                f" or die 'no such directory'; {directory} }})"
+            )
+            lines = self.command(line)
+            self._check(
+                line,
+                lines,
+                allowed=(f"WARNING: Problem executing action: {output_dir}.",),
+            )
+            for action in actions:
+                line = f"action {action}"
+                lines = self.command(line)
+                output += lines
+                self._check(line, lines)
+        finally:
+            if self.alive():
+                self.command("clear")
+        return output
+
+    def kill(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+    def close(self):
+        if self.alive():
+            try:
+                self.process.stdin.write(b"done\n")
+                self.process.stdin.flush()
+                self.process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+        self.kill()
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.stdout.close()
+        self.process = None
+
+
+class BNGWorkerPool:
+    """
+    Pool of BNG2.pl console workers. Jobs are given to an idle
+    worker, a new worker is started if there are fewer than size
+    workers and otherwise the job waits for one to be free. Workers
+    are replaced after max_jobs jobs, so memory BNG2.pl holds on to
+    between models is given back, and when they crash or time out.
+
+    Jobs run in their output directory, output files go there and
+    relative paths inside a model's actions (e.g. readFile) are
+    resolved from it.
+
+    Usage: pool = BNGWorkerPool(bngexec, size=2)
+           pool.run(model_file, ["generate_network({overwrite=>1})"], output_dir)
+
+    Arguments
+    ---------
+    bngexec : str
+        path to BNG2.pl
+    size : int
+        maximum number of workers
+    max_jobs : int
+        number of jobs after which a worker is restarted
+    timeout : float
+        (optional) seconds to wait for a single command
+
+    Methods
+    -------
+    run(model_file, actions=(), output_dir=None) : list[str]
+        runs a job on a worker and returns the BNG2.pl output, raises
+        a BNGRunError if the model or an action fails and a
+        BNGWorkerError if the worker crashed
+    close() : None
+        stops all workers
+    """
+
+    def __init__(self, bngexec, size=1, max_jobs=100, timeout=None) -> None:
+        self.logger = BNGLogger()
+        self.bngexec = bngexec
+        self.size = size
+        self.max_jobs = max_jobs
+        self.timeout = timeout
+        self._idle = []
+        self._started = 0
+        self._lock = threading.Condition()
+        self._closed = False
+        atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _acquire(self):
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise BNGWorkerError(None, message="The worker pool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._started < self.size:
+                    self._started += 1
+                    return BNGWorker(self.bngexec, timeout=self.timeout)
+                self._lock.wait()
+
+    def _release(self, worker):
+        if not worker.alive() or worker.jobs >= self.max_jobs:
+            self.logger.debug(
+                f"retiring worker after {worker.jobs} jobs",
+                loc=f"{__file__} : BNGWorkerPool._release()",
+            )
+            worker.close()
+            worker = None
+        with self._lock:
+            if worker is None:
+                self._started -= 1
+            elif self._closed:
+                worker.close()
+                self._started -= 1
+            else:
+                self._idle.append(worker)
+            self._lock.notify()
+
+    def run(self, model_file, actions=(), output_dir=None):
+        worker = self._acquire()
+        try:
+            return worker.run_job(model_file, actions=actions, output_dir=output_dir)
+        finally:
+            self._release(worker)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._started -= len(idle)
+            self._lock.notify_all()
+        for worker in idle:
+            worker.close()
+
+
+# shared pools, one per BNG2.pl
+_worker_pools = {}
+_worker_pools_lock = threading.Lock()
+
+
+def get_worker_pool(bngexec, size=1, max_jobs=100):
+    """
+    Returns the worker pool shared by the process for the given
+    BNG2.pl, starting it if needed
+    """
+    bngexec = os.path.abspath(bngexec)
+    with _worker_pools_lock:
+        pool = _worker_pools.get(bngexec)
+        if pool is None or pool._closed:
+            pool = BNGWorkerPool(bngexec, size=size, max_jobs=max_jobs)
+            _worker_pools[bngexec] = pool
+        return pool
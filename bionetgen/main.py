@@ -412,7 +412,7 @@ class BNGBase(cement.Controller):
             (
                 ["-i", "--input"],
                 {
-                    "help": "input SBML file",
+                    "help": "input SBML file, or a folder of SBML files to atomize all of them",
                     "default": None,
                     "type": str,
                     "required": True,
@@ -479,6 +479,39 @@ class BNGBase(cement.Controller):
                     "action": "store_false",
                 },
             ),
+            (
+                ["--offline"],
+                {
+                    "help": "only use web service responses saved by earlier runs, queries that weren't saved are treated as failed connections",
+                    "default": False,
+                    "action": "store_true",
+                },
+            ),
+            (
+                ["--web-cache"],
+                {
+                    "help": "sqlite file web service responses are saved to, defaults to web_cache.sqlite in the PyBioNetGen cache folder",
+                    "default": None,
+                    "type": str,
+                },
+            ),
+            (
+                ["--sct-cache"],
+                {
+                    "help": "sqlite file atomizations are saved to, so atomizing the same model again reuses them, defaults to sct_cache.sqlite in the PyBioNetGen cache folder",
+                    "default": None,
+                    "type": str,
+                },
+            ),
+            (
+                ["--no-sct-cache"],
+                {
+                    "help": "neither reuse nor save atomizations of earlier runs",
+                    "dest": "reuse_atomization",
+                    "default": True,
+                    "action": "store_false",
+                },
+            ),
             (
                 ["-s", "--isomorphism-check"],
                 {
@@ -541,6 +574,47 @@ class BNGBase(cement.Controller):
                     "action": "store_true",
                 },
             ),
+            (
+                ["-j", "--jobs"],
+                {
+                    "help": "number of SBML files atomized at the same time when the input is a folder",
+                    "default": 1,
+                    "type": int,
+                },
+            ),
+            (
+                ["--timeout"],
+                {
+                    "help": "seconds after which atomizing a file is stopped when the input is a folder",
+                    "default": None,
+                    "type": float,
+                },
+            ),
+            (
+                ["--profile"],
+                {
+                    "help": "record the time and memory of each atomizer stage and write them as JSON to the given file, or to OUTPUT.profile.json without a file",
+                    "default": False,
+                    "nargs": "?",
+                    "const": True,
+                },
+            ),
+            (
+                ["--profile-stats"],
+                {
+                    "help": "write a cProfile file of the atomizer run, readable with pstats or snakeviz",
+                    "default": None,
+                    "type": str,
+                },
+            ),
+            (
+                ["--profile-memory"],
+                {
+                    "help": "with --profile, trace the peak memory of each stage. This slows down the atomizer several times",
+                    "default": False,
+                    "action": "store_true",
+                },
+            ),
             # (
             #     ["-cu", "--convert-units"],
             #     {
@@ -14,6 +14,7 @@ try:
 except ImportError:
     from collections import OrderedDict
 
+
 ###### BLOCK OBJECTS ######
 class ModelBlock:
     """
@@ -31,7 +32,8 @@ class ModelBlock:
     comment : (str, str)
         comment at the begin {block} or end {block} statements, tuple
     items : OrderedDict
-        all the model objects in the block
+        all the model objects in the block, items with string names
+        can also be accessed as attributes of the block
     _changes : OrderedDict
         a dictionary to keep track of all the changes done in a block
         after it is originally created
@@ -97,6 +99,16 @@ class ModelBlock:
     def __contains__(self, key) -> bool:
         return key in self.items
 
+    def __getattr__(self, name):
+        # only called if there is no such attribute, items
+        # can be reached as attributes of the block
+        items = self.__dict__.get("items")
+        if items is not None and name in items:
+            return items[name]
+        raise AttributeError(
+            f"'{self.__class__.__name__}' object has no attribute '{name}'"
+        )
+
     # TODO: Think extensively how this is going to work
     def __setattr__(self, name, value) -> None:
         changed = False
@@ -110,7 +122,6 @@ class ModelBlock:
                     self.items[name] = value
                 if changed:
                     self._changes[name] = new_value
-                    self.__dict__[name] = new_value
         else:
             self.__dict__[name] = value
 
@@ -151,7 +162,8 @@ class ModelBlock:
             name = len(self.items)
         # set the line
         self.items[name] = value
-        # if the name is a string, try adding as an attribute
+        # items are reached as attributes through __getattr__,
+        # setting it here records the change
         if isinstance(name, str):
             try:
                 setattr(self, name, value)
@@ -176,6 +188,9 @@ class ParameterBlock(ModelBlock):
     add_parameter(name, value, expr=None)
         adds a parameter by making a new Parameter object and passing
         the args/kwargs to its initialization.
+    engine() : BNGParameterEngine
+        returns a parameter engine that evaluates the parameter
+        expressions in dependency order
     """
 
     def __init__(self) -> None:
@@ -213,7 +228,6 @@ class ParameterBlock(ModelBlock):
                         )
                 if changed:
                     self._changes[name] = value
-                    self.__dict__[name] = value
             else:
                 self.__dict__[name] = value
         else:
@@ -223,6 +237,18 @@ class ParameterBlock(ModelBlock):
         p = Parameter(*args, **kwargs)
         self.add_item((p.name, p))
 
+    def engine(self):
+        """
+        Returns a BNGParameterEngine built from the parameter
+        expressions, or values where there's no expression.
+        """
+        from .expressions import BNGParameterEngine
+
+        exprs = OrderedDict()
+        for name, param in self.items.items():
+            exprs[name] = param.expr if param.expr is not None else param.value
+        return BNGParameterEngine(exprs)
+
 
 class CompartmentBlock(ModelBlock):
     """
@@ -264,7 +290,6 @@ class CompartmentBlock(ModelBlock):
                         )
                 if changed:
                     self._changes[name] = value
-                    self.__dict__[name] = value
             else:
                 self.__dict__[name] = value
         else:
@@ -309,7 +334,6 @@ class ObservableBlock(ModelBlock):
                     )
                 if changed:
                     self._changes[name] = value
-                    self.__dict__[name] = value
             else:
                 self.__dict__[name] = value
         else:
@@ -354,7 +378,6 @@ class SpeciesBlock(ModelBlock):
                     )
                 if changed:
                     self._changes[name] = value
-                    self.__dict__[name] = value
             else:
                 self.__dict__[name] = value
         else:
@@ -406,7 +429,6 @@ class MoleculeTypeBlock(ModelBlock):
                     )
                 if changed:
                     self._changes[name] = value
-                    self.__dict__[name] = value
             else:
                 self.__dict__[name] = value
         else:
@@ -451,7 +473,6 @@ class FunctionBlock(ModelBlock):
                     )
                 if changed:
                     self._changes[name] = value
-                    self.__dict__[name] = value
             else:
                 self.__dict__[name] = value
         else:
@@ -501,7 +522,6 @@ class RuleBlock(ModelBlock):
                     )
                 if changed:
                     self._changes[name] = value
-                    self.__dict__[name] = value
             else:
                 self.__dict__[name] = value
         else:
@@ -665,7 +685,6 @@ class EnergyPatternBlock(ModelBlock):
                     )
                 if changed:
                     self._changes[name] = value
-                    self.__dict__[name] = value
             else:
                 self.__dict__[name] = value
         else:
@@ -710,7 +729,6 @@ class PopulationMapBlock(ModelBlock):
                     )
                 if changed:
                     self._changes[name] = value
-                    self.__dict__[name] = value
             else:
                 self.__dict__[name] = value
         else:
@@ -1,16 +1,12 @@
 import os, re
 
-from bionetgen.main import BioNetGen
-from bionetgen.core.exc import BNGFileError
+from bionetgen.core.defaults import get_config
+from bionetgen.core.exc import BNGFileError, BNGRunError, BNGWorkerError
+from bionetgen.core.utils.logging import BNGLogger
 from bionetgen.core.utils.utils import find_BNG_path, run_command, ActionList
+from bionetgen.core.utils.workers import get_worker_pool, model_actions
 from tempfile import TemporaryDirectory
 
-# This allows access to the CLIs config setup
-app = BioNetGen()
-app.setup()
-conf = app.config["bionetgen"]
-def_bng_path = conf["bngpath"]
-
 
 class BNGFile:
     """
@@ -29,6 +25,9 @@ class BNGFile:
         optional path to bng folder that contains BNG2.pl
     bngexec : str
         path to BNG2.pl
+    pool : BNGWorkerPool
+        optional pool of BNG2.pl console workers to run BNG2.pl on,
+        True uses the pool shared by the process
 
     Methods
     -------
@@ -41,18 +40,51 @@ class BNGFile:
     """
 
     def __init__(
-        self, path, BNGPATH=def_bng_path, generate_network=False, suppress=True
+        self, path, BNGPATH=None, generate_network=False, suppress=True, pool=None
     ) -> None:
+        self.logger = BNGLogger()
         self.path = path
         self.generate_network = generate_network
         self.suppress = suppress
         AList = ActionList()
         self._action_list = [i + "(" for i in AList.possible_types]
+        if BNGPATH is None:
+            BNGPATH = get_config()["bngpath"]
         BNGPATH, bngexec = find_BNG_path(BNGPATH)
         self.BNGPATH = BNGPATH
         self.bngexec = bngexec
+        if pool is True:
+            pool = get_worker_pool(bngexec)
+        self.pool = pool
         self.parsed_actions = []
 
+    def _run_command(self, command, folder) -> bool:
+        # runs BNG2.pl directly in the given folder
+        cur_dir = os.getcwd()
+        os.chdir(folder)
+        try:
+            # TODO: Make output supression an option somewhere
+            rc, _ = run_command(command, suppress=self.suppress)
+        finally:
+            # go back to our original location
+            os.chdir(cur_dir)
+        return rc != 1
+
+    def _run_on_pool(self, model_file, actions, folder, command) -> bool:
+        # runs the command directly instead if the pool couldn't
+        # run the job at all
+        try:
+            self.pool.run(model_file, actions=actions, output_dir=folder)
+        except BNGRunError:
+            return False
+        except BNGWorkerError as e:
+            self.logger.warning(
+                f"BNG2.pl worker failed, running BNG2.pl directly: {e.message}",
+                loc=f"{__file__} : BNGFile._run_on_pool()",
+            )
+            return self._run_command(command, folder)
+        return True
+
     def generate_xml(self, xml_file, model_file=None) -> bool:
         """
         generates an BNG-XML file from a given model file. Defaults
@@ -60,41 +92,41 @@ class BNGFile:
         """
         if model_file is None:
             model_file = self.path
-        cur_dir = os.getcwd()
         # temporary folder to work in
         with TemporaryDirectory() as temp_folder:
             # make a stripped copy without actions in the folder
             stripped_bngl = self.strip_actions(model_file, temp_folder)
             # run with --xml
-            os.chdir(temp_folder)
             # TODO: take stdout option from app instead
-            rc, _ = run_command(
-                ["perl", self.bngexec, "--xml", stripped_bngl], suppress=self.suppress
-            )
-            if rc == 1:
+            command = ["perl", self.bngexec, "--xml", stripped_bngl]
+            if self.pool is not None:
+                # --xml writes the XML after the network is generated
+                actions = ["writeXML()"]
+                if self.generate_network:
+                    actions.insert(0, "generate_network({overwrite=>1})")
+                ran = self._run_on_pool(stripped_bngl, actions, temp_folder, command)
+            else:
+                ran = self._run_command(command, temp_folder)
+            if not ran:
                 # if we fail, print out what we have to
                 # let the user know what BNG2.pl says
                 # if rc.stdout is not None:
                 #     print(rc.stdout.decode('utf-8'))
                 # if rc.stderr is not None:
                 #     print(rc.stderr.decode('utf-8'))
-                # go back to our original location
-                os.chdir(cur_dir)
                 # shutil.rmtree(temp_folder)
                 return False
             else:
                 # we should now have the XML file
                 path, model_name = os.path.split(stripped_bngl)
                 model_name = model_name.replace(".bngl", "")
-                written_xml_file = model_name + ".xml"
+                written_xml_file = os.path.join(temp_folder, model_name + ".xml")
                 with open(written_xml_file, "r", encoding="UTF-8") as f:
                     content = f.read()
                     xml_file.write(content)
                 # since this is an open file, to read it later
                 # we need to go back to the beginning
                 xml_file.seek(0)
-                # go back to our original location
-                os.chdir(cur_dir)
                 return True
 
     def strip_actions(self, model_path, folder) -> str:
@@ -166,49 +198,41 @@ class BNGFile:
             # should load in the right str here
             raise NotImplementedError
 
-        cur_dir = os.getcwd()
+        if xml_type == "bngxml":
+            command = ["perl", self.bngexec, "--xml", "temp.bngl"]
+            actions = ["writeXML()"]
+            written_file = "temp.xml"
+        elif xml_type == "sbml":
+            command = ["perl", self.bngexec, "temp.bngl"]
+            # the model's actions are expected to write the SBML
+            actions = model_actions(bngl_str, ActionList().possible_types)
+            written_file = "temp_sbml.xml"
+        else:
+            print("XML type {} not recognized".format(xml_type))
+            return False
+
         # temporary folder to work in
         with TemporaryDirectory() as temp_folder:
             # write the current model to temp folder
-            os.chdir(temp_folder)
-            with open("temp.bngl", "w", encoding="UTF-8") as f:
+            temp_bngl = os.path.join(temp_folder, "temp.bngl")
+            with open(temp_bngl, "w", encoding="UTF-8") as f:
                 f.write(bngl_str)
-            # run with --xml
-            # TODO: Make output supression an option somewhere
-            if xml_type == "bngxml":
-                rc, _ = run_command(
-                    ["perl", self.bngexec, "--xml", "temp.bngl"], suppress=self.suppress
-                )
-                if rc == 1:
+            if self.pool is not None:
+                ran = self._run_on_pool(temp_bngl, actions, temp_folder, command)
+            else:
+                ran = self._run_command(command, temp_folder)
+            if not ran:
+                if xml_type == "bngxml":
                     print("XML generation failed")
-                    # go back to our original location
-                    os.chdir(cur_dir)
-                    return False
                 else:
-                    # we should now have the XML file
-                    with open("temp.xml", "r", encoding="UTF-8") as f:
-                        content = f.read()
-                        open_file.write(content)
-                    # go back to beginning
-                    open_file.seek(0)
-                    os.chdir(cur_dir)
-                    return True
-            elif xml_type == "sbml":
-                command = ["perl", self.bngexec, "temp.bngl"]
-                rc, _ = run_command(command, suppress=self.suppress)
-                if rc == 1:
                     print("SBML generation failed")
-                    # go back to our original location
-                    os.chdir(cur_dir)
-                    return False
-                else:
-                    # we should now have the SBML file
-                    with open("temp_sbml.xml", "r", encoding="UTF-8") as f:
-                        content = f.read()
-                        open_file.write(content)
-                    open_file.seek(0)
-                    os.chdir(cur_dir)
-                    return True
-            else:
-                print("XML type {} not recognized".format(xml_type))
                 return False
+            # we should now have the XML or SBML file
+            with open(
+                os.path.join(temp_folder, written_file), "r", encoding="UTF-8"
+            ) as f:
+                content = f.read()
+                open_file.write(content)
+            # go back to beginning
+            open_file.seek(0)
+            return True
@@ -1,6 +1,5 @@
 import xmltodict, re
 
-from bionetgen.main import BioNetGen
 from bionetgen.core.exc import BNGParseError, BNGModelError
 from tempfile import TemporaryFile
 
@@ -11,12 +10,6 @@ from .xmlparsers import RuleBlockXML, EnergyPatternBlockXML, PopulationMapBlockX
 from .blocks import ActionBlock
 from bionetgen.core.utils.utils import ActionList
 
-# This allows access to the CLIs config setup
-app = BioNetGen()
-app.setup()
-conf = app.config["bionetgen"]
-def_bng_path = conf["bngpath"]
-
 
 class BNGParser:
     """
@@ -46,13 +39,16 @@ class BNGParser:
     def __init__(
         self,
         path,
-        BNGPATH=def_bng_path,
+        BNGPATH=None,
         parse_actions=True,
         generate_network=False,
         suppress=True,
+        pool=None,
     ) -> None:
         self.to_parse_actions = parse_actions
-        self.bngfile = BNGFile(path, generate_network=generate_network, suppress=True)
+        self.bngfile = BNGFile(
+            path, generate_network=generate_network, suppress=True, pool=pool
+        )
         self.alist = ActionList()
         self.alist.define_parser()
 
@@ -0,0 +1,404 @@
+import atexit, collections, concurrent.futures, importlib.util, json, os, sqlite3
+import threading, weakref
+from bionetgen.core.utils.logging import BNGLogger
+
+_has_pynauty = None
+
+
+def pynauty_available():
+    """
+    Checks if pynauty can be imported, only once per process
+    """
+    global _has_pynauty
+    if _has_pynauty is None:
+        _has_pynauty = importlib.util.find_spec("pynauty") is not None
+    return _has_pynauty
+
+
+def canonical_cache_key(pattern_str):
+    """
+    Key of a pattern string in the canonical label cache, labels from
+    the built-in labelling are kept apart from the pynauty ones
+    """
+    if pynauty_available():
+        return pattern_str
+    return "refinement:" + pattern_str
+
+
+# every cache writes its pending results when the process exits, the
+# caches aren't kept alive for it
+_caches = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_caches():
+    for cache in list(_caches):
+        cache.flush()
+
+
+class CanonicalCache:
+    """
+    Memo of pattern canonicalization results keyed by the pattern
+    string. The most recently used results are kept in memory and
+    optionally every result is stored in a sqlite file so labels
+    computed once can be reused by other processes and later runs.
+
+    A result is a tuple of the canonical label, the canonical
+    certificate and the canonical order and bonds of each molecule
+    and component, in the order they appear in the pattern string.
+
+    Usage: canonical_cache.open("labels.db")
+
+    Arguments
+    ---------
+    maxsize : int
+        maximum number of results kept in memory
+    path : str
+        (optional) path to the sqlite file to store results in
+
+    Attributes
+    ----------
+    path : str
+        path to the sqlite file, None if results are only kept in memory
+    hits : int
+        number of lookups that found a result
+    misses : int
+        number of lookups that didn't find a result
+
+    Methods
+    -------
+    open(path) : None
+        starts storing results in the given sqlite file
+    close() : None
+        writes pending results and closes the sqlite file
+    detach() : None
+        drops the sqlite file without writing, used in worker processes
+    get(key) : tuple
+        returns the result for the pattern string or None
+    put(key, record) : None
+        stores the result for the pattern string
+    flush() : None
+        writes pending results to the sqlite file
+    clear() : None
+        empties the in memory cache
+    """
+
+    # results are committed to the file in batches
+    commit_every = 1000
+
+    def __init__(self, maxsize=2**16, path=None) -> None:
+        self.logger = BNGLogger()
+        self.maxsize = maxsize
+        self.path = None
+        self.hits = 0
+        self.misses = 0
+        self._memory = collections.OrderedDict()
+        self._db = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        if path is not None:
+            self.open(path)
+        _caches.add(self)
+
+    def open(self, path):
+        if self._db is not None:
+            self.close()
+        self.logger.debug(
+            f"storing canonical labels in {path}",
+            loc=f"{__file__} : CanonicalCache.open()",
+        )
+        self.path = path
+        with self._lock:
+            db = self._connect()
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS canonical_labels "
+                "(pattern TEXT PRIMARY KEY, label TEXT, certificate BLOB, layout TEXT)"
+            )
+            db.commit()
+
+    def _connect(self):
+        # connections can't be shared with forked processes, a forked
+        # process opens its own connection to the same file
+        if self.path is None:
+            return None
+        if self._db is None or self._pid != os.getpid():
+            self._db = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            self._pid = os.getpid()
+            self._pending = 0
+        return self._db
+
+    def close(self):
+        if self._db is not None:
+            self.flush()
+            if self._pid == os.getpid():
+                self._db.close()
+        self._db = None
+        self.path = None
+
+    def detach(self):
+        # drops the connection inherited from the parent process
+        self._db = None
+        self._pending = 0
+        self.path = None
+
+    def flush(self):
+        with self._lock:
+            if self._db is not None and self._pid == os.getpid() and self._pending > 0:
+                self._db.commit()
+            self._pending = 0
+
+    def clear(self):
+        self._memory.clear()
+
+    def _remember(self, key, record):
+        self._memory[key] = record
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        record = self._memory.get(key)
+        if record is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return record
+        row = None
+        with self._lock:
+            db = self._connect()
+            if db is not None:
+                row = db.execute(
+                    "SELECT label, certificate, layout FROM canonical_labels WHERE pattern = ?",
+                    (key,),
+                ).fetchone()
+        if row is not None:
+            label, certificate, layout = row
+            mol_orders, comp_orders, comp_bonds = json.loads(layout)
+            record = (
+                label,
+                certificate,
+                tuple(mol_orders),
+                tuple(tuple(orders) for orders in comp_orders),
+                tuple(
+                    tuple(None if b is None else tuple(b) for b in bonds)
+                    for bonds in comp_bonds
+                ),
+            )
+            self._remember(key, record)
+            self.hits += 1
+            return record
+        self.misses += 1
+        return None
+
+    def put(self, key, record):
+        self._remember(key, record)
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return
+            label, certificate, mol_orders, comp_orders, comp_bonds = record
+            db.execute(
+                "INSERT OR REPLACE INTO canonical_labels VALUES (?, ?, ?, ?)",
+                (
+                    key,
+                    label,
+                    certificate,
+                    json.dumps([mol_orders, comp_orders, comp_bonds]),
+                ),
+            )
+            self._pending += 1
+            full = self._pending >= self.commit_every
+        if full:
+            self.flush()
+
+
+# shared by all patterns in the process
+canonical_cache = CanonicalCache()
+
+
+def _init_worker():
+    canonical_cache.detach()
+
+
+def _canonical_records(pattern_strs):
+    # runs in the worker processes of canonicalize_many
+    from bionetgen.modelapi.pattern_reader import BNGPatternReader
+
+    reader = BNGPatternReader()
+    records = []
+    for pattern_str in pattern_strs:
+        pattern = reader.make_pattern(pattern_str)
+        if pattern.canonical_label is None:
+            pattern.canonicalize()
+        records.append(pattern.canonical_record())
+    return records
+
+
+def canonicalize_many(patterns, processes=None, chunksize=500):
+    """
+    Canonicalizes a list of Pattern objects. Each distinct pattern
+    string is only labelled once, results come from and go into
+    canonical_cache. If processes is given and there are enough
+    new pattern strings they are labelled on a process pool in
+    chunks. Returns the list of patterns.
+    """
+    groups = {}
+    for pattern in patterns:
+        groups.setdefault(str(pattern), []).append(pattern)
+    missing = [
+        pattern_str
+        for pattern_str in groups
+        if canonical_cache.get(canonical_cache_key(pattern_str)) is None
+    ]
+    if processes is not None and processes > 1 and len(missing) > chunksize:
+        chunks = [missing[i : i + chunksize] for i in range(0, len(missing), chunksize)]
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=processes, initializer=_init_worker
+        ) as executor:
+            for chunk, records in zip(chunks, executor.map(_canonical_records, chunks)):
+                for pattern_str, record in zip(chunk, records):
+                    canonical_cache.put(canonical_cache_key(pattern_str), record)
+    for group in groups.values():
+        for pattern in group:
+            pattern.canonicalize()
+    canonical_cache.flush()
+    return patterns
+
+
+def _refine(colors, adjacency):
+    # colour refinement, each vertex gets a new colour from its colour
+    # and the colours of its neighbours until no cell splits. colours
+    # are ranks of the sorted signatures so the order of the cells
+    # doesn't depend on the vertex numbering
+    ncolors = len(set(colors))
+    while True:
+        sigs = [
+            (colors[v], tuple(sorted(colors[u] for u in adjacency[v])))
+            for v in range(len(colors))
+        ]
+        ranks = {sig: rank for rank, sig in enumerate(sorted(set(sigs)))}
+        colors = [ranks[sig] for sig in sigs]
+        if len(ranks) == ncolors:
+            return colors
+        ncolors = len(ranks)
+
+
+def _individualize(colors, vertex):
+    # vertex is placed in its own cell in front of the rest of its cell
+    keys = [(color, 0 if v == vertex else 1) for v, color in enumerate(colors)]
+    ranks = {key: rank for rank, key in enumerate(sorted(set(keys)))}
+    return [ranks[key] for key in keys]
+
+
+def _orbit_roots(automorphisms, path, vertices):
+    # orbits of the vertices under the automorphisms that fix the path
+    parent = {v: v for v in vertices}
+
+    def find(v):
+        while parent[v] != v:
+            parent[v] = parent[parent[v]]
+            v = parent[v]
+        return v
+
+    for gamma in automorphisms:
+        if any(gamma[v] != v for v in path):
+            continue
+        for v in vertices:
+            w = gamma[v]
+            if w in parent:
+                rv, rw = find(v), find(w)
+                if rv != rw:
+                    parent[max(rv, rw)] = min(rv, rw)
+    return find
+
+
+def canonical_labelling(node_cnt, adjacency, color_sets):
+    """
+    Computes a canonical labelling of a vertex coloured graph without
+    pynauty. Colour refinement (Weisfeiler-Lehman) splits the ordered
+    colour cells until they are stable, ties are broken by
+    individualizing each vertex of the first non-singleton cell and
+    refining again. The labelling is the leaf of this search tree with
+    the smallest edge list, branches that are images of explored ones
+    under automorphisms found along the way are skipped.
+
+    Returns the canonical order, a list where the i-th element is the
+    vertex at canonical position i like pynauty.canon_label, and a
+    certificate for the graph as bytes.
+
+    Arguments
+    ---------
+    node_cnt : int
+        number of vertices
+    adjacency : dict
+        vertex -> list of neighbouring vertices
+    color_sets : list[set]
+        ordered partition of the vertices into colour cells
+    """
+    neighbours = [set() for _ in range(node_cnt)]
+    for v, adj in adjacency.items():
+        for u in adj:
+            neighbours[v].add(u)
+            neighbours[u].add(v)
+    neighbours = [sorted(adj) for adj in neighbours]
+    colors = [0] * node_cnt
+    for icell, cell in enumerate(color_sets):
+        for v in cell:
+            colors[v] = icell
+    best = {"cert": None, "lab": None, "path": None}
+    automorphisms = []
+
+    def search(colors, path):
+        colors = _refine(colors, neighbours)
+        cells = {}
+        for v, color in enumerate(colors):
+            cells.setdefault(color, []).append(v)
+        target = None
+        for color in sorted(cells):
+            if len(cells[color]) > 1:
+                target = cells[color]
+                break
+        if target is None:
+            # discrete partition, the colours are the canonical positions
+            lab = [0] * node_cnt
+            for v, color in enumerate(colors):
+                lab[color] = v
+            cert = tuple(
+                sorted(
+                    (colors[v], colors[u])
+                    for v in range(node_cnt)
+                    for u in neighbours[v]
+                    if colors[v] < colors[u]
+                )
+            )
+            if best["cert"] is None or cert < best["cert"]:
+                best.update(cert=cert, lab=lab, path=list(path))
+                return None
+            if cert == best["cert"]:
+                # maps the best leaf onto this one and fixes the shared
+                # part of the paths, the subtree where they diverge is
+                # an image of the explored one
+                gamma = [0] * node_cnt
+                for pos in range(node_cnt):
+                    gamma[best["lab"][pos]] = lab[pos]
+                automorphisms.append(gamma)
+                for depth, (v, w) in enumerate(zip(path, best["path"])):
+                    if v != w:
+                        return depth
+            return None
+        depth = len(path)
+        explored = []
+        for v in target:
+            find = _orbit_roots(automorphisms, path, target)
+            if any(find(v) == find(w) for w in explored):
+                continue
+            explored.append(v)
+            jump = search(_individualize(colors, v), path + [v])
+            if jump is not None and jump < depth:
+                return jump
+        return None
+
+    search(colors, [])
+    sizes = tuple(len(cell) for cell in color_sets)
+    certificate = repr((sizes, best["cert"])).encode()
+    return best["lab"], certificate
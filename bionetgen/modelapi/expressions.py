@@ -0,0 +1,518 @@
+import ast, heapq, re
+import numpy as np
+
+from bionetgen.core.exc import BNGExpressionError
+from bionetgen.core.utils.logging import BNGLogger
+
+# BNG math functions and their numpy equivalents
+BNG_FUNCTIONS = {
+    "exp": "np.exp",
+    "ln": "np.log",
+    "log": "np.log",
+    "log10": "np.log10",
+    "log2": "np.log2",
+    "sqrt": "np.sqrt",
+    "abs": "np.abs",
+    "sin": "np.sin",
+    "cos": "np.cos",
+    "tan": "np.tan",
+    "asin": "np.arcsin",
+    "acos": "np.arccos",
+    "atan": "np.arctan",
+    "sinh": "np.sinh",
+    "cosh": "np.cosh",
+    "tanh": "np.tanh",
+    "asinh": "np.arcsinh",
+    "acosh": "np.arccosh",
+    "atanh": "np.arctanh",
+    "rint": "np.rint",
+    "floor": "np.floor",
+    "ceil": "np.ceil",
+    "sign": "np.sign",
+    "_if": "np.where",
+}
+# functions that take any number of arguments
+BNG_REDUCTIONS = {"min": "np.minimum", "max": "np.maximum"}
+BNG_CONSTANTS = {"_pi": "np.pi", "_e": "np.e"}
+
+_BINOPS = {
+    ast.Add: "+",
+    ast.Sub: "-",
+    ast.Mult: "*",
+    ast.Div: "/",
+    ast.Pow: "**",
+}
+_CMPOPS = {
+    ast.Eq: "==",
+    ast.NotEq: "!=",
+    ast.Lt: "<",
+    ast.LtE: "<=",
+    ast.Gt: ">",
+    ast.GtE: ">=",
+}
+
+
+def parse_expression(expr) -> ast.AST:
+    """
+    Parses a BNG math expression into a python AST. BNG syntax that
+    isn't python (^, &&, ||, !, if) is translated first.
+    """
+    expr = str(expr).strip()
+    expr = expr.replace("^", "**")
+    expr = expr.replace("&&", " and ").replace("||", " or ")
+    expr = re.sub(r"!(?!=)", " not ", expr)
+    expr = re.sub(r"\bif\s*\(", "_if(", expr)
+    try:
+        return ast.parse(expr, mode="eval").body
+    except SyntaxError:
+        raise BNGExpressionError(expr, message="Couldn't parse expression")
+
+
+def literal_value(node):
+    """
+    Returns the value of a number literal as a float, None if the
+    node isn't one. Python 3.7 parses numbers to ast.Num.
+    """
+    if isinstance(node, ast.Constant):
+        value = node.value
+    elif hasattr(ast, "Num") and isinstance(node, ast.Num):
+        value = node.n
+    else:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return None
+
+
+def expression_names(node) -> set:
+    """
+    Returns the set of names an expression depends on, skipping
+    function names and BNG constants.
+    """
+    names = set()
+    for sub in ast.walk(node):
+        if isinstance(sub, ast.Name) and sub.id not in BNG_CONSTANTS:
+            names.add(sub.id)
+    for sub in ast.walk(node):
+        if isinstance(sub, ast.Call) and isinstance(sub.func, ast.Name):
+            names.discard(sub.func.id)
+    return names
+
+
+def expression_source(node, index, array="v") -> str:
+    """
+    Generates numpy source code for a parsed expression where every
+    name is replaced by array[index[name]]. Only arithmetic, comparisons,
+    logical operators and the BNG math functions are allowed.
+    """
+
+    def gen(node):
+        value = literal_value(node)
+        if value is not None:
+            return repr(value)
+        elif isinstance(node, ast.Name):
+            if node.id in BNG_CONSTANTS:
+                return BNG_CONSTANTS[node.id]
+            if node.id not in index:
+                raise BNGExpressionError(node.id, message="Unknown name")
+            return f"{array}[{index[node.id]}]"
+        elif isinstance(node, ast.BinOp) and type(node.op) in _BINOPS:
+            return f"({gen(node.left)} {_BINOPS[type(node.op)]} {gen(node.right)})"
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return f"(-{gen(node.operand)})"
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.UAdd):
+            return gen(node.operand)
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            return f"np.logical_not({gen(node.operand)})"
+        elif isinstance(node, ast.BoolOp):
+            func = "np.logical_and" if isinstance(node.op, ast.And) else "np.logical_or"
+            src = gen(node.values[0])
+            for value in node.values[1:]:
+                src = f"{func}({src}, {gen(value)})"
+            return src
+        elif (
+            isinstance(node, ast.Compare)
+            and len(node.ops) == 1
+            and type(node.ops[0]) in _CMPOPS
+        ):
+            op = _CMPOPS[type(node.ops[0])]
+            return f"({gen(node.left)} {op} {gen(node.comparators[0])})"
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            fname = node.func.id
+            args = [gen(arg) for arg in node.args]
+            if fname in BNG_FUNCTIONS:
+                return f"{BNG_FUNCTIONS[fname]}({', '.join(args)})"
+            elif fname in BNG_REDUCTIONS:
+                src = args[0]
+                for arg in args[1:]:
+                    src = f"{BNG_REDUCTIONS[fname]}({src}, {arg})"
+                return src
+            raise BNGExpressionError(fname, message="Unknown function")
+        raise BNGExpressionError(ast.dump(node), message="Unsupported expression")
+
+    return gen(node)
+
+
+class BNGParameterEngine:
+    """
+    Evaluation engine for parameter expressions. Every expression is
+    parsed once and the parameters form a dependency DAG. The DAG is
+    compiled into numpy code that evaluates all parameters in dependency
+    order, and changing parameters only re-evaluates the parameters
+    downstream of them.
+
+    Values are kept in a numpy array so many parameter sets can be
+    evaluated at once with evaluate(), and rate constants of a network
+    can be gathered from it in a single vectorized step with rate_vector().
+
+    Usage: BNGParameterEngine(expressions)
+           model.parameters.engine()
+           network.parameters.engine()
+
+    Arguments
+    ---------
+    expressions : dict
+        ordered dictionary of parameter name to expression string or value
+
+    Attributes
+    ----------
+    names : list[str]
+        names of the parameters, in the order of the value array
+    index : dict
+        parameter name to index in the value array
+    expressions : list[str]
+        expression string of each parameter
+    dependencies : list[set]
+        for each parameter, the indices of parameters it depends on
+    dependents : list[list]
+        for each parameter, the indices of parameters that depend on it
+    order : list[int]
+        evaluation order of the parameters
+    values : np.ndarray
+        current values of all parameters
+    unresolved : set[str]
+        parameters that can't be evaluated (e.g. unknown names or
+        functions), their values are NaN
+
+    Methods
+    -------
+    set(name, value) : None
+        sets a parameter to a value and updates the parameters that
+        depend on it. setting a derived parameter overrides its expression
+    update(values) : None
+        same as set but for a dictionary of name to value
+    is_derived(name) : bool
+        returns True if the parameter is computed from an expression
+    downstream(names) : list[int]
+        returns the indices of parameters affected by a change to the
+        given parameters, in evaluation order
+    evaluate(base=None) : np.ndarray
+        evaluates every parameter from the given base values, which can
+        be an array of shape (n,) or (n, k) for k parameter sets
+    rate_vector(expressions) : BNGRateVector
+        returns an object that computes the values of a list of rate
+        expressions from the current parameter values
+    """
+
+    def __init__(self, expressions) -> None:
+        self.logger = BNGLogger(loc=f"{__file__} : BNGParameterEngine.__init__()")
+        self.names = []
+        self.index = {}
+        self.expressions = []
+        self.dependencies = []
+        self.dependents = []
+        self.unresolved = set()
+        self._sources = []
+        self._compiled = {}
+        self._updates = {}
+        # register every name first so expressions can refer to
+        # parameters defined later on
+        for name in expressions:
+            self._add_node(name)
+        for name, expr in expressions.items():
+            self._add_node(name, expr)
+        self.order = self._topological_order()
+        self.values = self.evaluate()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name) -> bool:
+        return name in self.index
+
+    def __getitem__(self, name) -> float:
+        return float(self.values[self.index[name]])
+
+    def __setitem__(self, name, value) -> None:
+        self.set(name, value)
+
+    def __repr__(self) -> str:
+        return "parameter engine with {} parameter(s), {} derived".format(
+            len(self.names), sum(1 for src in self._sources if src is not None)
+        )
+
+    def _add_node(self, name, expr=None) -> int:
+        if name in self.index:
+            # redefinition, the last definition wins
+            inode = self.index[name]
+            for dep in self.dependencies[inode]:
+                self.dependents[dep].remove(inode)
+        else:
+            inode = len(self.names)
+            self.names.append(name)
+            self.index[name] = inode
+            self.expressions.append(None)
+            self.dependencies.append(set())
+            self.dependents.append([])
+            self._sources.append(None)
+        self.dependencies[inode] = set()
+        self._sources[inode] = None
+        self.unresolved.discard(name)
+        if expr is None:
+            self.expressions[inode] = "0"
+            return inode
+        self.expressions[inode] = str(expr)
+        try:
+            # plain numbers are base parameters
+            float(expr)
+            return inode
+        except ValueError:
+            pass
+        try:
+            node = parse_expression(expr)
+            names = expression_names(node)
+            missing = [n for n in names if n not in self.index]
+            if len(missing) > 0:
+                raise BNGExpressionError(expr, message=f"Unknown names {missing}")
+            src = expression_source(node, self.index)
+            self.dependencies[inode] = set(self.index[n] for n in names)
+            for dep in self.dependencies[inode]:
+                self.dependents[dep].append(inode)
+            self._sources[inode] = src
+        except BNGExpressionError as e:
+            self.logger.debug(f"can't evaluate parameter {name}: {e.message}")
+            self.unresolved.add(name)
+        return inode
+
+    def _topological_order(self) -> list:
+        # Kahn's algorithm, ties are broken by definition order
+        indegree = [len(deps) for deps in self.dependencies]
+        ready = [i for i in range(len(self.names)) if indegree[i] == 0]
+        heapq.heapify(ready)
+        order = []
+        while len(ready) > 0:
+            inode = heapq.heappop(ready)
+            order.append(inode)
+            for child in self.dependents[inode]:
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    heapq.heappush(ready, child)
+        if len(order) != len(self.names):
+            cycle = [self.names[i] for i in range(len(self.names)) if indegree[i] > 0]
+            raise BNGExpressionError(
+                ", ".join(cycle), message="Circular parameter dependency"
+            )
+        return order
+
+    def _compile(self, nodes):
+        """
+        Generates and compiles a single function that evaluates the
+        given nodes, in order, on the value array v.
+        """
+        key = tuple(nodes)
+        if key in self._compiled:
+            return self._compiled[key]
+        lines = ["def _evaluate(v):"]
+        for inode in nodes:
+            if self._sources[inode] is not None:
+                lines.append(f"    v[{inode}] = {self._sources[inode]}")
+            elif self.names[inode] in self.unresolved:
+                lines.append(f"    v[{inode}] = np.nan")
+        lines.append("    return v")
+        namespace = {"np": np}
+        exec(compile("\n".join(lines), "<bng parameters>", "exec"), namespace)
+        func = namespace["_evaluate"]
+        self._compiled[key] = func
+        return func
+
+    def _base_values(self):
+        base = np.zeros(len(self.names))
+        for inode, expr in enumerate(self.expressions):
+            if (
+                self._sources[inode] is None
+                and self.names[inode] not in self.unresolved
+            ):
+                base[inode] = float(expr)
+        return base
+
+    def is_derived(self, name) -> bool:
+        """
+        Returns True if the parameter is computed from an expression
+        instead of being set to a number.
+        """
+        inode = self.index[name]
+        return self._sources[inode] is not None or name in self.unresolved
+
+    def downstream(self, names) -> list:
+        """
+        Returns the indices of the parameters that have to be
+        re-evaluated after the given parameters change, in evaluation
+        order. The given parameters themselves are not included.
+        """
+        seen = set()
+        stack = [self.index[name] for name in names]
+        while len(stack) > 0:
+            inode = stack.pop()
+            for child in self.dependents[inode]:
+                if child not in seen:
+                    seen.add(child)
+                    stack.append(child)
+        return [inode for inode in self.order if inode in seen]
+
+    def evaluate(self, base=None) -> np.ndarray:
+        """
+        Evaluates every parameter. base is an array of shape (n,) or
+        (n, k) with the values of the non-derived parameters; the
+        values of derived parameters in it are ignored. If base isn't
+        given the current expressions are used.
+        """
+        if base is None:
+            base = self._base_values()
+        values = np.array(base, dtype=float)
+        if values.shape[0] != len(self.names):
+            raise ValueError(
+                f"Expected values of {len(self.names)} parameters, got {values.shape[0]}"
+            )
+        with np.errstate(all="ignore"):
+            return self._compile(self.order)(values)
+
+    def set(self, name, value) -> None:
+        """
+        Sets a parameter to a value and re-evaluates the parameters
+        that depend on it.
+        """
+        self.update({name: value})
+
+    def update(self, values) -> None:
+        """
+        Sets a dictionary of parameter name to value and re-evaluates
+        only the parameters downstream of them.
+        """
+        for name, value in values.items():
+            inode = self.index[name]
+            if self.is_derived(name):
+                # overriding a derived parameter, it becomes a base parameter
+                for dep in self.dependencies[inode]:
+                    self.dependents[dep].remove(inode)
+                self.dependencies[inode] = set()
+                self._sources[inode] = None
+                self.unresolved.discard(name)
+                self._compiled = {}
+                self._updates = {}
+            self.expressions[inode] = str(value)
+            self.values[inode] = float(value)
+        # the affected nodes and their update function are cached
+        # per set of changed parameters
+        key = tuple(sorted(values))
+        if key not in self._updates:
+            nodes = self.downstream(key)
+            self._updates[key] = (nodes, self._compile(nodes))
+        nodes, func = self._updates[key]
+        if len(nodes) > 0:
+            # scalar updates are faster on python floats
+            vals = self.values.tolist()
+            with np.errstate(all="ignore"):
+                func(vals)
+            self.values[nodes] = [vals[inode] for inode in nodes]
+
+    def rate_vector(self, expressions):
+        """
+        Returns a BNGRateVector for the given list of rate expressions.
+        """
+        return BNGRateVector(self, expressions)
+
+    def _product_form(self, node):
+        """
+        Returns (coefficient, name) if the expression is a product
+        of numbers and at most one parameter name, None otherwise.
+        """
+        value = literal_value(node)
+        if value is not None:
+            return value, None
+        if isinstance(node, ast.Name) and node.id in self.index:
+            return 1.0, node.id
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Mult):
+            left = self._product_form(node.left)
+            right = self._product_form(node.right)
+            if left is None or right is None:
+                return None
+            if left[1] is not None and right[1] is not None:
+                return None
+            return left[0] * right[0], left[1] or right[1]
+        return None
+
+
+class BNGRateVector:
+    """
+    Vectorized evaluation of a list of rate expressions, e.g. the rate
+    constants of all reactions in a network. Rates of the form
+    number*parameter are gathered directly from the parameter values,
+    any other expression is added to the parameter engine as a derived
+    parameter so it's updated along with the DAG.
+
+    Usage: engine.rate_vector(expressions)
+
+    Attributes
+    ----------
+    engine : BNGParameterEngine
+        the engine the rates are computed from
+    coefficients : np.ndarray
+        numeric factor of each rate
+    indices : np.ndarray
+        index of the parameter each rate is proportional to
+
+    Methods
+    -------
+    evaluate() : np.ndarray
+        returns the current values of the rates
+    """
+
+    def __init__(self, engine, expressions) -> None:
+        self.engine = engine
+        coefficients = np.ones(len(expressions))
+        indices = np.zeros(len(expressions), dtype=np.intp)
+        nnodes = len(engine.names)
+        for irate, expr in enumerate(expressions):
+            try:
+                form = engine._product_form(parse_expression(expr))
+            except BNGExpressionError:
+                form = None
+            if form is not None:
+                coef, name = form
+                if name is None:
+                    # constant rates are gathered from a unit parameter
+                    name = "__one"
+                    if name not in engine.index:
+                        engine._add_node(name, "1")
+                coefficients[irate] = coef
+                indices[irate] = engine.index[name]
+            else:
+                # anything else becomes a derived parameter
+                name = f"__rate_{len(engine.names)}"
+                indices[irate] = engine._add_node(name, expr)
+        if len(engine.names) > nnodes:
+            engine.order = engine._topological_order()
+            engine._compiled = {}
+            engine._updates = {}
+            engine.values = engine.evaluate()
+        self.coefficients = coefficients
+        self.indices = indices
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def evaluate(self) -> np.ndarray:
+        """
+        Returns the values of the rates from the current parameter values.
+        """
+        return self.coefficients * self.engine.values[self.indices]
@@ -1,6 +1,5 @@
 import copy, tempfile, shutil
 
-from bionetgen.main import BioNetGen
 from bionetgen.core.exc import BNGModelError
 
 from .bngparser import BNGParser
@@ -18,12 +17,6 @@ from .blocks import (
 )
 
 
-# This allows access to the CLIs config setup
-app = BioNetGen()
-app.setup()
-conf = app.config["bionetgen"]
-def_bng_path = conf["bngpath"]
-
 ###### CORE OBJECT AND PARSING FRONT-END ######
 class bngmodel:
     """
@@ -33,6 +26,7 @@ class bngmodel:
 
     Usage: bngmodel(bng_model)
            bngmodel(bng_model, BNGPATH)
+           bngmodel(bng_model, pool=True)
 
     Attributes
     ----------
@@ -73,7 +67,12 @@ class bngmodel:
     """
 
     def __init__(
-        self, bngl_model, BNGPATH=def_bng_path, generate_network=False, suppress=True
+        self,
+        bngl_model,
+        BNGPATH=None,
+        generate_network=False,
+        suppress=True,
+        pool=None,
     ):
         self.active_blocks = []
         # We want blocks to be printed in the same order every time
@@ -92,7 +91,7 @@ class bngmodel:
         self.model_name = ""
         self.model_path = bngl_model
         self.bngparser = BNGParser(
-            bngl_model, generate_network=generate_network, suppress=True
+            bngl_model, generate_network=generate_network, suppress=True, pool=pool
         )
         self.bngparser.parse_model(self)
         for block in self._block_order:
@@ -343,13 +342,9 @@ class bngmodel:
             self.simulator = bng.sim_getter(model_file=self, sim_type=sim_type)
             return self.simulator
         else:
-            print(
-                'Sim type {} is not recognized, only libroadrunner \
+            print('Sim type {} is not recognized, only libroadrunner \
                    is supported currently by passing "libRR" to \
-                   sim_type keyword argument'.format(
-                    sim_type
-                )
-            )
+                   sim_type keyword argument'.format(sim_type))
             return None
         # for now we return the underlying simulator
         return self.simulator.simulator
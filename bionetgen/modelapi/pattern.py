@@ -1,7 +1,29 @@
+import sys, weakref
 from bionetgen.core.utils.logging import BNGLogger
+from bionetgen.modelapi.canonical import (
+    canonical_cache,
+    canonical_cache_key,
+    canonical_labelling,
+    pynauty_available,
+)
 
 logger = BNGLogger()
 
+# canonical label -> Pattern, patterns are dropped from
+# the table once nothing else refers to them
+_interned_patterns = weakref.WeakValueDictionary()
+# bonds to any or no partner, these aren't bond IDs
+WILDCARD_BONDS = ("+", "?")
+
+
+def _intern_name(value):
+    # molecule, component and state names repeat across every
+    # pattern so only one copy of each string is kept
+    if type(value) is str:
+        return sys.intern(value)
+    return value
+
+
 # All classes that deal with patterns
 class Pattern:
     """
@@ -52,10 +74,37 @@ class Pattern:
     canonicalize : None
         This method will generate a canonical label stored in `canonical_label` attribute.
         This label can be used to compare patterns to see if they are the same pattern quickly.
-        This method will only run if `pynauty` is installed. See [nauty documentation](https://users.cecs.anu.edu.au/~bdm/nauty/)
-        for more information
+        This method uses `pynauty` if it's installed, see [nauty documentation](https://users.cecs.anu.edu.au/~bdm/nauty/)
+        for more information, and a built-in colour refinement labelling if not. Results are memoized by the pattern string in
+        `canonical_cache`, see `bionetgen.modelapi.canonical`
+    canonical_record : tuple
+        returns the canonicalization results in the format of the cache
+    set_canonical_record(record) : None
+        sets the canonicalization results from a cached record
+    hash_key : str
+        key used to hash the pattern, the canonical label
+    intern : Pattern
+        returns the one shared Pattern object for all patterns equal to
+        this one, see `hash_key`. Interned patterns are shared so they
+        shouldn't be modified.
     """
 
+    __slots__ = (
+        "molecules",
+        "_bonds",
+        "_compartment",
+        "_label",
+        "fixed",
+        "MatchOnce",
+        "relation",
+        "quantity",
+        "nautyG",
+        "canonical_certificate",
+        "canonical_label",
+        # interned patterns are kept in a WeakValueDictionary
+        "__weakref__",
+    )
+
     def __init__(
         self, molecules=[], bonds=None, compartment=None, label=None, canonicalize=False
     ):
@@ -77,24 +126,34 @@ class Pattern:
         """
         This method will use `pynauty` library to generate a canonical label
         for the pattern. This pattern will be stored in `canonical_label` attribute.
+        If `pynauty` is not installed the built-in colour refinement labelling
+        is used instead, labels of the two methods can't be compared.
         """
         # set a location for logging
         loc = f"{__file__} : Pattern.canonicalize()"
-        # try importing pynauty to canonicalize the labeling
-        try:
-            import pynauty
-        except ImportError:
-            logger.warning(
-                f"Importing pynauty failed, cannot canonicalize. Pattern equality checking is not guaranteed to work for highly symmetrical species.",
-                loc=loc,
-            )
+        # molecule compartments are part of the coloring, drop the
+        # ones that are the same as the pattern compartment first
+        self.consolidate_molecule_compartments()
+        # bonds are labelled by their molecules, patterns that weren't
+        # read from a string don't have the components linked up
+        for molec in self.molecules:
+            for comp in molec.components:
+                comp.parent_molecule = molec
+        # labels are memoized by the pattern string
+        key = canonical_cache_key(str(self))
+        record = canonical_cache.get(key)
+        if record is not None:
+            self.set_canonical_record(record)
             return
+        for molec in self.molecules:
+            for comp in molec.components:
+                comp.canonical_bonds = None
         # find how many vertices we need
         lmol = len(self.molecules)
         lcomp = sum([len(x.components) for x in self.molecules])
         node_cnt = lmol + lcomp
-        # initialize our pynauty graph
-        G = pynauty.Graph(node_cnt)
+        # the graph, vertex -> connected vertices
+        adjacency = {node: [] for node in range(node_cnt)}
         # going to need to figure out bonding
         bond_dict = {}
         # save our IDs
@@ -111,7 +170,7 @@ class Pattern:
         # let's loop over everything in the pattern
         for molec in self.molecules:
             # setting colors
-            color_id = (molec.name, None, None)
+            color_id = (molec.name, None, None, molec.compartment, molec.label)
             if color_id in colors:
                 colors[color_id].add(currId)
             else:
@@ -129,15 +188,20 @@ class Pattern:
             currId += 1
             # now looping over components
             for comp in molec.components:
+                # wildcard bonds are a property of the component,
+                # not an edge between two components
+                wildcards = tuple(
+                    sorted(bond for bond in comp._bonds if bond in WILDCARD_BONDS)
+                )
                 # saving component coloring
-                comp_color_id = (molec.name, comp.name, comp.state)
+                comp_color_id = (molec.name, comp.name, comp.state, wildcards)
                 if comp_color_id in colors:
                     colors[comp_color_id].add(currId)
                 else:
                     colors[comp_color_id] = set([currId])
                 chid_id = (molec.name, comp.name, mCopyId, cCopyId)
                 # connecting the component to the molecule
-                G.connect_vertex(grpIds[parent_id], [currId])
+                adjacency[grpIds[parent_id]].append(currId)
                 # saving component IDs
                 if chid_id in grpIds:
                     cCopyId += 1
@@ -151,6 +215,8 @@ class Pattern:
                 # saving bonds
                 if len(comp._bonds) != 0:
                     for bond in comp._bonds:
+                        if bond in WILDCARD_BONDS:
+                            continue
                         if bond not in bond_dict.keys():
                             bond_dict[bond] = [chid_id]
                         else:
@@ -163,24 +229,35 @@ class Pattern:
                 id1 = grpIds[id1]
                 id2 = bond_dict[bond][1]
                 id2 = grpIds[id2]
-                G.connect_vertex(id1, [id2])
+                adjacency[id1].append(id2)
             else:
                 # raise a warning
                 logger.warning(
                     f"Bond {bond} doesn't have exactly 2 end points, please check that you don't have any dangling bonds.",
                     loc=loc,
                 )
-        # we get our color sets
-        color_sets = list(colors.values())
-        # set vertex coloring
-        G.set_vertex_coloring(color_sets)
-        # save our graph
-        self.nautyG = G
-        # generate the canonical certificate for the entire graph
-        self.canonical_certificate = pynauty.certificate(self.nautyG)
-        # generate the canonical label for the entire graph
+        # we get our color sets, the order of the sets matters for the
+        # labelling so it can't depend on the order of the molecules
+        color_sets = [colors[color_id] for color_id in sorted(colors, key=repr)]
+        if pynauty_available():
+            import pynauty
+
+            # make our graph with vertex coloring
+            G = pynauty.Graph(
+                node_cnt, adjacency_dict=adjacency, vertex_coloring=color_sets
+            )
+            # save our graph
+            self.nautyG = G
+            # generate the canonical certificate for the entire graph
+            self.canonical_certificate = pynauty.certificate(self.nautyG)
+            # generate the canonical label for the entire graph
+            canon_order = pynauty.canon_label(self.nautyG)
+        else:
+            logger.debug("pynauty not found, using colour refinement", loc=loc)
+            canon_order, self.canonical_certificate = canonical_labelling(
+                node_cnt, adjacency, color_sets
+            )
         # first, we give every node their canonical order
-        canon_order = pynauty.canon_label(self.nautyG)
         for iordr, ordr in enumerate(canon_order):
             node_ptrs[ordr].canonical_order = iordr
         # relabeling bonds
@@ -221,6 +298,52 @@ class Pattern:
                 c2.canonical_bonds.append(str(ibond + 1))
         # and now we can get the canonical label
         self.canonical_label = self.print_canonical()
+        canonical_cache.put(key, self.canonical_record())
+
+    def canonical_record(self):
+        """
+        Returns the canonicalization results of the pattern as a tuple
+        of the canonical label, the certificate and the canonical
+        order and bonds of each molecule and component, the format
+        stored in the canonical label cache.
+        """
+        return (
+            self.canonical_label,
+            self.canonical_certificate,
+            tuple(molec.canonical_order for molec in self.molecules),
+            tuple(
+                tuple(comp.canonical_order for comp in molec.components)
+                for molec in self.molecules
+            ),
+            tuple(
+                tuple(
+                    (
+                        None
+                        if comp.canonical_bonds is None
+                        else tuple(comp.canonical_bonds)
+                    )
+                    for comp in molec.components
+                )
+                for molec in self.molecules
+            ),
+        )
+
+    def set_canonical_record(self, record):
+        """
+        Sets the canonicalization results from a tuple returned by
+        canonical_record for a pattern with the same string. The
+        pynauty graph is not part of the record and isn't set.
+        """
+        label, certificate, mol_orders, comp_orders, comp_bonds = record
+        for molec, mol_order, orders, bonds in zip(
+            self.molecules, mol_orders, comp_orders, comp_bonds
+        ):
+            molec.canonical_order = mol_order
+            for comp, order, cbonds in zip(molec.components, orders, bonds):
+                comp.canonical_order = order
+                comp.canonical_bonds = None if cbonds is None else list(cbonds)
+        self.canonical_certificate = certificate
+        self.canonical_label = label
 
     def print_canonical(self):
         # need to make sure we don't print useless compartments
@@ -254,54 +377,73 @@ class Pattern:
     def __contains__(self, val):
         return val in self.molecules
 
+    def hash_key(self):
+        """
+        Returns the key used to hash and intern the pattern. Equal
+        patterns need the same key so this is the canonical label,
+        the pattern is canonicalized if it wasn't already.
+        """
+        if self.canonical_label is None:
+            self.canonicalize()
+        return self.canonical_label
+
+    def __hash__(self):
+        return hash(self.hash_key())
+
+    def intern(self):
+        """
+        Returns the shared Pattern object equal to this pattern,
+        this pattern becomes the shared object if there isn't one
+        already.
+        """
+        key = self.hash_key()
+        pattern = _interned_patterns.get(key)
+        if pattern is None:
+            _interned_patterns[key] = self
+            pattern = self
+        return pattern
+
     def __eq__(self, other):
-        loc = f"{__file__} : Pattern.__eq__()"
+        debug = logger.is_debug
+        if debug:
+            loc = f"{__file__} : Pattern.__eq__()"
+        if self is other:
+            # interned patterns are the same object
+            return True
         if isinstance(other, Pattern):
-            logger.debug(f"Comparison class matches: {other.__class__}", loc=loc)
+            if debug:
+                logger.debug(f"Comparison class matches: {other.__class__}", loc=loc)
             # checking pattern-wide properties
             if (other.compartment == self.compartment) and (other.label == self.label):
-                logger.debug(
-                    f"Compartment or label matches: {other.compartment}, {other.label}",
-                    loc=loc,
-                )
-                # checking mods
-                if (other.fixed == self.fixed) and (other.MatchOnce == self.MatchOnce):
+                if debug:
                     logger.debug(
-                        f"fixed or matchonce matches: {other.fixed}, {other.MatchOnce}",
+                        f"Compartment or label matches: {other.compartment}, {other.label}",
                         loc=loc,
                     )
+                # checking mods
+                if (other.fixed == self.fixed) and (other.MatchOnce == self.MatchOnce):
+                    if debug:
+                        logger.debug(
+                            f"fixed or matchonce matches: {other.fixed}, {other.MatchOnce}",
+                            loc=loc,
+                        )
                     # checking quantifiers
                     if (other.relation == self.relation) and (
                         other.quantity == self.quantity
                     ):
-                        logger.debug(
-                            f"relation or quantity matches: {other.relation}, {other.quantity}",
-                            loc=loc,
-                        )
-                        # if we made the label, we can just compare the two
-                        if (self.canonical_label is not None) and (
-                            other.canonical_label is not None
-                        ):
-                            return self.canonical_label == other.canonical_label
-                        # now we can check contents
-                        for molecule in self:
-                            if molecule not in other.molecules:
-                                logger.debug(
-                                    f"molecule doesn't match: {molecule}", loc=loc
-                                )
-                                return False
-                        # isomorphism check if we have the certificate
-                        if (self.canonical_certificate is not None) and (
-                            other.canonical_certificate is not None
-                        ):
-                            if (
-                                self.canonical_certificate
-                                != other.canonical_certificate
-                            ):
-                                return False
-                        # TODO: molecules match, check bonds
-                        # Bonds match, patterns are the same
-                        logger.debug("patterns match!", loc=loc)
+                        if debug:
+                            logger.debug(
+                                f"relation or quantity matches: {other.relation}, {other.quantity}",
+                                loc=loc,
+                            )
+                        # equal patterns need equal hashes, so the
+                        # canonical labels decide, bonds included
+                        if self.hash_key() != other.hash_key():
+                            if debug:
+                                logger.debug("canonical labels don't match", loc=loc)
+                            return False
+                        if debug:
+                            logger.debug("patterns match!", loc=loc)
                         return True
         return False
 
@@ -398,8 +540,18 @@ class Molecule:
         (for molecule types) "states"
     """
 
+    __slots__ = (
+        "_name",
+        "_components",
+        "_compartment",
+        "_label",
+        "canonical_order",
+        "canonical_label",
+        "parent_pattern",
+    )
+
     def __init__(self, name="0", components=[], compartment=None, label=None):
-        self._name = name
+        self._name = _intern_name(name)
         self._components = components
         self._compartment = compartment
         self._label = label
@@ -411,20 +563,24 @@ class Molecule:
         return val in self.components
 
     def __eq__(self, other):
-        loc = f"{__file__} : Molecule.__eq__()"
+        debug = logger.is_debug
+        if debug:
+            loc = f"{__file__} : Molecule.__eq__()"
         # check object type
         if isinstance(other, Molecule):
-            logger.debug(f"Comparison class matches: {other.__class__}", loc=loc)
+            if debug:
+                logger.debug(f"Comparison class matches: {other.__class__}", loc=loc)
             # check attributes
             if (
                 (other.name == self.name)
                 and (other.compartment == self.compartment)
                 and (other.label == self.label)
             ):
-                logger.debug(
-                    f"name, compartment and labels match: {other.name}, {other.compartment}, {other.label}",
-                    loc=loc,
-                )
+                if debug:
+                    logger.debug(
+                        f"name, compartment and labels match: {other.name}, {other.compartment}, {other.label}",
+                        loc=loc,
+                    )
                 if (self.canonical_label is not None) and (
                     other.canonical_label is not None
                 ):
@@ -434,10 +590,14 @@ class Molecule:
                 # check components now
                 for component in self:
                     if component not in other.components:
-                        logger.debug(f"component doesn't match: {component}", loc=loc)
+                        if debug:
+                            logger.debug(
+                                f"component doesn't match: {component}", loc=loc
+                            )
                         return False
                 # everything matches
-                logger.debug("molecules match", loc=loc)
+                if debug:
+                    logger.debug("molecules match", loc=loc)
                 return True
         return False
 
@@ -508,7 +668,7 @@ class Molecule:
     def name(self, value):
         # print("Warning: Logical checks are not complete")
         # TODO: Check for invalid characters
-        self._name = value
+        self._name = _intern_name(value)
 
     @property
     def components(self):
@@ -581,6 +741,18 @@ class Component:
         to an existing component
     """
 
+    __slots__ = (
+        "_name",
+        "_label",
+        "_state",
+        "_states",
+        "_bonds",
+        "canonical_label",
+        "canonical_order",
+        "canonical_bonds",
+        "parent_molecule",
+    )
+
     def __init__(self):
         self._name = ""
         self._label = None
@@ -593,22 +765,28 @@ class Component:
         self.parent_molecule = None
 
     def __eq__(self, other):
-        loc = f"{__file__} : Component.__eq__()"
+        debug = logger.is_debug
+        if debug:
+            loc = f"{__file__} : Component.__eq__()"
         # check type
         # import ipdb;ipdb.set_trace()
         if isinstance(other, Component):
-            logger.debug(f"Comparison class matches: {other.__class__}", loc=loc)
+            if debug:
+                logger.debug(f"Comparison class matches: {other.__class__}", loc=loc)
             # check attributes
             if (other.name == self.name) and (other.label == self.label):
-                logger.debug(
-                    f"name and labels match: {other.name}, {other.label}", loc=loc
-                )
+                if debug:
+                    logger.debug(
+                        f"name and labels match: {other.name}, {other.label}", loc=loc
+                    )
                 # check states
                 if len(other.states) == len(self.states):
-                    logger.debug(f"state lists match: {other.states}", loc=loc)
+                    if debug:
+                        logger.debug(f"state lists match: {other.states}", loc=loc)
                     # check current state
                     if other.state == self.state:
-                        logger.debug(f"states match: {other.state}", loc=loc)
+                        if debug:
+                            logger.debug(f"states match: {other.state}", loc=loc)
                         if (self.canonical_label is not None) and (
                             other.canonical_label is not None
                         ):
@@ -625,7 +803,8 @@ class Component:
                         #         )
                         #         return False
                         if len(self.bonds) == len(other.bonds):
-                            logger.debug("components match", loc=loc)
+                            if debug:
+                                logger.debug("components match", loc=loc)
                             return True
         return False
 
@@ -662,6 +841,10 @@ class Component:
         if self.canonical_bonds is not None:
             for bond in self.canonical_bonds:
                 comp_str += "!{}".format(bond)
+        # wildcard bonds don't get relabeled
+        for bond in self.bonds:
+            if bond in WILDCARD_BONDS:
+                comp_str += "!{}".format(bond)
         return comp_str
 
     ### PROPERTIES ###
@@ -673,7 +856,7 @@ class Component:
     def name(self, value):
         # TODO: Add built-in logic here
         # print("Warning: Logical checks are not complete")
-        self._name = value
+        self._name = _intern_name(value)
 
     @property
     def label(self):
@@ -693,7 +876,7 @@ class Component:
     def state(self, value):
         # TODO: Add built-in logic here
         # print("Warning: Logical checks are not complete")
-        self._state = value
+        self._state = _intern_name(value)
 
     @property
     def states(self):
@@ -1,7 +1,12 @@
 from bionetgen.core.utils.logging import BNGLogger
 from bionetgen.modelapi.pattern import Pattern, Molecule, Component
+from bionetgen.modelapi.pattern_scanner import BNGPatternScanner
+import concurrent.futures
 import pyparsing as pp
 
+# maximum number of pattern strings to keep parsed tokens for
+TOKEN_CACHE_SIZE = 2**17
+
 
 class BNGParsers:
     """
@@ -17,12 +22,20 @@ class BNGPatternReader:
     Class that generates parsers to read BNG pattern strings and
     form Pattern objects from them.
 
+    Pattern strings are read by a single pass scanner, the pyparsing
+    grammar is kept as a reference implementation. The grammar is
+    built once per process and shared by all readers, the tokens
+    parsed from each pattern string are cached so reading the same
+    string again only has to form the Pattern object.
+
     Usage: BNGPatternReader(pattern_str)
+           BNGPatternReader.parse_many(pattern_strs, processes=4)
 
     Arguments
     ---------
     pattern_str : str
-        The pattern string to read and generate a Pattern object from
+        The pattern string to read and generate a Pattern object from,
+        if None only the parsers are setup
 
     Attributes
     ----------
@@ -31,33 +44,52 @@ class BNGPatternReader:
     parsers : BNGParsers
         Container object that has parsers for various parts of a
         BNG pattern string
+    scanner : BNGPatternScanner
+        Single pass tokenizer used to read pattern strings
 
     Methods
     -------
     define_parsers : None
-        runs other defined parser commands to setup all parsers
+        runs other defined parser commands to setup all parsers,
+        only once per process
     define_component_parser : None
         defines pyparsing parser for components
     define_molecule_parser : None
         defines pyparsing parser for molecules
     define_pattern_parser : None
         defines pyparsing parser for overall patterns
+    tokenize : tuple
+        reads the pattern string into cached tokens using the scanner
+    reference_tokenize : tuple
+        reads the pattern string into tokens using the pyparsing parsers
     make_pattern : Pattern
         forms the actual Pattern object from the pattern string
         using the defined parsers
+    parse_many : list[Pattern]
+        forms Pattern objects for a list of pattern strings, the
+        parsing can be spread over a process pool
     """
 
-    def __init__(self, pattern_str) -> None:
+    # shared by all readers in the process
+    _parsers = None
+    _token_cache = {}
+
+    def __init__(self, pattern_str=None) -> None:
         self.logger = BNGLogger()
         self.pattern_str = pattern_str
-        self.parsers = BNGParsers()
+        self.scanner = BNGPatternScanner()
         self.define_parsers()
-        self.pattern = self.make_pattern(self.pattern_str)
+        if pattern_str is not None:
+            self.pattern = self.make_pattern(self.pattern_str)
 
     def define_parsers(self):
-        self.define_component_parser()
-        self.define_molecule_parser()
-        self.define_pattern_parser()
+        if BNGPatternReader._parsers is None:
+            self.parsers = BNGParsers()
+            self.define_component_parser()
+            self.define_molecule_parser()
+            self.define_pattern_parser()
+            BNGPatternReader._parsers = self.parsers
+        self.parsers = BNGPatternReader._parsers
 
     def define_component_parser(self):
         """
@@ -72,10 +104,11 @@ class BNGPatternReader:
         self.parsers.bond = pp.Combine(
             (pp.Word("!") + pp.Word(pp.nums)) ^ (pp.Word("!?")) ^ (pp.Word("!+"))
         )
+        # components can have multiple bonds, e.g. A(b!1!2)
         self.parsers.component = (
             self.parsers.base_name
             + pp.Optional(self.parsers.state)
-            + pp.Optional(self.parsers.bond)
+            + pp.ZeroOrMore(self.parsers.bond)
         )
         component_parser = pp.Combine(self.parsers.component)
         # components are separated by commas
@@ -126,7 +159,9 @@ class BNGPatternReader:
         Defines specific parsers for overall BNG patterns
         """
         # a pattern can start with a tag or a compartment
-        mods = pp.Word("$") ^ pp.Word("{MatchOnce}")
+        # these need to be literals, pp.Word would match any molecule
+        # name starting with one of the characters of "{MatchOnce}"
+        mods = pp.Literal("$") ^ pp.Literal("{MatchOnce}")
         # zero molecule is a simple 0
         zeroMolecule = pp.Word("0")
         # quantifier
@@ -159,6 +194,62 @@ class BNGPatternReader:
         # full pattern
         self.parsers.pattern = pattern ^ zeroMolecule
 
+    def tokenize(self, pattern_str):
+        """
+        Reads the pattern string with the single pass scanner and
+        returns the parsed tokens as nested tuples of strings, see
+        BNGPatternScanner. Tokens are cached by pattern string.
+        """
+        cache = BNGPatternReader._token_cache
+        tokens = cache.get(pattern_str)
+        if tokens is not None:
+            return tokens
+        tokens = self.scanner.tokenize(pattern_str)
+        if len(cache) >= TOKEN_CACHE_SIZE:
+            cache.clear()
+        cache[pattern_str] = tokens
+        return tokens
+
+    def reference_tokenize(self, pattern_str):
+        """
+        Runs the pyparsing parsers on the pattern string and returns
+        the same tokens as tokenize. This is the reference
+        implementation the scanner is tested against, the molecules
+        token is replaced by a tuple of molecules, each a tuple of the
+        molecule tokens where the components token is replaced by a
+        tuple of component tokens.
+        """
+        parsed_pattern = self.parsers.pattern.parseString(pattern_str)
+        tokens = []
+        for parsed_val in parsed_pattern:
+            # only the molecules section has parentheses
+            if "(" not in parsed_val:
+                tokens.append(parsed_val)
+                continue
+            molecules = []
+            for molec_str in self.parsers.molecules_parser.parseString(parsed_val):
+                molec_tokens = []
+                in_molec = False
+                for molec_val in self.parsers.molecule.parseString(molec_str):
+                    if molec_val == "(" or molec_val == ")":
+                        in_molec = molec_val == "("
+                        molec_tokens.append(molec_val)
+                    elif in_molec:
+                        components = self.parsers.components_parser.parseString(
+                            molec_val
+                        )
+                        molec_tokens.append(
+                            tuple(
+                                tuple(self.parsers.component.parseString(comp_str))
+                                for comp_str in components
+                            )
+                        )
+                    else:
+                        molec_tokens.append(molec_val)
+                molecules.append(tuple(molec_tokens))
+            tokens.append(tuple(molecules))
+        return tuple(tokens)
+
     def make_pattern(self, pattern_str):
         """
         Forms the Pattern object from the given string using the
@@ -168,32 +259,42 @@ class BNGPatternReader:
         #     # import ipdb;ipdb.set_trace()
         #     import IPython,sys;IPython.embed();sys.exit()
         # set location for logging
-        log_loc = f"{__file__} : BNGPatternReader.make_pattern()"
+        debug = self.logger.is_debug
+        if debug:
+            log_loc = f"{__file__} : BNGPatternReader.make_pattern()"
         # instantiate a pattern
         pattern = Pattern(molecules=[])
         # start parsing
-        parsed_pattern = self.parsers.pattern.parseString(pattern_str)
+        parsed_pattern = self.tokenize(pattern_str)
         split_molecs = None
         # first we'll pull out any features that are pattern only
         for parsed_val in parsed_pattern:
             # these are pattern features and the entire molecules section
-            if parsed_val.startswith("@"):
+            if isinstance(parsed_val, tuple):
+                # only molecules should be remaining
+                split_molecs = parsed_val
+                continue
+            elif parsed_val.startswith("@"):
                 # this is a pattern-wide compartment
-                self.logger.debug(f"found compartment in {parsed_val}", loc=log_loc)
+                if debug:
+                    self.logger.debug(f"found compartment in {parsed_val}", loc=log_loc)
                 pattern.compartment = parsed_val.replace("@", "")
                 continue
             elif parsed_val.startswith("%"):
                 # this is a pattern-wide tag
-                self.logger.debug(f"found tag in {parsed_val}", loc=log_loc)
+                if debug:
+                    self.logger.debug(f"found tag in {parsed_val}", loc=log_loc)
                 pattern.label = parsed_val.replace("%", "")
                 continue
             elif parsed_val.startswith(":"):
                 # this is a pattern-wide separator
-                self.logger.debug(f"found separator in {parsed_val}", loc=log_loc)
+                if debug:
+                    self.logger.debug(f"found separator in {parsed_val}", loc=log_loc)
                 continue
             elif ("$" in parsed_val) or ("{MatchOnce}" in parsed_val):
                 # this is a constant value species pattern or a MatchOnce observable
-                self.logger.debug(f"found mod in {parsed_val}", loc=log_loc)
+                if debug:
+                    self.logger.debug(f"found mod in {parsed_val}", loc=log_loc)
                 if "$" in parsed_val:
                     pattern.fixed = True
                 elif "{MatchOnce}" in parsed_val:
@@ -206,7 +307,8 @@ class BNGPatternReader:
                 or (">=" in parsed_val)
                 or (">" in parsed_val)
             ):
-                self.logger.debug(f"found quantifier in {parsed_val}", loc=log_loc)
+                if debug:
+                    self.logger.debug(f"found quantifier in {parsed_val}", loc=log_loc)
                 if "==" in parsed_val:
                     pattern.relation = "=="
                 elif "<=" in parsed_val:
@@ -225,36 +327,46 @@ class BNGPatternReader:
                 m = Molecule(components=[])
                 m.parent_pattern = pattern
                 pattern.molecules.append(m)
-                self.logger.debug(f"found zero molecule in {parsed_val}", loc=log_loc)
+                if debug:
+                    self.logger.debug(
+                        f"found zero molecule in {parsed_val}", loc=log_loc
+                    )
                 continue
-            # only molecules should be remaining
-            split_molecs = self.parsers.molecules_parser.parseString(parsed_val)
         # if we had a zero molecule we are done
         if split_molecs is None:
             # this is the zero molecule
-            self.logger.debug(
-                f"no molecules found in: {self.pattern_str}, done", loc=log_loc
-            )
+            if debug:
+                self.logger.debug(
+                    f"no molecules found in: {pattern_str}, done", loc=log_loc
+                )
             return pattern
         # we got the molecule list, let's loop over molecules now
-        self.logger.debug(f"molecules: {split_molecs}", loc=log_loc)
-        for molec_str in split_molecs:
+        if debug:
+            self.logger.debug(f"molecules: {split_molecs}", loc=log_loc)
+        for parsed_molec in split_molecs:
             molecule = Molecule(components=[])
-            molecule.parent = pattern
-            # each molec str is a molecule string with all features
-            parsed_molec = self.parsers.molecule.parseString(molec_str)
-            self.logger.debug(f"parsed molecule: {parsed_molec}", loc=log_loc)
+            molecule.parent_pattern = pattern
+            # each molecule has the parsed tokens with all features
+            if debug:
+                self.logger.debug(f"parsed molecule: {parsed_molec}", loc=log_loc)
             in_molec = False
             for parsed_val in parsed_molec:
                 # we need to pull out the molecule features
-                if parsed_val.startswith("@"):
+                if isinstance(parsed_val, tuple):
+                    # these are the parsed components, handled below
+                    pass
+                elif parsed_val.startswith("@"):
                     # this is a molecule compartment
-                    self.logger.debug(f"found compartment in {parsed_val}", loc=log_loc)
+                    if debug:
+                        self.logger.debug(
+                            f"found compartment in {parsed_val}", loc=log_loc
+                        )
                     molecule.compartment = parsed_val.replace("@", "")
                     continue
                 elif parsed_val.startswith("%"):
                     # this is a molecule tag
-                    self.logger.debug(f"found tag in {parsed_val}", loc=log_loc)
+                    if debug:
+                        self.logger.debug(f"found tag in {parsed_val}", loc=log_loc)
                     molecule.label = parsed_val.replace("%", "")
                     continue
                 elif parsed_val == "(" or parsed_val == ")":
@@ -263,25 +375,20 @@ class BNGPatternReader:
                     else:
                         in_molec = False
                     # this molecule opening and closing
-                    self.logger.debug(f"found paran in {parsed_val}", loc=log_loc)
+                    if debug:
+                        self.logger.debug(f"found paran in {parsed_val}", loc=log_loc)
                     continue
                 if not in_molec:
                     # if we aren't in molecule yet, this can only be the name
                     molecule.name = parsed_val
                 else:
-                    # only components remain, parse those and loop
-                    split_components = self.parsers.components_parser.parseString(
-                        parsed_val
-                    )
-                    self.logger.debug(
-                        f"split components: {split_components}", loc=log_loc
-                    )
-                    for component_str in split_components:
-                        # each component is parsed separately now
-                        parsed_component = self.parsers.component.parseString(
-                            component_str
+                    # only components remain, loop over the parsed ones
+                    split_components = parsed_val
+                    if debug:
+                        self.logger.debug(
+                            f"split components: {split_components}", loc=log_loc
                         )
-
+                    for parsed_component in split_components:
                         component = Component()
                         component.parent_molecule = molecule
                         # import ipdb;ipdb.set_trace()
@@ -307,14 +414,52 @@ class BNGPatternReader:
                         # import IPython;IPython.embed()
                         # self._label = None
                         molecule.components.append(component)
-                        self.logger.debug(
-                            f"split components: {split_components}", loc=log_loc
-                        )
-            self.logger.debug(
-                f"molecule parsed: {molecule}",
-                loc=log_loc,
-            )
+                        if debug:
+                            self.logger.debug(
+                                f"split components: {split_components}", loc=log_loc
+                            )
+            if debug:
+                self.logger.debug(
+                    f"molecule parsed: {molecule}",
+                    loc=log_loc,
+                )
             pattern.molecules.append(molecule)
         # ship the finalized pattern object
         pattern.canonicalize()
         return pattern
+
+    @classmethod
+    def parse_many(cls, pattern_strs, processes=None, chunksize=1000, intern=False):
+        """
+        Forms Pattern objects for a list of pattern strings. Each
+        unique string is only parsed once, if processes is given and
+        there are enough strings to parse they are spread over a
+        process pool in chunks and the tokens are cached in this
+        process. Each string gets its own Pattern object unless
+        intern is set, then equal patterns share one interned object.
+        """
+        reader = cls()
+        cache = cls._token_cache
+        to_parse = list(dict.fromkeys(s for s in pattern_strs if s not in cache))
+        if processes is not None and processes > 1 and len(to_parse) > chunksize:
+            chunks = [
+                to_parse[i : i + chunksize] for i in range(0, len(to_parse), chunksize)
+            ]
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=processes
+            ) as executor:
+                for chunk, tokens in zip(chunks, executor.map(_tokenize_chunk, chunks)):
+                    for pattern_str, pattern_tokens in zip(chunk, tokens):
+                        if len(cache) >= TOKEN_CACHE_SIZE:
+                            cache.clear()
+                        cache[pattern_str] = pattern_tokens
+        patterns = [reader.make_pattern(pattern_str) for pattern_str in pattern_strs]
+        if intern:
+            patterns = [pattern.intern() for pattern in patterns]
+        return patterns
+
+
+def _tokenize_chunk(pattern_strs):
+    # runs in the worker processes of BNGPatternReader.parse_many
+    reader = BNGPatternReader()
+    return [reader.tokenize(pattern_str) for pattern_str in pattern_strs]
@@ -0,0 +1,173 @@
+from bionetgen.core.exc import BNGPatternError
+
+NAME_START = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ")
+NAME_CHARS = NAME_START | frozenset("0123456789_")
+DIGITS = frozenset("0123456789")
+WHITESPACE = frozenset(" \t\r\n")
+# longest first so "<=" isn't read as "<"
+RELATIONS = ("<=", ">=", "==", "<", ">")
+
+
+class BNGPatternScanner:
+    """
+    Single pass tokenizer for BNG pattern strings. Reads the pattern
+    left to right without backtracking and returns the same tokens as
+    the pyparsing parsers of BNGPatternReader, which are kept as the
+    reference implementation.
+
+    Usage: BNGPatternScanner().tokenize(pattern_str)
+
+    Tokens are nested tuples of strings. Pattern level tokens are
+    compartment ("@c"), tag ("%t"), separator (":" or "::"), mods
+    ("$", "{MatchOnce}"), quantifier (e.g. "==2") and the zero
+    molecule ("0"). The molecules section is a tuple of molecules,
+    each a tuple of the molecule name, tag and compartment tokens,
+    the parentheses and a tuple of components, where each component
+    is a tuple of its name, state ("~s") and bond ("!1", "!?", "!+")
+    tokens.
+
+    Attributes
+    ----------
+    string : str
+        pattern string that's being read
+    pos : int
+        current position in the string
+
+    Methods
+    -------
+    tokenize(pattern_str) : tuple
+        reads the pattern string and returns the tokens, raises a
+        BNGPatternError with the position of the problem if the
+        string is not a valid pattern
+    """
+
+    def __init__(self) -> None:
+        self.string = ""
+        self.pos = 0
+
+    def error(self, message):
+        raise BNGPatternError(self.string, self.pos, message=message)
+
+    def peek(self):
+        if self.pos < len(self.string):
+            return self.string[self.pos]
+        return ""
+
+    def skip_whitespace(self):
+        while self.pos < len(self.string) and self.string[self.pos] in WHITESPACE:
+            self.pos += 1
+
+    def read_chars(self, chars):
+        start = self.pos
+        while self.pos < len(self.string) and self.string[self.pos] in chars:
+            self.pos += 1
+        return self.string[start : self.pos]
+
+    def read_name(self):
+        if self.peek() not in NAME_START:
+            self.error("Expected a name")
+        return self.read_chars(NAME_CHARS)
+
+    def read_name_or_number(self):
+        if self.peek() in DIGITS:
+            return self.read_chars(DIGITS)
+        return self.read_name()
+
+    def read_tag_compartment(self, tokens):
+        # at most one tag and one compartment, in either order
+        seen = set()
+        while self.peek() in ("%", "@") and self.peek() not in seen:
+            char = self.peek()
+            seen.add(char)
+            self.pos += 1
+            if char == "%":
+                tokens.append("%" + self.read_name_or_number())
+            else:
+                tokens.append("@" + self.read_name())
+
+    def tokenize(self, pattern_str):
+        self.string = pattern_str
+        self.pos = 0
+        tokens = []
+        self.skip_whitespace()
+        if self.peek() == "0":
+            self.pos += 1
+            tokens.append("0")
+        else:
+            # pattern wide tag and compartment, followed by a separator
+            if self.peek() in ("%", "@"):
+                self.read_tag_compartment(tokens)
+                self.skip_whitespace()
+                separator = self.read_chars(":")
+                if separator not in (":", "::"):
+                    self.error("Expected ':' or '::' after the pattern tag/compartment")
+                tokens.append(separator)
+                self.skip_whitespace()
+            # constant species or MatchOnce
+            if self.peek() == "$":
+                self.pos += 1
+                tokens.append("$")
+                self.skip_whitespace()
+            elif self.string.startswith("{MatchOnce}", self.pos):
+                self.pos += len("{MatchOnce}")
+                tokens.append("{MatchOnce}")
+                self.skip_whitespace()
+            molecules = [self.read_molecule()]
+            while self.peek() == ".":
+                self.pos += 1
+                molecules.append(self.read_molecule())
+            tokens.append(tuple(molecules))
+            # quantifier
+            self.skip_whitespace()
+            for relation in RELATIONS:
+                if self.string.startswith(relation, self.pos):
+                    self.pos += len(relation)
+                    if self.peek() not in DIGITS:
+                        self.error("Expected a number after the quantifier")
+                    tokens.append(relation + self.read_chars(DIGITS))
+                    break
+        self.skip_whitespace()
+        if self.pos != len(self.string):
+            self.error("Unexpected character")
+        return tuple(tokens)
+
+    def read_molecule(self):
+        tokens = [self.read_name()]
+        self.read_tag_compartment(tokens)
+        if self.peek() != "(":
+            self.error("Expected '(' after the molecule name")
+        self.pos += 1
+        tokens.append("(")
+        if self.peek() != ")":
+            components = [self.read_component()]
+            while self.peek() == ",":
+                self.pos += 1
+                components.append(self.read_component())
+            tokens.append(tuple(components))
+            if self.peek() != ")":
+                self.error("Expected ',' or ')' after the component")
+        self.pos += 1
+        tokens.append(")")
+        self.read_tag_compartment(tokens)
+        return tuple(tokens)
+
+    def read_component(self):
+        tokens = [self.read_name()]
+        if self.peek() == "~":
+            self.pos += 1
+            if self.peek() == "?":
+                self.pos += 1
+                tokens.append("~?")
+            else:
+                tokens.append("~" + self.read_name_or_number())
+        while self.peek() == "!":
+            self.pos += 1
+            char = self.peek()
+            if char in DIGITS:
+                tokens.append("!" + self.read_chars(DIGITS))
+            elif char in ("?", "+"):
+                self.pos += 1
+                tokens.append("!" + char)
+            else:
+                self.error("Expected a bond number, '?' or '+'")
+        return tuple(tokens)
@@ -1,15 +1,10 @@
 import os
 from tempfile import TemporaryDirectory
-from bionetgen.main import BioNetGen
+from bionetgen.core.defaults import get_config
 from bionetgen.core.tools import BNGCLI
 
-# This allows access to the CLIs config setup
-app = BioNetGen()
-app.setup()
-conf = app.config["bionetgen"]
 
-
-def run(inp, out=None, suppress=False, timeout=None):
+def run(inp, out=None, suppress=False, timeout=None, pool=None):
     """
     Convenience function to run BNG2.pl as a library
 
@@ -22,13 +17,24 @@ def run(inp, out=None, suppress=False, timeout=None):
     output_folder : str
         (optional) this points to a folder to put the results
         into. If it doesn't exist, it will be created.
+    pool : BNGWorkerPool
+        (optional) pool of BNG2.pl console workers to run the model
+        on, True uses the pool shared by the process. Saves starting
+        BNG2.pl for every run.
     """
     # if out is None we make a temp directory
     cur_dir = os.getcwd()
     if out is None:
         with TemporaryDirectory() as out:
             # instantiate a CLI object with the info
-            cli = BNGCLI(inp, out, conf["bngpath"], suppress=suppress, timeout=timeout)
+            cli = BNGCLI(
+                inp,
+                out,
+                get_config()["bngpath"],
+                suppress=suppress,
+                timeout=timeout,
+                pool=pool,
+            )
             try:
                 cli.run()
                 os.chdir(cur_dir)
@@ -39,7 +45,14 @@ def run(inp, out=None, suppress=False, timeout=None):
                 raise e
     else:
         # instantiate a CLI object with the info
-        cli = BNGCLI(inp, out, conf["bngpath"], suppress=suppress, timeout=timeout)
+        cli = BNGCLI(
+            inp,
+            out,
+            get_config()["bngpath"],
+            suppress=suppress,
+            timeout=timeout,
+            pool=pool,
+        )
         try:
             cli.run()
             os.chdir(cur_dir)
@@ -25,6 +25,8 @@ class ModelObj:
         line attributes
     """
 
+    __slots__ = ("_comment", "_line_label")
+
     def __init__(self):
         self._comment = None
         self._line_label = None
@@ -107,6 +109,8 @@ class Parameter(ModelObj):
         is in expression form or in value form.
     """
 
+    __slots__ = ("name", "value", "expr", "write_expr")
+
     def __init__(self, name, value, expr=None):
         super().__init__()
         self.name = name
@@ -150,6 +154,8 @@ class Compartment(ModelObj):
         boolean that describes if the size is a volume or an expression
     """
 
+    __slots__ = ("name", "dim", "size", "write_expr", "outside")
+
     def __init__(self, name, dim, size, outside=None):
         super().__init__()
         self.name = name
@@ -193,6 +199,8 @@ class Observable(ModelObj):
         for this observable
     """
 
+    __slots__ = ("name", "type", "patterns")
+
     def __init__(self, name, otype, patterns=[]):
         super().__init__()
         self.name = name
@@ -235,6 +243,8 @@ class MoleculeType(ModelObj):
         can also handle multiple component states
     """
 
+    __slots__ = ("name", "molecule")
+
     def __init__(self, name, components):
         super().__init__()
         self.name = name
@@ -261,6 +271,8 @@ class Species(ModelObj):
         starting value of the seed species
     """
 
+    __slots__ = ("pattern", "count", "name")
+
     def __init__(self, pattern=Pattern(), count=0):
         super().__init__()
         self.pattern = pattern
@@ -294,6 +306,8 @@ class Function(ModelObj):
         optional list of arguments for the function
     """
 
+    __slots__ = ("name", "expr", "args")
+
     def __init__(self, name, expr, args=None):
         super().__init__()
         self.name = name
@@ -323,6 +337,16 @@ class Action(ModelObj):
         action arguments as keys and their values as values
     """
 
+    __slots__ = (
+        "normal_types",
+        "no_setter_syntax",
+        "square_braces",
+        "possible_types",
+        "name",
+        "type",
+        "args",
+    )
+
     def __init__(self, action_type=None, action_args={}) -> None:
         super().__init__()
         AList = ActionList()
@@ -431,6 +455,16 @@ class Rule(ModelObj):
         on one side of a rule definition
     """
 
+    __slots__ = (
+        "name",
+        "reactants",
+        "products",
+        "rule_mod",
+        "operations",
+        "rate_constants",
+        "bidirectional",
+    )
+
     def __init__(
         self,
         name,
@@ -506,6 +540,8 @@ class EnergyPattern(ModelObj):
         expression used for energy pattern
     """
 
+    __slots__ = ("name", "pattern", "expression")
+
     def __init__(self, name, pattern, expression):
         super().__init__()
         self.name = name
@@ -536,6 +572,8 @@ class PopulationMap(ModelObj):
         lumping parameter used in population mapping
     """
 
+    __slots__ = ("name", "species", "population", "rate")
+
     def __init__(self, name, struct_species, pop_species, rate):
         super().__init__()
         self.name = name
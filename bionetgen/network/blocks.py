@@ -12,6 +12,7 @@ try:
 except ImportError:
     from collections import OrderedDict
 
+
 ###### BLOCK OBJECTS ######
 class NetworkBlock:
     """
@@ -24,7 +25,8 @@ class NetworkBlock:
     comment : (str, str)
         comment at the begin {block} or end {block} statements, tuple
     items : OrderedDict
-        all the model objects in the block
+        all the model objects in the block, items with string names
+        can also be accessed as attributes of the block
 
     Methods
     -------
@@ -79,6 +81,16 @@ class NetworkBlock:
     def __contains__(self, key) -> bool:
         return key in self.items
 
+    def __getattr__(self, name):
+        # only called if there is no such attribute, items
+        # can be reached as attributes of the block
+        items = self.__dict__.get("items")
+        if items is not None and name in items:
+            return items[name]
+        raise AttributeError(
+            f"'{self.__class__.__name__}' object has no attribute '{name}'"
+        )
+
     # TODO: Think extensively how this is going to work
     def __setattr__(self, name, value) -> None:
         changed = False
@@ -92,7 +104,6 @@ class NetworkBlock:
                     self.items[name] = value
                 if changed:
                     self._changes[name] = new_value
-                    self.__dict__[name] = new_value
         else:
             self.__dict__[name] = value
 
@@ -122,15 +133,9 @@ class NetworkBlock:
         # allow for empty addition, uses index
         if name is None:
             name = len(self.items)
-        # set the line
+        # set the line, items are reached as attributes
+        # through __getattr__
         self.items[name] = value
-        # if the name is a string, try adding as an attribute
-        if isinstance(name, str):
-            try:
-                setattr(self, name, value)
-            except:
-                # print("can't set {} to {}".format(name, value))
-                pass
         # we just added an item to a block, let's assume we need
         # to recompile if we have a compiled simulator
         self._recompile = True
@@ -149,6 +154,9 @@ class NetworkParameterBlock(NetworkBlock):
     add_parameter(name, value, expr=None)
         adds a parameter by making a new Parameter object and passing
         the args/kwargs to its initialization.
+    engine() : BNGParameterEngine
+        returns a parameter engine that evaluates the parameter
+        values in dependency order
     """
 
     def __init__(self) -> None:
@@ -186,7 +194,6 @@ class NetworkParameterBlock(NetworkBlock):
                         )
                 if changed:
                     self._changes[name] = value
-                    self.__dict__[name] = value
             else:
                 self.__dict__[name] = value
         else:
@@ -196,6 +203,18 @@ class NetworkParameterBlock(NetworkBlock):
         p = NetworkParameter(*args, **kwargs)
         self.add_item((p.name, p))
 
+    def engine(self):
+        """
+        Returns a BNGParameterEngine built from the parameter values
+        of the network.
+        """
+        from bionetgen.modelapi.expressions import BNGParameterEngine
+
+        exprs = OrderedDict()
+        for param in self.items.values():
+            exprs[param.name] = param.value
+        return BNGParameterEngine(exprs)
+
 
 class NetworkCompartmentBlock(NetworkBlock):
     """
@@ -237,7 +256,6 @@ class NetworkCompartmentBlock(NetworkBlock):
                         )
                 if changed:
                     self._changes[name] = value
-                    self.__dict__[name] = value
             else:
                 self.__dict__[name] = value
         else:
@@ -257,6 +275,8 @@ class NetworkGroupBlock(NetworkBlock):
     add_group(name, otype, patterns=[])
         adds an group by making a new NetworkGroup object and passing
         the args/kwargs to its initialization.
+    sparse_matrix()
+        returns the species to group weights in coordinate (COO) form
     """
 
     def __init__(self) -> None:
@@ -282,7 +302,6 @@ class NetworkGroupBlock(NetworkBlock):
                     )
                 if changed:
                     self._changes[name] = value
-                    self.__dict__[name] = value
             else:
                 self.__dict__[name] = value
         else:
@@ -292,6 +311,25 @@ class NetworkGroupBlock(NetworkBlock):
         g = NetworkGroup(*args, **kwargs)
         self.add_item((g.name, g))
 
+    def sparse_matrix(self):
+        """
+        Returns the groups block as a sparse groups x species matrix in
+        coordinate form. The return value is a tuple of
+        (group_names, rows, cols, weights) where rows index into
+        group_names and cols are 0-indexed species IDs, i.e. the cdat
+        column of a species minus the time column.
+        """
+        names = []
+        rows, cols, weights = [], [], []
+        for igrp, gname in enumerate(self.items):
+            group = self.items[gname]
+            names.append(group.name)
+            for sid, weight in group.weights():
+                rows.append(igrp)
+                cols.append(sid - 1)
+                weights.append(weight)
+        return names, rows, cols, weights
+
 
 class NetworkSpeciesBlock(NetworkBlock):
     """
@@ -327,7 +365,6 @@ class NetworkSpeciesBlock(NetworkBlock):
                     )
                 if changed:
                     self._changes[name] = value
-                    self.__dict__[name] = value
             else:
                 self.__dict__[name] = value
         else:
@@ -379,7 +416,6 @@ class NetworkFunctionBlock(NetworkBlock):
                     )
                 if changed:
                     self._changes[name] = value
-                    self.__dict__[name] = value
             else:
                 self.__dict__[name] = value
         else:
@@ -429,7 +465,6 @@ class NetworkReactionBlock(NetworkBlock):
                     )
                 if changed:
                     self._changes[name] = value
-                    self.__dict__[name] = value
             else:
                 self.__dict__[name] = value
         else:
@@ -474,7 +509,6 @@ class NetworkEnergyPatternBlock(NetworkBlock):
                     )
                 if changed:
                     self._changes[name] = value
-                    self.__dict__[name] = value
             else:
                 self.__dict__[name] = value
         else:
@@ -519,7 +553,6 @@ class NetworkPopulationMapBlock(NetworkBlock):
                     )
                 if changed:
                     self._changes[name] = value
-                    self.__dict__[name] = value
             else:
                 self.__dict__[name] = value
         else:
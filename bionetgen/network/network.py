@@ -1,4 +1,3 @@
-from bionetgen.main import BioNetGen
 from bionetgen.network.networkparser import BNGNetworkParser
 from bionetgen.network.blocks import (
     NetworkGroupBlock,
@@ -12,12 +11,6 @@ from bionetgen.network.blocks import (
 )
 
 
-# This allows access to the CLIs config setup
-app = BioNetGen()
-app.setup()
-conf = app.config["bionetgen"]
-def_bng_path = conf["bngpath"]
-
 ###### CORE OBJECT AND PARSING FRONT-END ######
 class Network:
     """
@@ -36,6 +29,9 @@ class Network:
         BNGParser object that's responsible for .bngl file reading and model setup
     network_name : str
         name of the model, generally set from the given BNGL file
+    matcher : BNGPatternMatcher
+        pattern matching engine for the species of the network, created
+        the first time it's accessed
 
     Methods
     -------
@@ -44,16 +40,19 @@ class Network:
     setup_simulator(sim_type)
         sets up a simulator in bngmodel.simulator where the only current supported
         type of simulator is libRR for libRoadRunner simulator.
+    reduce(conservation=True)
+        returns a NetworkReduction with unreachable species and reactions
+        removed and the conservation laws of the reduced network
     """
 
-    def __init__(self, bngl_model, BNGPATH=def_bng_path):
+    def __init__(self, bngl_model, BNGPATH=None):
         self.active_blocks = []
         # We want blocks to be printed in the same order every time
         self.block_order = [
             "parameters",
             "species",
             "reactions",
-            "groups"
+            "groups",
             # "compartments",
             # "molecule_types",
             # "species",
@@ -63,6 +62,7 @@ class Network:
             # "actions",
         ]
         self.network_name = ""
+        self._matcher = None
         self.bngnetworkparser = BNGNetworkParser(bngl_model)
         self.bngnetworkparser.parse_network(self)
         for block in self.block_order:
@@ -102,6 +102,27 @@ class Network:
     def __repr__(self):
         return self.network_name
 
+    @property
+    def matcher(self):
+        if self._matcher is None:
+            from bionetgen.network.patternmatcher import BNGPatternMatcher
+
+            self._matcher = BNGPatternMatcher(self)
+        return self._matcher
+
+    def reduce(self, conservation=True):
+        """
+        Reduces the network by dropping reactions with zero rate constants
+        and species that can't be populated from the initial species. If
+        conservation is True, also computes the conservation laws of the
+        reduced network and which species they eliminate. Returns a
+        NetworkReduction object with the reduced network and the map
+        back to the original species.
+        """
+        from bionetgen.network.reduction import reduce_network
+
+        return reduce_network(self, conservation=conservation)
+
     def __iter__(self):
         active_ordered_blocks = [
             getattr(self, i) for i in self.block_order if i in self.active_blocks
@@ -1,5 +1,4 @@
 import re, os
-from bionetgen.main import BioNetGen
 from bionetgen.network.blocks import (
     NetworkGroupBlock,
     NetworkParameterBlock,
@@ -12,13 +11,6 @@ from bionetgen.network.blocks import (
 )
 
 
-# This allows access to the CLIs config setup
-app = BioNetGen()
-app.setup()
-conf = app.config["bionetgen"]
-def_bng_path = conf["bngpath"]
-
-
 class BNGNetworkParser:
     """
     Parser object that deals with reading in the BNGL file and
@@ -134,7 +126,11 @@ class BNGNetworkParser:
                     splt = m.group(1).split()
                     rid = splt[0]
                     name = splt[1]
-                    members = splt[2].split(",")
+                    # groups that match no species have no members
+                    if len(splt) > 2:
+                        members = splt[2].split(",")
+                    else:
+                        members = []
                     comment = m.group(2)
                     grps_block.add_group(rid, name, members, comment=comment)
             network_obj.add_block(grps_block)
@@ -0,0 +1,394 @@
+from collections import Counter
+from bionetgen.core.utils.logging import BNGLogger
+from bionetgen.modelapi.pattern import Pattern
+from bionetgen.modelapi.pattern_reader import BNGPatternReader
+
+
+class _SpeciesGraph:
+    """
+    Flat graph representation of a fully specified species used
+    by the matcher. Molecules and components are stored in lists
+    and every bond is resolved to the index of the partner component,
+    comp_partners holds the list of partners of each component.
+    """
+
+    def __init__(self, pattern):
+        self.compartment = pattern.compartment
+        self.mol_names = []
+        self.mol_comps = []
+        self.mol_compartments = []
+        self.comp_names = []
+        self.comp_states = []
+        self.comp_partners = []
+        bond_ends = {}
+        for molec in pattern.molecules:
+            imol = len(self.mol_names)
+            self.mol_names.append(molec.name)
+            if molec.compartment is not None:
+                self.mol_compartments.append(molec.compartment)
+            else:
+                self.mol_compartments.append(pattern.compartment)
+            comp_ids = []
+            for comp in molec.components:
+                icomp = len(self.comp_names)
+                comp_ids.append(icomp)
+                self.comp_names.append(comp.name)
+                self.comp_states.append(comp.state)
+                self.comp_partners.append([])
+                for bond in comp.bonds:
+                    bond_ends.setdefault(bond, []).append(icomp)
+            self.mol_comps.append(comp_ids)
+        for ends in bond_ends.values():
+            if len(ends) == 2:
+                self.comp_partners[ends[0]].append(ends[1])
+                self.comp_partners[ends[1]].append(ends[0])
+        # molecule index of each component
+        self.comp_mol = [None] * len(self.comp_names)
+        for imol, comp_ids in enumerate(self.mol_comps):
+            for icomp in comp_ids:
+                self.comp_mol[icomp] = imol
+        # molecule name -> list of molecule indices
+        self.name_index = {}
+        for imol, name in enumerate(self.mol_names):
+            self.name_index.setdefault(name, []).append(imol)
+        self.name_counts = Counter(self.mol_names)
+
+
+class _PatternGraph:
+    """
+    Flat graph representation of a pattern to match. The bonds of
+    each component are normalized to a list where each entry is "+"
+    (bound to anything), "?" (don't care) or the index of the partner
+    pattern component. An empty list means the component is unbound.
+    """
+
+    def __init__(self, pattern):
+        self.compartment = pattern.compartment
+        self.match_once = pattern.MatchOnce
+        self.relation = pattern.relation
+        self.quantity = pattern.quantity
+        self.mol_names = []
+        self.mol_compartments = []
+        self.mol_comps = []
+        self.comp_names = []
+        self.comp_states = []
+        self.comp_bonds = []
+        bond_ends = {}
+        for molec in pattern.molecules:
+            # the null molecule doesn't constrain anything
+            if molec.name == "0":
+                continue
+            self.mol_names.append(molec.name)
+            self.mol_compartments.append(molec.compartment)
+            comp_ids = []
+            for comp in molec.components:
+                icomp = len(self.comp_names)
+                comp_ids.append(icomp)
+                self.comp_names.append(comp.name)
+                state = comp.state
+                if state == "?":
+                    state = None
+                self.comp_states.append(state)
+                bonds = []
+                for b in comp.bonds:
+                    if b not in ("+", "?"):
+                        bond_ends.setdefault(b, []).append((icomp, len(bonds)))
+                    # explicit bonds become wildcards unless we find the other end
+                    bonds.append(b if b == "?" else "+")
+                self.comp_bonds.append(bonds)
+            self.mol_comps.append(comp_ids)
+        for ends in bond_ends.values():
+            if len(ends) == 2:
+                (c1, b1), (c2, b2) = ends
+                self.comp_bonds[c1][b1] = c2
+                self.comp_bonds[c2][b2] = c1
+        self.comp_mol = [None] * len(self.comp_names)
+        for imol, comp_ids in enumerate(self.mol_comps):
+            for icomp in comp_ids:
+                self.comp_mol[icomp] = imol
+        self.name_counts = Counter(self.mol_names)
+        self.order = self._traversal_order()
+
+    def _traversal_order(self):
+        """
+        Orders molecules so that every molecule after the first one in
+        a connected piece of the pattern is bonded to an earlier one. Each
+        entry is (molecule, (pattern component, partner component)) where
+        the bond tuple is None for the first molecule of a piece.
+        """
+        order = []
+        seen = set()
+        for start in range(len(self.mol_names)):
+            if start in seen:
+                continue
+            seen.add(start)
+            order.append((start, None))
+            queue = [start]
+            while len(queue) > 0:
+                imol = queue.pop(0)
+                for icomp in self.mol_comps[imol]:
+                    for partner in self.comp_bonds[icomp]:
+                        if not isinstance(partner, int):
+                            continue
+                        pmol = self.comp_mol[partner]
+                        if pmol in seen:
+                            continue
+                        seen.add(pmol)
+                        order.append((pmol, (icomp, partner)))
+                        queue.append(pmol)
+        return order
+
+
+class BNGPatternMatcher:
+    """
+    Subgraph matching engine that matches BNG patterns against the
+    species of a network. Counting follows BNG2.pl: the number of
+    matches of a pattern in a species is the number of distinct
+    embeddings of the pattern into the species graph.
+
+    Usage: BNGPatternMatcher(network)
+
+    Arguments
+    ---------
+    network : Network
+        the network whose species the patterns will be matched against
+
+    Attributes
+    ----------
+    species : list[Pattern]
+        parsed patterns of each species in the network, in the order
+        of the network species block
+    cache : dict
+        cache of match results keyed by the canonical label of the
+        pattern
+
+    Methods
+    -------
+    match(pattern) : dict
+        returns a dictionary of species index (0-indexed) to number of
+        matches of the given pattern
+    observable_weights(observable) : dict
+        returns a dictionary of species index (0-indexed) to the weight
+        of that species in the given observable
+    sparse_matrix(observables) : tuple
+        returns the observables x species weight matrix in coordinate form
+    """
+
+    def __init__(self, network) -> None:
+        self.logger = BNGLogger()
+        self.species = []
+        self._graphs = []
+        # molecule name -> set of species indices containing it
+        self._index = {}
+        patterns = BNGPatternReader.parse_many(
+            [network.species[sname].name for sname in network.species]
+        )
+        for ispec, pattern in enumerate(patterns):
+            graph = _SpeciesGraph(pattern)
+            self.species.append(pattern)
+            self._graphs.append(graph)
+            for name in graph.name_counts:
+                self._index.setdefault(name, set()).add(ispec)
+        self.cache = {}
+
+    def _as_pattern(self, pattern):
+        if isinstance(pattern, Pattern):
+            return pattern
+        return BNGPatternReader(pattern).pattern
+
+    def match(self, pattern) -> dict:
+        """
+        Matches a pattern against every species in the network and
+        returns a dictionary of 0-indexed species index to the number
+        of times the pattern matches that species.
+        """
+        pattern = self._as_pattern(pattern)
+        # isomorphic patterns share the canonical label
+        key = pattern.hash_key()
+        if key in self.cache:
+            return self.cache[key]
+        pgraph = _PatternGraph(pattern)
+        matches = {}
+        for ispec in self._candidates(pgraph):
+            sgraph = self._graphs[ispec]
+            if pgraph.compartment is not None:
+                if not self._species_in_compartment(sgraph, pgraph.compartment):
+                    continue
+            count = self._count_embeddings(pgraph, sgraph)
+            if count > 0:
+                matches[ispec] = count
+        self.cache[key] = matches
+        return matches
+
+    def observable_weights(self, observable) -> dict:
+        """
+        Computes the weight of each species for an observable. The
+        observable can be a modelapi Observable object or a tuple of
+        (observable type, list of patterns). Molecules observables sum
+        the matches of all patterns, Species observables add one for
+        every pattern that matches the species.
+        """
+        if isinstance(observable, tuple):
+            otype, patterns = observable
+        else:
+            otype, patterns = observable.type, observable.patterns
+        weights = {}
+        for pat in patterns:
+            pat = self._as_pattern(pat)
+            matches = self.match(pat)
+            for ispec, count in matches.items():
+                if pat.relation is not None:
+                    # quantified patterns count species that satisfy the relation
+                    if not self._compare(count, pat.relation, pat.quantity):
+                        continue
+                    count = 1
+                if otype == "Species" or pat.MatchOnce:
+                    count = 1
+                weights[ispec] = weights.get(ispec, 0.0) + count
+        return weights
+
+    def sparse_matrix(self, observables):
+        """
+        Returns the observables x species weight matrix in coordinate
+        form as (names, rows, cols, weights), in the same format as
+        NetworkGroupBlock.sparse_matrix.
+        """
+        names = []
+        rows, cols, weights = [], [], []
+        for iobs, obs in enumerate(observables):
+            names.append(obs.name)
+            obs_weights = self.observable_weights(obs)
+            for ispec in sorted(obs_weights):
+                rows.append(iobs)
+                cols.append(ispec)
+                weights.append(obs_weights[ispec])
+        return names, rows, cols, weights
+
+    def _candidates(self, pgraph):
+        """
+        Uses the molecule name index to find species that contain
+        enough of every molecule type in the pattern.
+        """
+        if len(pgraph.mol_names) == 0:
+            return []
+        candidate_sets = []
+        for name in pgraph.name_counts:
+            if name not in self._index:
+                return []
+            candidate_sets.append(self._index[name])
+        candidate_sets.sort(key=len)
+        candidates = set(candidate_sets[0])
+        for cset in candidate_sets[1:]:
+            candidates &= cset
+        return sorted(
+            ispec
+            for ispec in candidates
+            if all(
+                self._graphs[ispec].name_counts[name] >= cnt
+                for name, cnt in pgraph.name_counts.items()
+            )
+        )
+
+    def _species_in_compartment(self, sgraph, compartment):
+        if sgraph.compartment is not None:
+            return sgraph.compartment == compartment
+        return all(c == compartment for c in sgraph.mol_compartments)
+
+    def _compare(self, count, relation, quantity):
+        quantity = int(quantity)
+        if relation == "==":
+            return count == quantity
+        elif relation == "<=":
+            return count <= quantity
+        elif relation == ">=":
+            return count >= quantity
+        elif relation == "<":
+            return count < quantity
+        elif relation == ">":
+            return count > quantity
+        return False
+
+    def _count_embeddings(self, pgraph, sgraph):
+        """
+        Counts the number of embeddings of the pattern graph into the
+        species graph with a backtracking search over molecules in
+        traversal order. Molecules reached through a bond only try the
+        species molecule on the other end of the mapped bond.
+        """
+        comp_map = {}
+        used_mols = set()
+        used_comps = set()
+        order = pgraph.order
+
+        def map_molecule(istep):
+            if istep == len(order):
+                return 1
+            pmol, via = order[istep]
+            if via is None:
+                candidates = sgraph.name_index.get(pgraph.mol_names[pmol], [])
+            else:
+                pcomp, partner = via
+                candidates = set(
+                    sgraph.comp_mol[spartner]
+                    for spartner in sgraph.comp_partners[comp_map[pcomp]]
+                )
+            total = 0
+            for smol in candidates:
+                if smol in used_mols:
+                    continue
+                if sgraph.mol_names[smol] != pgraph.mol_names[pmol]:
+                    continue
+                pcompartment = pgraph.mol_compartments[pmol]
+                if pcompartment is not None:
+                    if sgraph.mol_compartments[smol] != pcompartment:
+                        continue
+                used_mols.add(smol)
+                total += map_components(istep, pmol, smol, 0)
+                used_mols.remove(smol)
+            return total
+
+        def map_components(istep, pmol, smol, icomp):
+            pcomps = pgraph.mol_comps[pmol]
+            if icomp == len(pcomps):
+                return map_molecule(istep + 1)
+            pcomp = pcomps[icomp]
+            total = 0
+            for scomp in sgraph.mol_comps[smol]:
+                if scomp in used_comps:
+                    continue
+                if not self._component_matches(pgraph, sgraph, pcomp, scomp, comp_map):
+                    continue
+                comp_map[pcomp] = scomp
+                used_comps.add(scomp)
+                total += map_components(istep, pmol, smol, icomp + 1)
+                used_comps.remove(scomp)
+                del comp_map[pcomp]
+            return total
+
+        return map_molecule(0)
+
+    def _component_matches(self, pgraph, sgraph, pcomp, scomp, comp_map):
+        if pgraph.comp_names[pcomp] != sgraph.comp_names[scomp]:
+            return False
+        pstate = pgraph.comp_states[pcomp]
+        if pstate is not None and pstate != sgraph.comp_states[scomp]:
+            return False
+        pbonds = pgraph.comp_bonds[pcomp]
+        spartners = sgraph.comp_partners[scomp]
+        # without a wildcard the number of bonds has to match exactly,
+        # "+" allows extra bonds and "?" can also match a missing one
+        if "?" in pbonds:
+            if len(spartners) < len(pbonds) - 1:
+                return False
+        elif "+" in pbonds:
+            if len(spartners) < len(pbonds):
+                return False
+        elif len(spartners) != len(pbonds):
+            return False
+        # explicit bonds to already mapped components have to
+        # connect to the image of that component
+        for partner in pbonds:
+            if isinstance(partner, int) and partner in comp_map:
+                if comp_map[partner] not in spartners:
+                    return False
+        return True
@@ -0,0 +1,389 @@
+import copy
+import heapq
+import math
+from fractions import Fraction
+import numpy as np
+
+from bionetgen.core.exc import BNGModelError
+from bionetgen.core.utils.logging import BNGLogger
+from bionetgen.network.blocks import (
+    NetworkGroupBlock,
+    NetworkReactionBlock,
+    NetworkSpeciesBlock,
+)
+
+
+def _species_ids(side):
+    # "0" is the null species in reactant/product lists
+    return [int(sid) for sid in side if sid != "0"]
+
+
+def conservation_laws(reactions, nspecies):
+    """
+    Computes a basis of the linear conservation laws of a reaction
+    network, i.e. the left null space of the stoichiometry matrix.
+
+    The elimination is done on the sparse integer stoichiometry matrix
+    in a fraction free manner so the laws have integer coefficients.
+    Each reaction column is pivoted on the sparsest species row that's
+    still free, species that are never chosen as pivots are the
+    dependent species. Instead of carrying a dense identity along,
+    every row update is recorded as a node in a DAG and the laws are
+    expanded from that history at the end, which keeps long chains of
+    eliminations linear.
+
+    Arguments
+    ---------
+    reactions : list[(list[int], list[int])]
+        list of (reactants, products) tuples with 0-indexed species
+    nspecies : int
+        number of species in the network
+
+    Returns
+    -------
+    laws : list[dict]
+        each law is a dictionary of species index to integer coefficient
+    dependent : list[int]
+        the species that's eliminated by each law, the coefficient of
+        a dependent species is non-zero only in its own law
+    """
+    # sparse rows of the stoichiometry matrix
+    rows = [dict() for _ in range(nspecies)]
+    for irxn, (reactants, products) in enumerate(reactions):
+        for sid in reactants:
+            rows[sid][irxn] = rows[sid].get(irxn, 0) - 1
+        for sid in products:
+            rows[sid][irxn] = rows[sid].get(irxn, 0) + 1
+    # column index, reaction -> species with a non-zero entry
+    columns = [set() for _ in range(len(reactions))]
+    for sid, row in enumerate(rows):
+        for irxn in [r for r, v in row.items() if v == 0]:
+            del row[irxn]
+        for irxn in row:
+            columns[irxn].add(sid)
+    # history of row updates, nodes below nspecies are the species
+    # themselves and every other node is (terms, divisor) where the
+    # row is sum(coef * node for coef, node in terms) / divisor
+    history = [None] * nspecies
+    current = list(range(nspecies))
+    pivoted = [False] * nspecies
+    for irxn in range(len(reactions)):
+        candidates = [sid for sid in columns[irxn] if not pivoted[sid]]
+        if len(candidates) == 0:
+            continue
+        pivot = min(candidates, key=lambda sid: (len(rows[sid]), sid))
+        pivoted[pivot] = True
+        prow = rows[pivot]
+        pval = prow[irxn]
+        for sid in candidates:
+            if sid == pivot:
+                continue
+            row = rows[sid]
+            val = row[irxn]
+            # row = pval*row - val*prow, keeping everything integer
+            for irxn2 in row:
+                row[irxn2] *= pval
+            for irxn2, pv in prow.items():
+                new = row.get(irxn2, 0) - val * pv
+                if new == 0:
+                    row.pop(irxn2, None)
+                    columns[irxn2].discard(sid)
+                else:
+                    row[irxn2] = new
+                    columns[irxn2].add(sid)
+            # keep the coefficients small
+            div = 0
+            for v in row.values():
+                div = math.gcd(div, v)
+            if div > 1:
+                for irxn2 in row:
+                    row[irxn2] //= div
+            else:
+                div = 1
+            history.append((((pval, current[sid]), (-val, current[pivot])), div))
+            current[sid] = len(history) - 1
+    laws, dependent = [], []
+    for sid in range(nspecies):
+        if pivoted[sid]:
+            continue
+        laws.append(_expand_law(history, current[sid], nspecies, sid))
+        dependent.append(sid)
+    return laws, dependent
+
+
+def _expand_law(history, node, nspecies, sid):
+    """
+    Expands a node of the elimination history into a dictionary of
+    species index to integer coefficient. Nodes only refer to older
+    nodes, so multipliers are pushed down in decreasing node order and
+    every node is visited once.
+    """
+    mults = {node: Fraction(1)}
+    heap = [-node]
+    law = {}
+    while len(heap) > 0:
+        inode = -heapq.heappop(heap)
+        mult = mults.pop(inode)
+        if inode < nspecies:
+            law[inode] = mult
+            continue
+        terms, div = history[inode]
+        for coef, child in terms:
+            if child not in mults:
+                mults[child] = Fraction(0)
+                heapq.heappush(heap, -child)
+            mults[child] += mult * coef / div
+    # integer coefficients with no common factor
+    denom = 1
+    for val in law.values():
+        denom = denom * val.denominator // math.gcd(denom, val.denominator)
+    law = {s: int(v * denom) for s, v in law.items() if v != 0}
+    common = 0
+    for val in law.values():
+        common = math.gcd(common, val)
+    # positive coefficient for the dependent species
+    if law[sid] < 0:
+        common = -common
+    return {s: v // common for s, v in sorted(law.items())}
+
+
+class NetworkReduction:
+    """
+    Result of reducing a network with Network.reduce(). Contains the
+    reduced network, the conservation laws of the reduced network and
+    the map back to the species of the original network.
+
+    Usage: network.reduce()
+
+    Attributes
+    ----------
+    network : Network
+        the reduced network, without unreachable species and reactions
+        that can't fire
+    species_map : list[int]
+        0-indexed species of the original network for each species
+        of the reduced network
+    nspecies : int
+        number of species in the original network
+    removed_species : list[int]
+        0-indexed species of the original network that can never be
+        populated
+    removed_reactions : list[str]
+        IDs of the reactions of the original network that were dropped
+    laws : list[dict]
+        conservation laws of the reduced network as dictionaries of
+        reduced species index to integer coefficient
+    dependent : list[int]
+        reduced species index eliminated by each conservation law
+    independent : list[int]
+        reduced species indices that are not eliminated
+    totals : list[float]
+        conserved total of each law computed from the initial counts,
+        None if the initial counts can't be resolved to numbers
+
+    Methods
+    -------
+    reconstruct(values, totals=None) : np.ndarray
+        takes the values of the independent species (a vector or a
+        time x species array) and returns the values of all species
+        of the original network
+    """
+
+    def __init__(
+        self,
+        network,
+        species_map,
+        nspecies,
+        removed_species,
+        removed_reactions,
+        laws,
+        dependent,
+        totals,
+    ) -> None:
+        self.network = network
+        self.species_map = species_map
+        self.nspecies = nspecies
+        self.removed_species = removed_species
+        self.removed_reactions = removed_reactions
+        self.laws = laws
+        self.dependent = dependent
+        dep = set(dependent)
+        self.independent = [i for i in range(len(species_map)) if i not in dep]
+        self.totals = totals
+
+    def __repr__(self) -> str:
+        return (
+            "{} -> {} species, {} conservation law(s), {} independent species".format(
+                self.nspecies,
+                len(self.species_map),
+                len(self.laws),
+                len(self.independent),
+            )
+        )
+
+    def reconstruct(self, values, totals=None) -> np.ndarray:
+        """
+        Reconstructs the values of every species of the original network
+        from the values of the independent species, in the order of
+        NetworkReduction.independent. Dependent species are computed from
+        the conservation laws and removed species are always zero.
+        """
+        if totals is None:
+            totals = self.totals
+        if totals is None:
+            raise BNGModelError(
+                self.network.network_name,
+                message="Conserved totals couldn't be computed from the initial species counts, please pass them to reconstruct",
+            )
+        values = np.asarray(values, dtype=float)
+        squeeze = values.ndim == 1
+        values = np.atleast_2d(values)
+        if values.shape[1] != len(self.independent):
+            raise BNGModelError(
+                self.network.network_name,
+                message=f"Expected values of {len(self.independent)} independent species, got {values.shape[1]}",
+            )
+        reduced = np.zeros((values.shape[0], len(self.species_map)))
+        reduced[:, self.independent] = values
+        for law, dep, total in zip(self.laws, self.dependent, totals):
+            val = np.full(values.shape[0], float(total))
+            for sid, coef in law.items():
+                if sid != dep:
+                    val -= coef * reduced[:, sid]
+            reduced[:, dep] = val / law[dep]
+        full = np.zeros((values.shape[0], self.nspecies))
+        full[:, self.species_map] = reduced
+        if squeeze:
+            return full[0]
+        return full
+
+
+def reduce_network(network, conservation=True) -> NetworkReduction:
+    """
+    Reduces a network by dropping reactions with a zero rate constant,
+    species that can never be populated from the initial species and
+    the reactions that consume them. If conservation is True the
+    conservation laws of the reduced network are computed as well.
+    Returns a NetworkReduction object.
+    """
+    logger = BNGLogger(loc=f"{__file__} : reduce_network()")
+    engine = network.parameters.engine()
+    species = list(network.species.items.values())
+    nspecies = len(species)
+    sid_index = {int(spec.line_label): ispec for ispec, spec in enumerate(species)}
+    rxns = list(network.reactions.items.values())
+    rxn_species = [
+        (
+            [sid_index[sid] for sid in _species_ids(rxn.reactants)],
+            [sid_index[sid] for sid in _species_ids(rxn.products)],
+        )
+        for rxn in rxns
+    ]
+    # reactions that can't fire, rates that can't be evaluated are NaN
+    # and might be non-zero
+    rates = engine.rate_vector([rxn.rate_constant for rxn in rxns]).evaluate()
+    active = [not rate == 0 for rate in rates]
+    counts = engine.rate_vector([str(spec.count) for spec in species]).evaluate()
+    # species reachable from the initial species, each reaction fires once
+    # all of its reactants are reachable
+    missing = [len(set(reactants)) for reactants, _ in rxn_species]
+    consumers = [[] for _ in range(nspecies)]
+    for irxn, (reactants, _) in enumerate(rxn_species):
+        if active[irxn]:
+            for sid in set(reactants):
+                consumers[sid].append(irxn)
+    reachable = [False] * nspecies
+    stack = []
+    for ispec in range(nspecies):
+        # unresolved counts might be non-zero
+        if not counts[ispec] == 0:
+            reachable[ispec] = True
+            stack.append(ispec)
+    for irxn in range(len(rxns)):
+        if active[irxn] and missing[irxn] == 0:
+            stack.extend(rxn_species[irxn][1])
+    while len(stack) > 0:
+        ispec = stack.pop()
+        if not reachable[ispec]:
+            reachable[ispec] = True
+        for irxn in consumers[ispec]:
+            missing[irxn] -= 1
+            if missing[irxn] == 0:
+                for prod in rxn_species[irxn][1]:
+                    if not reachable[prod]:
+                        stack.append(prod)
+        consumers[ispec] = []
+    fired = [active[irxn] and missing[irxn] == 0 for irxn in range(len(rxns))]
+    # build the reduced network
+    species_map = [ispec for ispec in range(nspecies) if reachable[ispec]]
+    new_index = {ispec: inew for inew, ispec in enumerate(species_map)}
+    removed_species = [ispec for ispec in range(nspecies) if not reachable[ispec]]
+    removed_reactions = [
+        rxns[irxn].name for irxn in range(len(rxns)) if not fired[irxn]
+    ]
+    logger.debug(
+        f"removing {len(removed_species)} species and {len(removed_reactions)} reactions"
+    )
+    reduced = copy.deepcopy(network)
+    reduced._matcher = None
+    spec_block = NetworkSpeciesBlock()
+    for ispec in species_map:
+        spec = species[ispec]
+        spec_block.add_species(
+            new_index[ispec] + 1, spec.name, spec.count, comment=spec.comment
+        )
+    reduced.add_block(spec_block)
+    rxns_block = NetworkReactionBlock()
+    reduced_rxns = []
+    for irxn, rxn in enumerate(rxns):
+        if not fired[irxn]:
+            continue
+        reactants, products = rxn_species[irxn]
+        reduced_rxns.append(
+            ([new_index[s] for s in reactants], [new_index[s] for s in products])
+        )
+        rxns_block.add_reaction(
+            len(reduced_rxns),
+            reactants=[str(new_index[s] + 1) for s in reactants] or ["0"],
+            products=[str(new_index[s] + 1) for s in products] or ["0"],
+            rate_constant=rxn.rate_constant,
+            comment=rxn.comment,
+        )
+    reduced.add_block(rxns_block)
+    grps_block = NetworkGroupBlock()
+    for group in network.groups.items.values():
+        members = []
+        for member in group.members:
+            weight, _, sid = member.rpartition("*")
+            ispec = sid_index.get(int(sid))
+            if ispec is None or not reachable[ispec]:
+                continue
+            if weight == "":
+                members.append(str(new_index[ispec] + 1))
+            else:
+                members.append("{}*{}".format(weight, new_index[ispec] + 1))
+        grps_block.add_group(
+            group.line_label.strip(), group.name, members, comment=group.comment
+        )
+    reduced.add_block(grps_block)
+    # conservation laws of the reduced network
+    laws, dependent, totals = [], [], None
+    if conservation:
+        laws, dependent = conservation_laws(reduced_rxns, len(species_map))
+        reduced_counts = counts[species_map]
+        if not np.isnan(reduced_counts).any():
+            totals = [
+                sum(coef * reduced_counts[sid] for sid, coef in law.items())
+                for law in laws
+            ]
+        logger.debug(f"found {len(laws)} conservation laws")
+    return NetworkReduction(
+        reduced,
+        species_map,
+        nspecies,
+        removed_species,
+        removed_reactions,
+        laws,
+        dependent,
+        totals,
+    )
@@ -19,6 +19,8 @@ class NetworkObj:
         line attributes
     """
 
+    __slots__ = ("_comment", "_line_label")
+
     def __init__(self):
         self._comment = ""
         self._line_label = None
@@ -101,6 +103,8 @@ class NetworkParameter(NetworkObj):
         value of the network parameter
     """
 
+    __slots__ = ("name", "value", "write_expr")
+
     def __init__(self, pid, name, value, comment=""):
         super().__init__()
         self.line_label = pid
@@ -133,6 +137,8 @@ class NetworkCompartment(NetworkObj):
         parent compartment, if exists
     """
 
+    __slots__ = ("name", "dim", "size", "outside")
+
     def __init__(self, name, dim, size, outside=None):
         super().__init__()
         self.name = name
@@ -163,8 +169,15 @@ class NetworkGroup(NetworkObj):
         name of the group
     species : list[expr]
         list of species expressions of the group
+
+    Methods
+    -------
+    weights()
+        returns the group members as a list of (species ID, weight) tuples
     """
 
+    __slots__ = ("name", "members")
+
     def __init__(self, gid, name, members=[], comment=""):
         super().__init__()
         self.line_label = gid
@@ -176,6 +189,21 @@ class NetworkGroup(NetworkObj):
         s = "{} {} ".format(self.name, ",".join(self.members))
         return s
 
+    def weights(self) -> list:
+        """
+        Parses the member expressions of the group, which are either
+        a species ID or of the form weight*species_ID, and returns a
+        list of (species_ID, weight) tuples.
+        """
+        weights = []
+        for member in self.members:
+            if "*" in member:
+                weight, sid = member.split("*")
+                weights.append((int(sid), float(weight)))
+            else:
+                weights.append((int(member), 1.0))
+        return weights
+
 
 class NetworkSpecies(NetworkObj):
     """
@@ -194,6 +222,8 @@ class NetworkSpecies(NetworkObj):
         starting value of the seed species
     """
 
+    __slots__ = ("name", "count")
+
     def __init__(self, sid, name, count=0, comment=""):
         super().__init__()
         self.line_label = sid
@@ -224,6 +254,8 @@ class NetworkFunction(NetworkObj):
         optional list of arguments for the function
     """
 
+    __slots__ = ("name", "expr", "args")
+
     def __init__(self, name, expr, args=None):
         super().__init__()
         self.name = name
@@ -257,6 +289,8 @@ class NetworkReaction(NetworkObj):
         list of operations
     """
 
+    __slots__ = ("name", "reactants", "products", "rate_constant")
+
     def __init__(
         self,
         rid,
@@ -296,6 +330,8 @@ class NetworkEnergyPattern(NetworkObj):
         expression used for energy pattern
     """
 
+    __slots__ = ("name", "pattern", "expression")
+
     def __init__(self, name, pattern, expression):
         super().__init__()
         self.name = name
@@ -327,6 +363,8 @@ class NetworkPopulationMap(NetworkObj):
         lumping parameter used in population mapping
     """
 
+    __slots__ = ("name", "species", "population", "rate")
+
     def __init__(self, name, struct_species, pop_species, rate):
         super().__init__()
         self.name = name
@@ -0,0 +1,554 @@
+import numpy as np
+
+from bionetgen.core.exc import BNGModelError
+from bionetgen.core.utils.logging import BNGLogger
+from bionetgen.network.reduction import _species_ids
+
+C_HEADER = """/*
+**   {name}_cvode_sparse.c
+**
+**   CVODE C code for the reaction network of BioNetGen model '{name}',
+**   generated by PyBioNetGen from the .net file. The right hand side,
+**   the analytic Jacobian in compressed sparse column form and the
+**   observables are written out explicitly.
+**
+**   Requires the CVODE libraries: sundials_cvode and sundials_nvecserial.
+**   If BNG_USE_KLU is defined the sparse KLU linear solver is used
+**   (SUNDIALS 2.6 or 2.7 built with KLU, link with klu), otherwise the
+**   dense solver is used with the same analytic Jacobian. Define
+**   BNG_SLS_INDEXVALS as well for SUNDIALS 2.7.
+**
+**   Uses the same simulate/free_result interface as writeCPYfile so
+**   it can be loaded with CSimWrapper. The parameters passed to simulate
+**   are the rate constants of each reaction.
+*/
+
+#include <stdlib.h>
+#include <stdio.h>
+#include <string.h>
+#include <math.h>
+#include <cvode/cvode.h>
+#include <nvector/nvector_serial.h>
+#ifdef BNG_USE_KLU
+#include <cvode/cvode_klu.h>
+#include <cvode/cvode_sparse.h>
+#else
+#include <cvode/cvode_dense.h>
+#endif
+
+/* SUNDIALS 2.7 renamed the CSC index arrays of SlsMat */
+#ifdef BNG_SLS_INDEXVALS
+#define JAC_ROWVALS(J) ((J)->indexvals)
+#define JAC_COLPTRS(J) ((J)->indexptrs)
+#else
+#define JAC_ROWVALS(J) ((J)->rowvals)
+#define JAC_COLPTRS(J) ((J)->colptrs)
+#endif
+
+/* Problem Dimensions */
+#define __N_SPECIES__      {n_species}
+#define __N_REACTIONS__    {n_reactions}
+#define __N_OBSERVABLES__  {n_observables}
+#define __JAC_NNZ__        {nnz}
+
+typedef struct result {{
+    int status;
+    int n_observables;
+    int n_species;
+    int n_tpts;
+    int obs_name_len;
+    int spcs_name_len;
+    double *observables;
+    double *species;
+    char *obs_names;
+    char *spcs_names;
+}} RESULT;
+
+/* Jacobian sparsity pattern, compressed sparse column */
+static const int jac_rowvals[__JAC_NNZ__ + 1] = {{ {rowvals} }};
+static const int jac_colptrs[__N_SPECIES__ + 1] = {{ {colptrs} }};
+"""
+
+C_BODY = """
+/* Calculate reaction rates from species and rate constants */
+void calc_ratelaws ( double *r, const double *x, const double *k )
+{{
+{ratelaws}
+}}
+
+/* Calculate species derivatives from reaction rates */
+void calc_derivs ( double *dx, const double *r )
+{{
+{derivs}
+}}
+
+/* Calculate the non-zero Jacobian entries, in jac_rowvals order */
+void calc_jacobian ( double *J, const double *x, const double *k )
+{{
+{jacobian}
+}}
+
+/* Calculate observables */
+void calc_observables ( double *obs, const double *x )
+{{
+{observables}
+}}
+
+typedef struct user_data {{
+    double *k;
+    double *r;
+}} USERDATA;
+
+int calc_species_deriv ( realtype time, N_Vector species, N_Vector Dspecies, void *f_data )
+{{
+    USERDATA *data = (USERDATA *)f_data;
+    calc_ratelaws( data->r, NV_DATA_S(species), data->k );
+    calc_derivs( NV_DATA_S(Dspecies), data->r );
+    return(0);
+}}
+
+#ifdef BNG_USE_KLU
+int calc_species_jac ( realtype time, N_Vector species, N_Vector fy, SlsMat J,
+                       void *f_data, N_Vector tmp1, N_Vector tmp2, N_Vector tmp3 )
+{{
+    int i;
+    USERDATA *data = (USERDATA *)f_data;
+    SparseSetMatToZero(J);
+    for ( i = 0; i < __JAC_NNZ__; i++ )
+    {{   JAC_ROWVALS(J)[i] = jac_rowvals[i];   }}
+    for ( i = 0; i <= __N_SPECIES__; i++ )
+    {{   JAC_COLPTRS(J)[i] = jac_colptrs[i];   }}
+    calc_jacobian( J->data, NV_DATA_S(species), data->k );
+    return(0);
+}}
+#else
+int calc_species_jac ( long int N, realtype time, N_Vector species, N_Vector fy, DlsMat J,
+                       void *f_data, N_Vector tmp1, N_Vector tmp2, N_Vector tmp3 )
+{{
+    int col, p;
+    double values[__JAC_NNZ__ + 1];
+    USERDATA *data = (USERDATA *)f_data;
+    calc_jacobian( values, NV_DATA_S(species), data->k );
+    for ( col = 0; col < __N_SPECIES__; col++ )
+    {{
+        for ( p = jac_colptrs[col]; p < jac_colptrs[col+1]; p++ )
+        {{   DENSE_ELEM(J, jac_rowvals[p], col) = values[p];   }}
+    }}
+    return(0);
+}}
+#endif
+
+static RESULT *fail ( RESULT *result, N_Vector species, void *cvode_mem, const char *funcname )
+{{
+    printf( "\\nSUNDIALS_ERROR: %s() failed\\n", funcname );
+    if ( species != NULL ) N_VDestroy_Serial(species);
+    if ( cvode_mem != NULL ) CVodeFree(&cvode_mem);
+    result->status = 1;
+    return result;
+}}
+
+RESULT *simulate ( int num_tpts, double *timepoints, int num_species_init, double *species_init, int num_parameters, double *parameters )
+{{
+    int i, j, flag;
+    realtype time;
+    N_Vector species = NULL;
+    void *cvode_mem = NULL;
+    USERDATA data;
+    double r[__N_REACTIONS__ + 1];
+    double obs[__N_OBSERVABLES__ + 1];
+    /* static, the names of large networks don't fit on the stack */
+    static const char onames[] = "{obs_names}";
+    static const char snames[] = "{spcs_names}";
+
+    RESULT *result = malloc(sizeof(RESULT));
+    result->status = 0;
+    result->n_observables = __N_OBSERVABLES__;
+    result->n_species = __N_SPECIES__;
+    result->n_tpts = num_tpts;
+    result->species = malloc(num_tpts*__N_SPECIES__*sizeof(double));
+    result->observables = malloc(num_tpts*__N_OBSERVABLES__*sizeof(double));
+    result->obs_names = strdup(onames);
+    result->spcs_names = strdup(snames);
+    result->obs_name_len = sizeof(onames);
+    result->spcs_name_len = sizeof(snames);
+
+    if ( num_species_init != __N_SPECIES__ || num_parameters != __N_REACTIONS__ || num_tpts <= 1 )
+    {{
+        printf("species_init needs %d elements, parameters %d rate constants", __N_SPECIES__, __N_REACTIONS__);
+        result->status = 1;
+        return result;
+    }}
+    data.k = parameters;
+    data.r = r;
+
+    species = N_VNew_Serial(__N_SPECIES__);
+    if ( species == NULL ) return fail(result, species, cvode_mem, "N_VNew_Serial");
+    for ( i = 0; i < __N_SPECIES__; i++ )
+    {{
+        NV_Ith_S(species,i) = species_init[i];
+        result->species[i*num_tpts] = species_init[i];
+    }}
+    calc_observables( obs, species_init );
+    for ( i = 0; i < __N_OBSERVABLES__; i++ )
+    {{   result->observables[i*num_tpts] = obs[i];   }}
+
+    cvode_mem = CVodeCreate(CV_BDF, CV_NEWTON);
+    if ( cvode_mem == NULL ) return fail(result, species, cvode_mem, "CVodeCreate");
+    flag = CVodeInit(cvode_mem, calc_species_deriv, timepoints[0], species);
+    if ( flag < 0 ) return fail(result, species, cvode_mem, "CVodeInit");
+    flag = CVodeSStolerances(cvode_mem, {rtol}, {atol});
+    if ( flag < 0 ) return fail(result, species, cvode_mem, "CVodeSStolerances");
+    flag = CVodeSetUserData(cvode_mem, &data);
+    if ( flag < 0 ) return fail(result, species, cvode_mem, "CVodeSetUserData");
+#ifdef BNG_USE_KLU
+#ifdef BNG_SLS_INDEXVALS
+    flag = CVKLU(cvode_mem, __N_SPECIES__, __JAC_NNZ__ > 0 ? __JAC_NNZ__ : 1, CSC_MAT);
+#else
+    flag = CVKLU(cvode_mem, __N_SPECIES__, __JAC_NNZ__ > 0 ? __JAC_NNZ__ : 1);
+#endif
+    if ( flag < 0 ) return fail(result, species, cvode_mem, "CVKLU");
+    flag = CVSlsSetSparseJacFn(cvode_mem, calc_species_jac);
+    if ( flag < 0 ) return fail(result, species, cvode_mem, "CVSlsSetSparseJacFn");
+#else
+    flag = CVDense(cvode_mem, __N_SPECIES__);
+    if ( flag < 0 ) return fail(result, species, cvode_mem, "CVDense");
+    flag = CVDlsSetDenseJacFn(cvode_mem, calc_species_jac);
+    if ( flag < 0 ) return fail(result, species, cvode_mem, "CVDlsSetDenseJacFn");
+#endif
+    flag = CVodeSetMaxNumSteps(cvode_mem, {max_steps});
+    if ( flag < 0 ) return fail(result, species, cvode_mem, "CVodeSetMaxNumSteps");
+
+    for ( i = 1; i < num_tpts; i++ )
+    {{
+        flag = CVode(cvode_mem, timepoints[i], species, &time, CV_NORMAL);
+        if ( flag < 0 ) return fail(result, species, cvode_mem, "CVode");
+        for ( j = 0; j < __N_SPECIES__; j++ )
+        {{   result->species[j*num_tpts + i] = NV_Ith_S(species,j);   }}
+        calc_observables( obs, NV_DATA_S(species) );
+        for ( j = 0; j < __N_OBSERVABLES__; j++ )
+        {{   result->observables[j*num_tpts + i] = obs[j];   }}
+    }}
+
+    N_VDestroy_Serial(species);
+    CVodeFree(&cvode_mem);
+    return result;
+}}
+
+void free_result ( RESULT *r )
+{{
+    free(r->obs_names);
+    free(r->spcs_names);
+    free(r->observables);
+    free(r->species);
+    free(r);
+}}
+"""
+
+
+def _monomial(terms):
+    """
+    C product of a list of strings, "1.0" if the list is empty.
+    """
+    if len(terms) == 0:
+        return "1.0"
+    return "*".join(terms)
+
+
+class BNGCGenerator:
+    """
+    Generates CVODE C code for the mass action ODEs of a Network. The
+    code has the right hand side, the analytic Jacobian in compressed
+    sparse column (CSC) form and the observables, so stiff networks
+    with thousands of species don't need a finite difference Jacobian.
+
+    The rate constants are not part of the generated code, they are
+    passed in as the parameters of the simulate function. This way
+    changing parameters doesn't need a recompilation, rate constants
+    can be computed with network.parameters.engine().
+
+    Usage: BNGCGenerator(network)
+
+    Arguments
+    ---------
+    network : Network
+        the network to generate the code from
+
+    Attributes
+    ----------
+    reactants : list[list[int]]
+        0-indexed reactant species of each reaction
+    stoichiometry : list[dict]
+        net change of each species in each reaction
+    fixed : np.ndarray
+        boolean mask of species with fixed concentrations ($)
+    rowvals : np.ndarray
+        row index of each non-zero Jacobian entry
+    colptrs : np.ndarray
+        start of each column in rowvals, CSC format
+
+    Methods
+    -------
+    rate_constants(engine=None) : np.ndarray
+        evaluates the rate constant of each reaction
+    initial_species(engine=None) : np.ndarray
+        evaluates the initial count of each species
+    rhs(x, k) : np.ndarray
+        numpy evaluation of the species derivatives
+    jacobian(x, k) : np.ndarray
+        numpy evaluation of the non-zero Jacobian entries
+    generate(model_name=None) : str
+        returns the C code
+    write(file_path, model_name=None) : None
+        writes the C code to the given path
+    """
+
+    def __init__(self, network, rtol=1e-8, atol=1e-6, max_steps=2000) -> None:
+        self.logger = BNGLogger(loc=f"{__file__} : BNGCGenerator.__init__()")
+        self.network = network
+        self.rtol = rtol
+        self.atol = atol
+        self.max_steps = max_steps
+        species = list(network.species.items.values())
+        self.species_names = [spec.name for spec in species]
+        self.n_species = len(species)
+        sid_index = {int(spec.line_label): ispec for ispec, spec in enumerate(species)}
+        # $ marks species with fixed concentrations, after the
+        # compartment prefix if there is one
+        self.fixed = np.array(
+            [name.split("::")[-1].startswith("$") for name in self.species_names],
+            dtype=bool,
+        )
+        self.rate_exprs = []
+        self.reactants = []
+        self.stoichiometry = []
+        for rxn in network.reactions.items.values():
+            reactants = [sid_index[sid] for sid in _species_ids(rxn.reactants)]
+            products = [sid_index[sid] for sid in _species_ids(rxn.products)]
+            change = {}
+            for sid in reactants:
+                change[sid] = change.get(sid, 0) - 1
+            for sid in products:
+                change[sid] = change.get(sid, 0) + 1
+            change = {
+                sid: val
+                for sid, val in change.items()
+                if val != 0 and not self.fixed[sid]
+            }
+            self.rate_exprs.append(rxn.rate_constant)
+            self.reactants.append(reactants)
+            self.stoichiometry.append(change)
+        self.n_reactions = len(self.reactants)
+        # observables from the groups block
+        self.obs_names = []
+        self.obs_weights = []
+        for group in network.groups.items.values():
+            self.obs_names.append(group.name)
+            self.obs_weights.append(
+                [(sid_index[sid], weight) for sid, weight in group.weights()]
+            )
+        self._build_jacobian()
+
+    def _build_jacobian(self):
+        """
+        Collects the terms of every non-zero Jacobian entry. For each
+        reaction the derivative of the mass action rate with respect
+        to each distinct reactant is a monomial of the other reactants
+        times the multiplicity of the reactant.
+        """
+        entries = {}
+        for irxn, reactants in enumerate(self.reactants):
+            if len(self.stoichiometry[irxn]) == 0:
+                continue
+            counts = {}
+            for sid in reactants:
+                counts[sid] = counts.get(sid, 0) + 1
+            for col, mult in counts.items():
+                # d/dx_col of x_col^mult * rest
+                monomial = []
+                for sid, cnt in counts.items():
+                    power = cnt - 1 if sid == col else cnt
+                    monomial.extend([sid] * power)
+                for row, change in self.stoichiometry[irxn].items():
+                    entries.setdefault((col, row), []).append(
+                        (change * mult, irxn, monomial)
+                    )
+        keys = sorted(entries)
+        self.rowvals = np.array([row for _, row in keys], dtype=np.int64)
+        colptrs = np.zeros(self.n_species + 1, dtype=np.int64)
+        for col, _ in keys:
+            colptrs[col + 1] += 1
+        self.colptrs = np.cumsum(colptrs)
+        self.nnz = len(keys)
+        self._jac_terms = [entries[key] for key in keys]
+        # flat term tables for numpy evaluation
+        width = max(
+            [len(m) for terms in self._jac_terms for _, _, m in terms]
+            + [len(r) for r in self.reactants]
+            + [1]
+        )
+        pad = self.n_species
+        term_pos, term_coef, term_rxn, term_mono = [], [], [], []
+        for pos, terms in enumerate(self._jac_terms):
+            for coef, irxn, monomial in terms:
+                term_pos.append(pos)
+                term_coef.append(coef)
+                term_rxn.append(irxn)
+                term_mono.append(monomial + [pad] * (width - len(monomial)))
+        self._term_pos = np.array(term_pos, dtype=np.int64)
+        self._term_coef = np.array(term_coef, dtype=float)
+        self._term_rxn = np.array(term_rxn, dtype=np.int64)
+        self._term_mono = np.array(term_mono, dtype=np.int64).reshape(-1, width)
+        self._rxn_mono = np.array(
+            [r + [pad] * (width - len(r)) for r in self.reactants], dtype=np.int64
+        ).reshape(-1, width)
+
+    def rate_constants(self, engine=None) -> np.ndarray:
+        """
+        Evaluates the rate constant of each reaction using the
+        parameter engine of the network. Raises a BNGModelError for
+        rate laws that aren't elementary mass action.
+        """
+        if engine is None:
+            engine = self.network.parameters.engine()
+        rates = engine.rate_vector(self.rate_exprs).evaluate()
+        bad = [self.rate_exprs[i] for i in np.flatnonzero(np.isnan(rates))]
+        if len(bad) > 0:
+            raise BNGModelError(
+                self.network.network_name,
+                message=f"Only elementary mass action rate laws are supported, can't evaluate: {sorted(set(bad))}",
+            )
+        return rates
+
+    def initial_species(self, engine=None) -> np.ndarray:
+        """
+        Evaluates the initial count of each species. Raises a
+        BNGModelError for counts that can't be evaluated.
+        """
+        if engine is None:
+            engine = self.network.parameters.engine()
+        counts = [str(spec.count) for spec in self.network.species.items.values()]
+        spcs = engine.rate_vector(counts).evaluate()
+        bad = [counts[i] for i in np.flatnonzero(np.isnan(spcs))]
+        if len(bad) > 0:
+            raise BNGModelError(
+                self.network.network_name,
+                message=f"Can't evaluate the initial species counts: {sorted(set(bad))}",
+            )
+        return spcs
+
+    def rhs(self, x, k) -> np.ndarray:
+        """
+        Species derivatives for species values x and rate constants k.
+        """
+        xpad = np.append(np.asarray(x, dtype=float), 1.0)
+        rates = np.asarray(k, dtype=float) * np.prod(xpad[self._rxn_mono], axis=1)
+        dx = np.zeros(self.n_species)
+        for irxn, change in enumerate(self.stoichiometry):
+            for sid, val in change.items():
+                dx[sid] += val * rates[irxn]
+        return dx
+
+    def jacobian(self, x, k) -> np.ndarray:
+        """
+        Non-zero entries of the Jacobian in CSC order (see rowvals and
+        colptrs) for species values x and rate constants k.
+        """
+        xpad = np.append(np.asarray(x, dtype=float), 1.0)
+        vals = (
+            self._term_coef
+            * np.asarray(k, dtype=float)[self._term_rxn]
+            * np.prod(xpad[self._term_mono], axis=1)
+        )
+        data = np.zeros(self.nnz)
+        np.add.at(data, self._term_pos, vals)
+        return data
+
+    def _c_ratelaws(self):
+        lines = []
+        for irxn, reactants in enumerate(self.reactants):
+            factors = [f"k[{irxn}]"] + [f"x[{sid}]" for sid in reactants]
+            lines.append(f"    r[{irxn}] = {_monomial(factors)};")
+        return "\n".join(lines)
+
+    def _c_derivs(self):
+        terms = [[] for _ in range(self.n_species)]
+        for irxn, change in enumerate(self.stoichiometry):
+            for sid, val in change.items():
+                terms[sid].append((val, irxn))
+        lines = []
+        for sid in range(self.n_species):
+            if len(terms[sid]) == 0:
+                lines.append(f"    dx[{sid}] = 0.0;")
+                continue
+            expr = ""
+            for val, irxn in terms[sid]:
+                sign = "-" if val < 0 else "+"
+                factor = "" if abs(val) == 1 else f"{abs(val)}.0*"
+                expr += f" {sign} {factor}r[{irxn}]"
+            lines.append(f"    dx[{sid}] ={expr};")
+        return "\n".join(lines)
+
+    def _c_jacobian(self):
+        lines = []
+        for pos, terms in enumerate(self._jac_terms):
+            expr = ""
+            for coef, irxn, monomial in terms:
+                sign = "-" if coef < 0 else "+"
+                factors = [f"k[{irxn}]"] + [f"x[{sid}]" for sid in monomial]
+                if abs(coef) != 1:
+                    factors.insert(0, f"{abs(coef)}.0")
+                expr += f" {sign} {_monomial(factors)}"
+            lines.append(f"    J[{pos}] ={expr};")
+        return "\n".join(lines)
+
+    def _c_observables(self):
+        lines = []
+        for iobs, weights in enumerate(self.obs_weights):
+            terms = []
+            for sid, weight in weights:
+                if weight == 1:
+                    terms.append(f"x[{sid}]")
+                else:
+                    terms.append(f"{weight!r}*x[{sid}]")
+            expr = " + ".join(terms) if len(terms) > 0 else "0.0"
+            lines.append(f"    obs[{iobs}] = {expr};")
+        return "\n".join(lines)
+
+    def generate(self, model_name=None) -> str:
+        """
+        Returns the C code for the network.
+        """
+        if model_name is None:
+            model_name = self.network.network_name
+        self.logger.debug(
+            f"generating C code for {self.n_species} species, {self.n_reactions} reactions, {self.nnz} Jacobian entries"
+        )
+        fmt = {
+            "name": model_name,
+            "n_species": self.n_species,
+            "n_reactions": self.n_reactions,
+            "n_observables": len(self.obs_names),
+            "nnz": self.nnz,
+            "rowvals": ", ".join(str(v) for v in self.rowvals) or "0",
+            "colptrs": ", ".join(str(v) for v in self.colptrs),
+        }
+        code = C_HEADER.format(**fmt)
+        code += C_BODY.format(
+            ratelaws=self._c_ratelaws(),
+            derivs=self._c_derivs(),
+            jacobian=self._c_jacobian(),
+            observables=self._c_observables(),
+            obs_names="".join(f"{name}/" for name in self.obs_names),
+            spcs_names="".join(f"{name}/" for name in self.species_names),
+            rtol=repr(float(self.rtol)),
+            atol=repr(float(self.atol)),
+            max_steps=int(self.max_steps),
+        )
+        return code
+
+    def write(self, file_path, model_name=None) -> None:
+        """
+        Writes the C code for the network to the given path.
+        """
+        with open(file_path, "w") as f:
+            f.write(self.generate(model_name=model_name))
@@ -3,14 +3,10 @@ import numpy as np
 
 from distutils import ccompiler
 from .bngsimulator import BNGSimulator
-from bionetgen.main import BioNetGen
-from bionetgen.core.exc import BNGCompileError
-
-# This allows access to the CLIs config setup
-app = BioNetGen()
-app.setup()
-conf = app.config["bionetgen"]
-def_bng_path = conf["bngpath"]
+from .cgenerator import BNGCGenerator
+from bionetgen.core.defaults import get_config
+from bionetgen.core.exc import BNGCompileError, BNGModelError
+from bionetgen.network.network import Network
 
 
 class RESULT(ctypes.Structure):
@@ -140,6 +136,7 @@ class CSimulator(BNGSimulator):
 
     def __init__(self, model_file, generate_network=False):
         # check cvode library paths
+        conf = get_config()
         if (conf.get("cvode_include") is None) or (conf.get("cvode_lib") is None):
             print("CVODE include and library paths are not set, compilation won't work")
         # let's load the model first
@@ -178,6 +175,21 @@ class CSimulator(BNGSimulator):
     def __repr__(self):
         return str(self)
 
+    def base_parameters(self, engine=None):
+        """
+        Returns the names of the parameters that are passed to the
+        compiled library. Derived parameters are computed from these
+        inside the library and parameters starting with an underscore
+        are internal to BNG.
+        """
+        if engine is None:
+            engine = self.model.parameters.engine()
+        return [
+            pname
+            for pname in self.model.parameters
+            if not pname.startswith("_") and not engine.is_derived(pname)
+        ]
+
     def compile_shared_lib(self):
         # run and get CPY file
         # make sure we don't have actions
@@ -217,17 +229,7 @@ class CSimulator(BNGSimulator):
     def simulator(self, lib_file):
         # use CSimWrapper under the hood
         try:
-            valid_params = []
-            for pname in self.model.parameters:
-                if pname.startswith("_"):
-                    continue
-                val = self.model.parameters[pname]
-                try:
-                    ftry = float(val.expr)
-                    valid_params.append(ftry)
-                except:
-                    pass
-            n_param = len(valid_params)
+            n_param = len(self.base_parameters())
             self._simulator = CSimWrapper(
                 os.path.abspath(lib_file),
                 num_params=n_param,
@@ -236,33 +238,179 @@ class CSimulator(BNGSimulator):
         except:
             raise BNGCompileError(self.model)
 
+    def species_init(self, engine=None):
+        """
+        Returns the initial counts of the species, which can be
+        numbers, parameter names or expressions of parameters.
+        """
+        if engine is None:
+            engine = self.model.parameters.engine()
+        counts = [
+            str(self.model.species[spc_name].count) for spc_name in self.model.species
+        ]
+        spcs = engine.rate_vector(counts).evaluate()
+        # counts with unknown names evaluate to NaN
+        unresolved = [
+            f"{spc_name} ({count})"
+            for spc_name, count, value in zip(self.model.species, counts, spcs)
+            if np.isnan(value)
+        ]
+        if len(unresolved) > 0:
+            raise BNGModelError(
+                self.model,
+                message=f"Can't evaluate the initial counts of species {', '.join(unresolved)}",
+            )
+        return spcs
+
     def simulate(self, t_start=0, t_end=10, n_steps=10):
         # set parameters and initial species values
-        spcs = []
-        for spc_name in self.model.species:
-            try:
-                count = float(self.model.species[spc_name].count)
-                spcs.append(count)
-            except:
-                p_name = self.model.species[spc_name].count
-                count = float(self.model.parameters[p_name].value)
-                spcs.append(count)
-        self.simulator.set_species_init(spcs)
-        params = []
-        for pname in self.model.parameters:
-            if pname.startswith("_"):
-                continue
-            try:
-                val = self.model.parameters[pname]
-                ftry = float(val.expr)
-                params.append(ftry)
-            except:
-                pass
-
-        # params = list(filter(lambda x: not x.startswith("_"), self.model.parameters))
-        # params = [float(self.model.parameters[p].value) for p in params]
+        engine = self.model.parameters.engine()
+        self.simulator.set_species_init(self.species_init(engine))
+        params = [engine[pname] for pname in self.base_parameters(engine)]
         self.simulator.set_parameters(params)
         # now that we have CSimWrapper setup correctly, run the simulation
         timepoints, obs_all, spcs_all = self.simulator.simulate(t_start, t_end, n_steps)
         # return our results
         return (timepoints, obs_all, spcs_all)
+
+
+class NetworkCSimulator(BNGSimulator):
+    """
+    Object that compiles the C code generated from a reaction network
+    by BNGCGenerator and runs it with the CSimWrapper object.
+
+    Unlike CSimulator the C code has an analytic sparse Jacobian, if
+    the CVODE libraries were built with KLU support (see klu_lib and
+    klu_include in the config) the sparse KLU solver is used, otherwise
+    the dense solver with the same Jacobian. The parameters passed to
+    the shared library are the rate constants of each reaction, these
+    are computed from the network parameters before each simulation.
+
+    Usage: NetworkCSimulator(network)
+
+    Arguments
+    ---------
+    network : Network or str
+        network object or path to a .net file
+    """
+
+    def __init__(self, network, rtol=1e-8, atol=1e-6, max_steps=2000):
+        # check cvode library paths
+        conf = get_config()
+        if (conf.get("cvode_include") is None) or (conf.get("cvode_lib") is None):
+            print("CVODE include and library paths are not set, compilation won't work")
+        if isinstance(network, str):
+            network = Network(network)
+        self.network = network
+        self.generator = BNGCGenerator(
+            self.network, rtol=rtol, atol=atol, max_steps=max_steps
+        )
+        # set compiler
+        self.compiler = ccompiler.new_compiler()
+        for key in ["cvode_include", "klu_include"]:
+            if conf.get(key) is not None:
+                self.compiler.add_include_dir(conf.get(key))
+        for key in ["cvode_lib", "klu_lib"]:
+            if conf.get(key) is not None:
+                self.compiler.add_library_dir(conf.get(key))
+        # compile shared library
+        self.compile_shared_lib()
+        # setup simulator
+        self.simulator = self.lib_file
+
+    def __str__(self):
+        return f"C/Python sparse network simulator, species: {self.generator.n_species}, reactions: {self.generator.n_reactions}"
+
+    def __repr__(self):
+        return str(self)
+
+    def use_klu(self):
+        """
+        Checks if the CVODE KLU header and the KLU library can
+        be found with the configured paths
+        """
+        conf = get_config()
+        include = conf.get("cvode_include")
+        if include is None or not os.path.isfile(
+            os.path.join(include, "cvode", "cvode_klu.h")
+        ):
+            return False
+        lib_dirs = [conf.get(key) for key in ["cvode_lib", "klu_lib"]]
+        lib_dirs = [lib_dir for lib_dir in lib_dirs if lib_dir is not None]
+        return self.compiler.find_library_file(lib_dirs, "klu") is not None
+
+    def sls_indexvals(self):
+        """
+        Checks if the sparse matrices of the CVODE headers call their
+        index arrays indexvals and indexptrs (SUNDIALS 2.7) instead of
+        rowvals and colptrs (SUNDIALS 2.6). The sundials_sls_indexvals
+        config option is used instead of the headers if it's set.
+        """
+        conf = get_config()
+        setting = conf.get("sundials_sls_indexvals")
+        if setting is not None:
+            # values from config files are strings
+            return str(setting).lower() in ("1", "true", "yes", "on")
+        includes = [conf.get("cvode_include"), "/usr/local/include", "/usr/include"]
+        for include in includes:
+            if include is None:
+                continue
+            header = os.path.join(include, "sundials", "sundials_sparse.h")
+            if os.path.isfile(header):
+                with open(header) as f:
+                    return "indexvals" in f.read()
+        return False
+
+    def compile_shared_lib(self):
+        name = self.network.network_name or "network"
+        c_file = f"{name}_cvode_sparse.c"
+        obj_file = f"{name}_cvode_sparse.o"
+        lib_file = f"{name}_cvode_sparse"
+        # for now write the .c file in the current folder
+        self.generator.write(c_file, model_name=name)
+        libraries = ["sundials_cvode", "sundials_nvecserial"]
+        macros = []
+        if self.use_klu():
+            macros.append(("BNG_USE_KLU", None))
+            if self.sls_indexvals():
+                macros.append(("BNG_SLS_INDEXVALS", None))
+            libraries += ["klu", "amd", "colamd", "btf", "suitesparseconfig"]
+        # compile objects with fPIC for the shared lib we'll link
+        self.compiler.compile([c_file], macros=macros, extra_preargs=["-fPIC"])
+        self.compiler.link_shared_lib([obj_file], lib_file, libraries=libraries)
+        # keep a record of what we got
+        self.cfile = os.path.abspath(c_file)
+        self.obj_file = os.path.abspath(obj_file)
+        # compiler tacks on the lib at the beginning and .so at the end
+        self.lib_file = os.path.abspath(f"lib{name}_cvode_sparse.so")
+
+    @property
+    def simulator(self):
+        """
+        simulator attribute that stores
+        the instantiated simulator object
+        """
+        return self._simulator
+
+    @simulator.setter
+    def simulator(self, lib_file):
+        # use CSimWrapper under the hood
+        try:
+            self._simulator = CSimWrapper(
+                os.path.abspath(lib_file),
+                num_params=self.generator.n_reactions,
+                num_spec_init=self.generator.n_species,
+            )
+        except:
+            raise BNGCompileError(self.network)
+
+    def simulate(self, t_start=0, t_end=10, n_steps=10):
+        # rate constants and initial species values are evaluated
+        # from the current network parameters
+        engine = self.network.parameters.engine()
+        self.simulator.set_species_init(self.generator.initial_species(engine))
+        self.simulator.set_parameters(self.generator.rate_constants(engine))
+        # now that we have CSimWrapper setup correctly, run the simulation
+        timepoints, obs_all, spcs_all = self.simulator.simulate(t_start, t_end, n_steps)
+        # return our results
+        return (timepoints, obs_all, spcs_all)
@@ -182,7 +182,6 @@ setup(
         "lxml",
         "networkx",
         "python-libsbml",
-        "pylru",
         "pyparsing",
     ],
 )
@@ -2,6 +2,7 @@
 PyTest Fixtures.
 """
 
+import sys
 import pytest
 from cement import fs
 
@@ -15,3 +16,22 @@ def tmp(request):
     t = fs.Tmp()
     yield t
     t.remove()
+
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path, monkeypatch):
+    """
+    Keep the files PyBNG caches between runs, e.g. stored atomizations,
+    web responses and executable checks, in a temporary folder so that
+    every test starts without them
+    """
+    cache = tmp_path / "cache"
+    monkeypatch.setenv("XDG_CACHE_HOME", str(cache))
+    # the shared caches connect to the new folder
+    for module, name in (
+        ("bionetgen.atomizer.utils.sctcache", "sct_cache"),
+        ("bionetgen.atomizer.utils.webcache", "web_cache"),
+    ):
+        if module in sys.modules:
+            monkeypatch.setattr(getattr(sys.modules[module], name), "_db", None)
+    yield cache
@@ -235,6 +235,34 @@ def test_atomize_atomized():
         assert file_list.sort() == to_match.sort()
 
 
+def test_similar_name_pairs():
+    import random
+    from bionetgen.atomizer.atomizer import detectOntology
+
+    rng = random.Random(0)
+    names = [
+        "".join(rng.choice("abP_") for _ in range(rng.randint(0, 12)))
+        for _ in range(60)
+    ]
+    names += ["EGFR", "EGFR_P", "EGFR_PP", "Grb2_Sos", "Grb2_SosP", "EGFR"]
+    for threshold in (0, 2, 4):
+        # the same pairs as comparing every pair of names
+        expected = [
+            (idx, idx2)
+            for idx in range(len(names))
+            for idx2 in range(idx + 1, len(names))
+            if detectOntology.levenshtein(names[idx], names[idx2]) <= threshold
+        ]
+        assert detectOntology.similarPairs(names, threshold) == expected
+        for idx, idx2 in expected[:50]:
+            assert detectOntology.boundedLevenshtein(
+                names[idx], names[idx2], threshold
+            ) == detectOntology.levenshtein(names[idx], names[idx2])
+    namePairs, differenceList, _ = detectOntology.defineEditDistanceMatrix(names[-6:])
+    assert ["EGFR", "EGFR_P"] in namePairs
+    assert differenceList[namePairs.index(["EGFR", "EGFR_P"])] == ("+ _", "+ p")
+
+
 def test_network_parse():
     netfile = os.path.join(tfold, "mockup.net")
     from bionetgen.network.network import Network
@@ -369,3 +397,169 @@ def test_setup_simulator():
 #     # xml_doc = etree.parse(to_validate)
 #     # result = xmlschema.validate(xml_doc)
 #     # assert result == True
+
+
+def test_memoization_caches():
+    from bionetgen.atomizer.utils.util import (
+        LRUCache,
+        pmemoize,
+        cacheStats,
+        clearCaches,
+    )
+
+    calls = []
+
+    @pmemoize(maxsize=2)
+    def double(x):
+        calls.append(x)
+        return 2 * x
+
+    assert [double(x) for x in (1, 2, 1, 3, 2)] == [2, 4, 2, 6, 4]
+    # 2 was the least recently used entry when 3 was added
+    assert calls == [1, 2, 3, 2]
+    stats = double.cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 4, 2)
+    assert cacheStats()[double.__qualname__]["entries"] == 2
+    # limits by size
+    cache = LRUCache("sized", maxbytes=1000)
+    for idx in range(10):
+        cache.put(idx, "x" * 300)
+    assert len(cache) < 4 and cache.nbytes <= 1000
+    assert cache.get(9) == "x" * 300 and cache.get(0) is None
+    clearCaches()
+    assert len(double.cache) == 0 and len(cache) == 0
+    assert double(1) == 2 and calls[-1] == 1
+
+
+def test_sct_dependency_graph_resolution():
+    from bionetgen.atomizer.atomizer.resolveSCT import SCTSolver
+    from bionetgen.atomizer.atomizer.atomizationAux import CycleError
+
+    solver = SCTSolver(None)
+    graph = {
+        "EGF_EGFR_2": [["EGF_EGFR", "EGF_EGFR"]],
+        "EGF_EGFR": [["EGF", "EGFR"]],
+        "EGFR": [],
+        "EGF": [],
+        "EGFR_P": [["EGFR"]],
+        "EGF_EGFR_2_P": [["EGF_EGFR_2"]],
+    }
+    assert solver.resolveDependencyGraph(graph, "EGF_EGFR") == [["EGF"], ["EGFR"]]
+    assert sorted(solver.resolveDependencyGraph(graph, "EGF_EGFR_2_P")) == [
+        ["EGF"],
+        ["EGF"],
+        ["EGFR"],
+        ["EGFR"],
+    ]
+    assert solver.resolveDependencyGraph(graph, "EGF_EGFR_2_P", True) == [
+        ("EGF_EGFR_2", "EGF_EGFR_2_P")
+    ]
+    # changing the graph in place gives a new version
+    graph["EGFR"] = [["R"]]
+    assert solver.resolveDependencyGraph(graph, "EGFR_P") == [["R"]]
+    # species that reach a cycle are cut where the path repeats
+    cycle = {"C1": [["C2"]], "C2": [["C3"]], "C3": [["C1"]], "D": [["C1", "E"]]}
+    assert solver.resolveDependencyGraph(cycle, "C3") == [["C1"]]
+    assert solver.resolveDependencyGraph(cycle, "D") == [["C1"], ["E"]]
+    with raises(CycleError):
+        solver.resolveDependencyGraph(cycle, "D", True)
+    # a long chain is resolved without recursion
+    chain = {"S0": []}
+    for idx in range(1, 5000):
+        chain[f"S{idx}"] = [[f"S{idx - 1}"]]
+    weights = solver.weightDependencyGraph(chain)
+    assert len(weights) == 5000
+    assert solver.resolveDependencyGraph(chain, "S4999") == [["S0"]]
+
+
+def test_sbml2bngl_species_indexes():
+    import libsbml
+    from bionetgen.atomizer.sbml2bngl import SBML2BNGL
+
+    document = libsbml.SBMLDocument(3, 1)
+    model = document.createModel()
+    for name in ("cyt", "nuc"):
+        compartment = model.createCompartment()
+        compartment.setId(name)
+        compartment.setSize(2.0)
+        compartment.setConstant(True)
+    for idx, (name, compartment) in enumerate(
+        [("A", "cyt"), ("A", "nuc"), ("B", "cyt"), ("B", "cyt")]
+    ):
+        species = model.createSpecies()
+        species.setId(f"s{idx}")
+        species.setName(name)
+        species.setCompartment(compartment)
+        if idx == 3:
+            species.setInitialAmount(5)
+        else:
+            species.setInitialConcentration(1.0)
+    parser = SBML2BNGL(model, False)
+    assert [s.getId() for s in parser.speciesByName["A"]] == ["s0", "s1"]
+    assert [s.getId() for s in parser.speciesByCompartment["cyt"]] == [
+        "s0",
+        "s2",
+        "s3",
+    ]
+    assert parser.isSameNameDifferentCompartment("A")
+    assert not parser.isSameNameDifferentCompartment("B")
+    assert parser.isAmount("B") and not parser.isAmount("A")
+    assert parser.getSpeciesInfo("s1")["compartment"] == "nuc"
+
+
+def test_expression_cache():
+    import sympy
+    from bionetgen.atomizer.sbml2bngl import ExpressionCache
+
+    cache = ExpressionCache({"k1": sympy.Symbol("k1")}, backend="sympy")
+    expr = cache.parse("k1 * A * B - k2 * C")
+    # the same formula with other white space is parsed once
+    assert cache.parse("k1*A*B -  k2*C") is expr
+    assert cache.expressions.stats()["hits"] == 1
+    assert cache.simplify(expr / sympy.Symbol("A")) == cache.simplify(
+        expr / sympy.Symbol("A")
+    )
+    assert cache.results.stats()["hits"] == 1
+    # 2 and 2.0 are kept apart
+    x = sympy.Symbol("x")
+    assert str(cache.expand(2 * (x + 1))) == "2*x + 2"
+    assert str(cache.expand(sympy.Float(2.0) * (x + 1))) == "2.0*x + 2.0"
+    power = cache.parse("k1 * (A + k2 * B) ** 3 - k2 * (C + 1) ** 2")
+    fast = ExpressionCache({}, backend="symengine")
+    try:
+        import symengine
+    except ImportError:
+        fast.backend = "sympy"
+    assert fast.expand(power) == cache.expand(power)
+
+
+def test_stage_profiler():
+    from bionetgen.atomizer.utils.profiler import StageProfiler
+
+    profiler = StageProfiler()
+    # does nothing unless started
+    with profiler.stage("ignored"):
+        pass
+    assert profiler.stages == {}
+    profiler.start(memory=True)
+    for _ in range(2):
+        with profiler.stage("outer"):
+            with profiler.stage("inner"):
+                data = [0] * 200000
+            del data
+    report = profiler.stop()
+    assert not profiler.enabled
+    assert list(report["stages"]) == ["outer/inner", "outer"]
+    assert report["stages"]["outer"]["calls"] == 2
+    inner = report["stages"]["outer/inner"]
+    assert inner["peak_memory_mb"] > 1
+    assert report["stages"]["outer"]["peak_memory_mb"] >= inner["peak_memory_mb"]
+    assert report["stages"]["outer"]["seconds"] >= inner["seconds"]
+    assert report["peak_memory_mb"] >= inner["peak_memory_mb"]
+    # only the time without tracing
+    profiler.start()
+    with profiler.stage("outer"):
+        pass
+    report = profiler.stop()
+    assert report["stages"]["outer"]["calls"] == 1
+    assert "peak_memory_mb" not in report["stages"]["outer"]
@@ -1,5 +1,5 @@
 import os, glob
-from pytest import raises
+from pytest import raises, skip
 import bionetgen as bng
 from bionetgen.main import BioNetGenTest
 
@@ -41,3 +41,210 @@ def test_atomize_atomized():
         assert app.exit_code == 0
         file_list = os.listdir(os.path.join(tfold, "test"))
         assert file_list.sort() == to_match.sort()
+
+
+def libsbml_works():
+    # some libsbml builds return node lists of formulas that the
+    # python bindings can't use, the atomizer fails with those
+    import libsbml
+
+    nodes = libsbml.parseL3Formula("k1 * A").getListOfNodes()
+    return hasattr(nodes, "getSize")
+
+
+def test_atomize_batch(tmp_path):
+    import shutil
+    from bionetgen.atomizer import BatchAtomizeTool
+    from bionetgen.atomizer.batchAtomizeTool import findSBMLFiles
+
+    if not libsbml_works():
+        skip("the installed libsbml can't list the nodes of a formula")
+    input_dir = tmp_path / "sbml"
+    input_dir.mkdir()
+    shutil.copy(os.path.join(tfold, "test_sbml.xml"), input_dir / "model.xml")
+    (input_dir / "broken.xml").write_text("<notsbml/>")
+    (input_dir / "notes.txt").write_text("not a model")
+    input_files = findSBMLFiles(str(input_dir))
+    assert [os.path.basename(f) for f in input_files] == ["broken.xml", "model.xml"]
+    output_dir = tmp_path / "out"
+    batch = BatchAtomizeTool(input_files, str(output_dir), jobs=2)
+    results = batch.run()
+    assert [result["input"] for result in results] == input_files
+    assert results[0]["status"] == "failed"
+    assert results[1]["status"] == "ok"
+    # every file gets its own log and a row in the summary
+    for name in ("broken", "model"):
+        assert (output_dir / f"{name}.bngl.log").exists()
+    with open(batch.summary_file) as f:
+        rows = [line.split("\t") for line in f.read().splitlines()]
+    assert len(rows) == 3
+    assert rows[2][2] == results[1]["status"]
+    # files that would write the same output are rejected
+    shutil.copy(input_dir / "model.xml", input_dir / "model.sbml")
+    with raises(ValueError):
+        BatchAtomizeTool(findSBMLFiles(str(input_dir)), str(output_dir))
+    # the workers run without the app and take the log level
+    # from their options
+    from bionetgen.atomizer import AtomizeTool
+
+    model_file = str(input_dir / "model.xml")
+    for options, level in (
+        ({"log_level": "WARNING"}, "WARNING"),
+        ({"debug": True, "log_level": None}, "DEBUG"),
+        ({}, "INFO"),
+    ):
+        tool = AtomizeTool(input_file=model_file, options_dict=options)
+        assert tool.config["logLevel"] == level
+    # files running past the timeout are stopped
+    batch = BatchAtomizeTool(input_files, str(output_dir), jobs=2, timeout=0)
+    assert all(result["status"] == "timeout" for result in batch.run())
+
+
+def test_web_cache(tmp_path):
+    import http.server, threading, time
+    from bionetgen.atomizer.utils.webcache import WebCache, OfflineCacheMiss
+
+    requests = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            requests.append(body)
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b"response " + body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/query?"
+    path = str(tmp_path / "web_cache.sqlite")
+    try:
+        cache = WebCache(path=path)
+        assert cache.fetch(url, data=b"a=1&b=2") == b"response a=1&b=2"
+        # same query with the parameters in another order
+        assert cache.fetch(url, data=b"b=2&a=1") == b"response a=1&b=2"
+        assert len(requests) == 1
+        # another process or run using the same file
+        assert WebCache(path=path).fetch(url, data=b"a=1&b=2") == b"response a=1&b=2"
+        assert len(requests) == 1
+        # expired entries are fetched again
+        time.sleep(0.01)
+        expired = WebCache(path=path, ttl=0)
+        assert expired.fetch(url, data=b"a=1&b=2") == b"response a=1&b=2"
+        assert len(requests) == 2
+        # offline mode replays old entries and fails on new queries
+        offline = WebCache(path=path, ttl=0, offline=True)
+        assert offline.fetch(url, data=b"a=1&b=2") == b"response a=1&b=2"
+        with raises(OfflineCacheMiss):
+            offline.fetch(url, data=b"a=3")
+        assert len(requests) == 2
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_web_cache_concurrent(tmp_path):
+    import http.server, socketserver, threading, time
+    from bionetgen.atomizer.utils.webcache import WebCache
+
+    clients = set()
+    failures = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            clients.add(self.client_address)
+            # every slow lookup takes 0.2 s, the flaky one fails once
+            time.sleep(0.2)
+            if body == b"q=flaky" and not failures:
+                failures.append(body)
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            response = b"response " + body
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(response)))
+            self.end_headers()
+            self.wfile.write(response)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+        daemon_threads = True
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/query?"
+    try:
+        cache = WebCache(path=str(tmp_path / "web_cache.sqlite"), connections=4)
+        cache.pool.backoff = 0.01
+        requests = [(url, f"q={i}".encode()) for i in range(8)]
+        start = time.time()
+        results = cache.fetch_all(requests)
+        # two rounds of four requests instead of eight one after another
+        assert time.time() - start < 1.2
+        assert results == [b"response q=%d" % i for i in range(8)]
+        # connections are kept open and reused
+        assert len(clients) <= 4
+        # failed requests are retried
+        assert cache.fetch(url, data=b"q=flaky") == b"response q=flaky"
+        assert failures == [b"q=flaky"]
+    finally:
+        cache.pool.close()
+        server.shutdown()
+        server.server_close()
+
+
+def test_sct_cache(tmp_path):
+    from bionetgen.atomizer.atomizer import detectOntology
+    from bionetgen.atomizer.utils.sctcache import SCTCache, sourceFingerprint
+
+    path = str(tmp_path / "sct_cache.sqlite")
+    cache = SCTCache(path=path)
+    assert cache.begin("model.xml", "v1") is None
+    assert cache.previousResult("stage", "a") is None
+    cache.record("stage", "a", [1, 2])
+    cache.commit({"translator": {"A": "A()"}})
+    # another run with the same key gets the atomization
+    cache = SCTCache(path=path)
+    assert cache.begin("model.xml", "v1") == {"translator": {"A": "A()"}}
+    assert cache.hits == 1
+    # an edited model gets the stage results of the last run
+    assert cache.begin("model.xml", "v2") is None
+    assert cache.previousResult("stage", "a") == [1, 2]
+    assert cache.previousResult("stage", "b") is None
+    cache.commit({"translator": {}})
+    assert cache.begin("model.xml", "v1") is None
+    cache.abort()
+    assert SCTCache(path=path, enabled=False).begin("model.xml", "v2") is None
+    # atomizations stored by other atomizer sources aren't used
+    cache = SCTCache(path=path)
+    cache.version = "edited sources"
+    assert cache.begin("model.xml", "v2") is None
+    code = tmp_path / "code"
+    code.mkdir()
+    (code / "resolveSCT.py").write_text("x = 1\n")
+    before = sourceFingerprint(str(code))
+    (code / "resolveSCT.py").write_text("x = 2\n")
+    assert sourceFingerprint(str(code)) != before
+
+    # pairs with new names are compared, the others are taken over
+    names = ["EGFR", "EGFR_P", "Grb2", "Grb2_P", "Sos", "Sos_P", "Shc", "ShcP"]
+    patterns = {("+ _", "+ p"): "phosphorylation", ("+ p",): "phosphorylation"}
+    pairs = detectOntology.patternPairs(names, patterns, 4)
+    assert (0, 1, ("+ _", "+ p")) in pairs
+    for edited in (
+        names + ["Raf", "Raf_P"],
+        names[:4] + names[6:],
+        ["EGFR", "EGFR_P", "Grb2", "Grb2P"] + names[4:],
+    ):
+        assert detectOntology.patternPairs(
+            edited, patterns, 4, (names, pairs)
+        ) == detectOntology.patternPairs(edited, patterns, 4)
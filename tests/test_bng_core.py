@@ -1,5 +1,6 @@
-import os, glob
-from pytest import raises
+import os, glob, re
+import numpy as np
+from pytest import raises, skip
 import bionetgen as bng
 from bionetgen.main import BioNetGenTest
 
@@ -51,3 +52,333 @@ def test_bionetgen_info():
     with BioNetGenTest(argv=argv) as app:
         app.run()
         assert app.exit_code == 0
+
+
+def test_observables_from_species():
+    # observables computed from the cdat should match the gdat
+    from bionetgen.core.tools import BNGResult
+
+    res_folder = os.path.join(tfold, "test")
+    result = BNGResult(path=res_folder)
+    netfile = os.path.join(res_folder, "test.net")
+    obs = result.observables_from_species(netfile, cdat="test", chunk_size=7)
+    gdat = result.gdats["test"]
+    assert obs.dtype.names == gdat.dtype.names
+    for name in gdat.dtype.names:
+        assert np.allclose(obs[name], gdat[name])
+
+
+def test_observables_from_species_no_header(tmp_path):
+    from bionetgen.core.exc import BNGFileError
+    from bionetgen.core.tools import BNGResult
+
+    res_folder = os.path.join(tfold, "test")
+    cdat = tmp_path / "noheader.cdat"
+    cdat.write_text("0.0 1.0 2.0\n")
+    result = BNGResult(path=res_folder)
+    with raises(BNGFileError):
+        result.observables_from_species(
+            os.path.join(res_folder, "test.net"), cdat=str(cdat)
+        )
+
+
+def test_observables_from_patterns():
+    # matching the model observables against the network species
+    # should reproduce the groups block and the gdat
+    from bionetgen.core.tools import BNGResult
+    from bionetgen.network.network import Network
+
+    res_folder = os.path.join(tfold, "test")
+    net = Network(os.path.join(res_folder, "test.net"))
+    model = bng.bngmodel(os.path.join(tfold, "test.bngl"))
+    for obs_name in model.observables:
+        weights = net.matcher.observable_weights(model.observables[obs_name])
+        groups = {sid - 1: w for sid, w in net.groups[obs_name].weights()}
+        assert weights == groups
+    result = BNGResult(path=res_folder)
+    obs = result.observables_from_patterns(net, model.observables, cdat="test")
+    gdat = result.gdats["test"]
+    for name in gdat.dtype.names:
+        assert np.allclose(obs[name], gdat[name])
+
+
+def test_network_reduce():
+    # the test model conserves total X and total Y, the reduced
+    # network should reconstruct the full trajectory from the
+    # independent species alone
+    from bionetgen.core.exc import BNGModelError
+    from bionetgen.core.tools import BNGResult
+    from bionetgen.network.network import Network
+
+    res_folder = os.path.join(tfold, "test")
+    net = Network(os.path.join(res_folder, "test.net"))
+    reduction = net.reduce()
+    assert len(reduction.removed_species) == 0
+    assert len(reduction.laws) == 2
+    assert len(reduction.independent) == 2
+    cdat = BNGResult(path=res_folder).cdats["test"]
+    full = np.array([cdat[f"S{i+1}"] for i in range(reduction.nspecies)]).T
+    indep = full[:, [reduction.species_map[i] for i in reduction.independent]]
+    assert np.allclose(reduction.reconstruct(indep), full)
+    with raises(BNGModelError):
+        reduction.reconstruct(full)
+
+
+def test_network_cgenerator():
+    # the analytic Jacobian of the generated code should match
+    # finite differences of the right hand side
+    from bionetgen.network.network import Network
+    from bionetgen.simulator.cgenerator import BNGCGenerator
+
+    res_folder = os.path.join(tfold, "test")
+    net = Network(os.path.join(res_folder, "test.net"))
+    gen = BNGCGenerator(net)
+    rates = gen.rate_constants()
+    x = gen.initial_species() + 1.0
+    jac = np.zeros((gen.n_species, gen.n_species))
+    data = gen.jacobian(x, rates)
+    for col in range(gen.n_species):
+        for ind in range(gen.colptrs[col], gen.colptrs[col + 1]):
+            jac[gen.rowvals[ind], col] = data[ind]
+    base = gen.rhs(x, rates)
+    for col in range(gen.n_species):
+        dx = x.copy()
+        dx[col] += 1e-6
+        assert np.allclose(jac[:, col], (gen.rhs(dx, rates) - base) / 1e-6, atol=1e-4)
+    code = gen.generate()
+    assert f"#define __JAC_NNZ__        {gen.nnz}" in code
+    assert "RESULT *simulate" in code
+    assert 'static const char snames[] = "' in code
+    # unresolved initial counts don't end up in the code
+    from bionetgen.core.exc import BNGModelError
+
+    spec = list(net.species.items.values())[0]
+    spec.count = "unknown_count"
+    with raises(BNGModelError, match="unknown_count"):
+        gen.initial_species()
+
+
+def test_sundials_sparse_version(tmp_path, monkeypatch):
+    # SUNDIALS 2.7 renamed the index arrays of sparse matrices
+    from bionetgen.simulator import csimulator
+    from bionetgen.simulator.csimulator import NetworkCSimulator
+
+    conf = {"cvode_include": str(tmp_path), "sundials_sls_indexvals": None}
+    monkeypatch.setattr(csimulator, "get_config", lambda: conf)
+    (tmp_path / "sundials").mkdir()
+    header = tmp_path / "sundials" / "sundials_sparse.h"
+    simulator = NetworkCSimulator.__new__(NetworkCSimulator)
+    header.write_text("typedef struct { int *rowvals; int *colptrs; } *SlsMat;")
+    assert not simulator.sls_indexvals()
+    header.write_text("typedef struct { int *indexvals; int *indexptrs; } *SlsMat;")
+    assert simulator.sls_indexvals()
+    conf["sundials_sls_indexvals"] = "False"
+    assert not simulator.sls_indexvals()
+
+
+def test_network_csimulator(tmp_path, monkeypatch):
+    # the generated code compiles against CVODE 2.x and reproduces
+    # the BNG2.pl trajectory
+    from bionetgen.core.defaults import get_config
+    from bionetgen.network.network import Network
+    from bionetgen.simulator.csimulator import NetworkCSimulator
+    from bionetgen.core.tools import BNGResult
+
+    include = get_config().get("cvode_include") or "/usr/include"
+    if not os.path.isfile(os.path.join(include, "cvode", "cvode_dense.h")):
+        skip("CVODE 2.x headers not found")
+    res_folder = os.path.join(tfold, "test")
+    net = Network(os.path.join(res_folder, "test.net"))
+    monkeypatch.chdir(tmp_path)
+    simulator = NetworkCSimulator(net)
+    assert os.path.isfile(simulator.lib_file)
+    timepoints, obs, spcs = simulator.simulate(0, 100, 50)
+    cdat = BNGResult(path=res_folder).cdats["test"]
+    assert np.allclose(timepoints, cdat["time"])
+    for idx in range(simulator.generator.n_species):
+        assert np.allclose(spcs[spcs.dtype.names[idx]], cdat[f"S{idx+1}"], rtol=1e-4)
+
+
+def test_compact_model_objects():
+    # model objects don't carry a __dict__ and block items are
+    # reached as attributes without being copied onto the block
+    from bionetgen.modelapi.pattern_reader import BNGPatternReader
+    from bionetgen.network.network import Network
+
+    model = bng.bngmodel(os.path.join(tfold, "test.bngl"))
+    assert model.parameters.kon is model.parameters.items["kon"]
+    assert "kon" not in model.parameters.__dict__
+    model.parameters.kon = 20
+    assert model.parameters.kon.value == 20
+    with raises(AttributeError):
+        model.parameters.not_a_parameter
+    for block in (model.parameters, model.observables, model.rules, model.species):
+        for item in block.items.values():
+            assert not hasattr(item, "__dict__")
+    pattern = BNGPatternReader("A(b!1,c~p).B(a!1)").pattern
+    assert not hasattr(pattern, "__dict__")
+    for molec in pattern.molecules:
+        assert not hasattr(molec, "__dict__")
+        for comp in molec.components:
+            assert not hasattr(comp, "__dict__")
+    net = Network(os.path.join(tfold, "test", "test.net"))
+    for item in net.species.items.values():
+        assert not hasattr(item, "__dict__")
+
+
+def test_lazy_logging():
+    # disabled debug messages are never built or sent to a logger
+    from bionetgen.core.utils.logging import BNGLogger
+    from bionetgen.modelapi import pattern as pattern_module
+    from bionetgen.modelapi.pattern_reader import BNGPatternReader
+
+    logger = BNGLogger(level="INFO")
+    assert not logger.is_debug
+    calls = []
+
+    def message():
+        calls.append(1)
+        return "message"
+
+    logger.get_logger = lambda loc=None: calls.append(2)
+    logger.debug(message)
+    logger.debug("%s", message)
+    assert calls == []
+    pat1 = BNGPatternReader("A(b!1).B(a!1,c~p)").pattern
+    pat2 = BNGPatternReader("B(c~p,a!1).A(b!1)").pattern
+    pat1.canonical_label = pat2.canonical_label = None
+    pattern_module.logger.get_logger = logger.get_logger
+    try:
+        assert pat1 == pat2
+    finally:
+        del pattern_module.logger.get_logger
+    assert calls == []
+    # enabled messages are formatted lazily
+    logger = BNGLogger(level="DEBUG")
+    assert logger.is_debug
+    assert logger.format_message("%s and %d", ("a", 1)) == "a and 1"
+    assert logger.format_message(message, ()) == "message"
+    logger.level = "WARNING"
+    assert not logger.is_debug
+
+
+def test_lazy_import():
+    # importing bionetgen doesn't set up the CLI app or load the
+    # model API until they are used
+    import subprocess, sys
+
+    code = (
+        "import sys, bionetgen\n"
+        "assert 'bionetgen.main' not in sys.modules\n"
+        "assert 'bionetgen.modelapi' not in sys.modules\n"
+        "from bionetgen.network.network import Network\n"
+        "assert 'bionetgen.main' not in sys.modules\n"
+        "assert bionetgen.bngmodel is bionetgen.modelapi.bngmodel\n"
+    )
+    rc = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(tfold))
+    assert rc.returncode == 0
+
+
+def test_bngexec_check_cache(tmp_path, monkeypatch):
+    # BNG2.pl is only run once to check it, later checks come from
+    # memory or the file on disk until BNG2.pl changes
+    from bionetgen.core.utils import utils
+
+    # the cache_home fixture keeps the checks file in tmp_path
+    assert utils.executable_checks_file().startswith(str(tmp_path))
+    monkeypatch.setattr(utils, "_executable_checks", {})
+    runs = tmp_path / "runs.txt"
+    bngexec = tmp_path / "BNG2.pl"
+    bngexec.write_text(f'open(my $f, ">>", "{runs}"); print $f "run\\n"; exit 0;\n')
+
+    def nruns():
+        return len(runs.read_text().splitlines()) if runs.exists() else 0
+
+    assert utils.test_bngexec(str(bngexec))
+    assert utils.test_bngexec(str(bngexec))
+    assert nruns() == 1
+    # a new process reads the result from disk
+    utils._executable_checks.clear()
+    assert utils.test_bngexec(str(bngexec))
+    assert nruns() == 1
+    # changing BNG2.pl invalidates the result
+    os.utime(bngexec, (0, 12345))
+    assert utils.test_bngexec(str(bngexec))
+    assert nruns() == 2
+    assert utils.revalidate(str(bngexec))
+    assert nruns() == 3
+    # failures aren't stored on disk
+    bngexec.write_text("exit 1;\n")
+    os.utime(bngexec, (0, 23456))
+    assert not utils.test_bngexec(str(bngexec))
+    utils._executable_checks.clear()
+    utils.revalidate()
+    assert utils._read_executable_checks() == {}
+
+
+def test_worker_pool(tmp_path, monkeypatch):
+    from bionetgen.core.defaults import get_config
+    from bionetgen.core.tools import BNGCLI
+    from bionetgen.core.exc import BNGRunError
+    from bionetgen.core.utils.utils import ActionList, find_BNG_path
+    from bionetgen.core.utils.workers import BNGWorkerPool, model_actions
+
+    _, bngexec = find_BNG_path(get_config()["bngpath"])
+    model_file = os.path.join(tfold, "test.bngl")
+    with open(model_file, "r") as f:
+        actions = model_actions(f.read(), ActionList().possible_types)
+    assert actions[0] == "writeXML()"
+    with BNGWorkerPool(bngexec, max_jobs=2) as pool:
+        pool.run(model_file, actions, str(tmp_path))
+        for ext in ("xml", "net", "gdat", "cdat"):
+            assert (tmp_path / f"test.{ext}").exists()
+        # a failing action leaves the worker usable
+        with raises(BNGRunError):
+            pool.run(model_file, ["not_an_action()"], str(tmp_path))
+        # the worker is replaced after max_jobs jobs
+        assert len(pool._idle) == 0
+        pool.run(model_file, ["writeXML()"], str(tmp_path))
+        # and when it crashes
+        pool._idle[0].process.kill()
+        pool._idle[0].process.wait()
+        pool.run(model_file, ["writeXML()"], str(tmp_path))
+        # relative paths in actions are found in the output directory
+        job = tmp_path / "job"
+        job.mkdir()
+        (job / "params.bngl").write_text(
+            "begin parameters\n    kon 3\nend parameters\n"
+        )
+        actions = [
+            "readFile({file=>'params.bngl', blocks=>['parameters']})",
+            "writeModel({overwrite=>1})",
+        ]
+        pool.run(model_file, actions, str(job))
+        assert re.search(r"kon\s+3\n", (job / "test.bngl").read_text())
+    # models and runs can use the pool
+    model = bng.bngmodel(model_file, pool=True)
+    assert len(model.parameters) > 0
+    # the pool writes the same XML as BNG2.pl --xml, with the
+    # generated species when the network is generated
+    from io import StringIO
+    from bionetgen.modelapi.bngfile import BNGFile
+
+    xmls = []
+    for pool in (None, True):
+        bngfile = BNGFile(model_file, generate_network=True, pool=pool)
+        xml = StringIO()
+        assert bngfile.generate_xml(xml)
+        xmls.append(re.findall(r"<Species .*", xml.read()))
+    assert len(xmls[0]) == 4
+    assert xmls[0] == xmls[1]
+    result = bng.run(model_file, out=str(tmp_path / "run"), suppress=True, pool=True)
+    assert "test" in result.gdats
+    # the workers can't stop a job after a timeout
+    monkeypatch.chdir(tmp_path)
+    cli = BNGCLI(
+        model_file,
+        str(tmp_path / "timeout"),
+        os.path.dirname(bngexec),
+        timeout=60,
+        pool=True,
+    )
+    assert cli.pool is None
@@ -38,6 +38,60 @@ def test_pattern_reader():
     assert res is True
 
 
+def test_pattern_parse_many():
+    patfile = os.path.join(tfold, "patterns.txt")
+    from bionetgen.modelapi.pattern_reader import BNGPatternReader
+
+    with open(patfile, "r") as f:
+        patterns = [pattern.strip() for pattern in f.readlines()]
+    # repeated strings come from the token cache but should still
+    # get their own Pattern objects
+    pat_objs = BNGPatternReader.parse_many(patterns + patterns)
+    assert len(pat_objs) == 2 * len(patterns)
+    for ipat, pattern in enumerate(patterns):
+        pat_obj = BNGPatternReader(pattern).pattern
+        assert str(pat_objs[ipat]) == str(pat_obj)
+        assert pat_objs[ipat] == pat_objs[ipat + len(patterns)]
+        assert pat_objs[ipat] is not pat_objs[ipat + len(patterns)]
+
+
+def test_pattern_scanner():
+    # the scanner should give the same tokens as the pyparsing
+    # reference for the test patterns and all patterns in the models
+    from bionetgen.core.exc import BNGPatternError
+    from bionetgen.modelapi.pattern_reader import BNGPatternReader
+
+    with open(os.path.join(tfold, "patterns.txt"), "r") as f:
+        patterns = [pattern.strip() for pattern in f.readlines()]
+    for model in glob.glob(os.path.join(tfold, "models") + os.sep + "*.bngl"):
+        try:
+            m = bng.bngmodel(model)
+        except:
+            continue
+        if hasattr(m, "species"):
+            patterns += [str(m.species[spec].pattern) for spec in m.species]
+        if hasattr(m, "observables"):
+            for obs in m.observables:
+                patterns += [str(pat) for pat in m.observables[obs].patterns]
+        if hasattr(m, "rules"):
+            for rule in m.rules:
+                rule = m.rules[rule]
+                patterns += [str(pat) for pat in rule.reactants + rule.products]
+    reader = BNGPatternReader()
+    for pattern in set(patterns):
+        try:
+            reference = reader.reference_tokenize(pattern)
+        except:
+            with raises(BNGPatternError):
+                reader.scanner.tokenize(pattern)
+            continue
+        assert reader.scanner.tokenize(pattern) == reference
+    # errors point at the problem
+    with raises(BNGPatternError) as err:
+        reader.scanner.tokenize("A(b!1).B(a!)")
+    assert err.value.position == 11
+
+
 def test_pattern_canonicalization():
     # for now, if the platform is windows, just skip
     if os.name == "nt":
@@ -73,3 +127,181 @@ def test_pattern_canonicalization():
             break
     # assert that everything matched up
     assert res is True
+
+
+def test_pattern_interning():
+    # runs on the built-in labelling if pynauty isn't installed
+    from bionetgen.modelapi.pattern_reader import BNGPatternReader
+
+    testfile = os.path.join(tfold, "canon_label_testing.txt")
+    with open(testfile, "r") as f:
+        tests = [pat.split("    ") for pat in f.readlines()]
+    pat1s = BNGPatternReader.parse_many([pat[0] for pat in tests])
+    pat2s = BNGPatternReader.parse_many([pat[1] for pat in tests])
+    for pat1_obj, pat2_obj in zip(pat1s, pat2s):
+        # isomorphic patterns hash the same and share one interned object
+        assert hash(pat1_obj) == hash(pat2_obj)
+        assert pat1_obj.intern() is pat2_obj.intern()
+    assert set(pat1s) == set(pat2s)
+    interned = BNGPatternReader.parse_many([pat[0] for pat in tests] * 2, intern=True)
+    assert all(pat1 is pat2 for pat1, pat2 in zip(interned, interned[len(tests) :]))
+    # wildcard bonds aren't bonds between components
+    wild, free = BNGPatternReader.parse_many(["A(b!+).B(a!+)", "A(b!1).B(a!1)"])
+    assert wild != free
+    assert wild.intern() is not free.intern()
+    # patterns are only equal if their bonds match, like their hashes
+    ring, pairs = BNGPatternReader.parse_many(
+        ["A(x!1,y!2).A(x!2,y!1)", "A(x!1,y!2).A(x!1,y!2)"]
+    )
+    assert (ring == pairs) == (hash(ring) == hash(pairs))
+    assert ring != pairs
+
+
+def test_canonicalize_many():
+    # runs on the built-in labelling if pynauty isn't installed
+    import tempfile
+    from bionetgen.modelapi.canonical import CanonicalCache, canonicalize_many
+    from bionetgen.modelapi.pattern_reader import BNGPatternReader
+
+    testfile = os.path.join(tfold, "canon_label_testing.txt")
+    with open(testfile, "r") as f:
+        tests = [pat.split("    ") for pat in f.readlines()][:100]
+    pat1s = BNGPatternReader.parse_many([pat[0] for pat in tests])
+    pat2s = BNGPatternReader.parse_many([pat[1] for pat in tests])
+    labels = [pat.canonical_label for pat in pat1s + pat2s]
+    # labelling again from the cache gives the same results
+    for pat in pat1s + pat2s:
+        pat.canonical_label = None
+    canonicalize_many(pat1s + pat2s)
+    assert [pat.canonical_label for pat in pat1s + pat2s] == labels
+    assert all(pat1 == pat2 for pat1, pat2 in zip(pat1s, pat2s))
+    # and results stored on disk can be read by another cache
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        db_path = os.path.join(tmpdirname, "labels.db")
+        cache = CanonicalCache(path=db_path)
+        for pat in pat1s:
+            cache.put(str(pat), pat.canonical_record())
+        cache.close()
+        cache = CanonicalCache(path=db_path)
+        for pat in pat1s:
+            assert cache.get(str(pat)) == pat.canonical_record()
+        cache.close()
+
+
+def test_canonical_labelling_fallback():
+    from bionetgen.modelapi import canonical
+    from bionetgen.modelapi.pattern_reader import BNGPatternReader
+
+    testfile = os.path.join(tfold, "canon_label_testing.txt")
+    with open(testfile, "r") as f:
+        tests = [pat.split("    ") for pat in f.readlines()][:200]
+    pat_strs = [pat.strip() for pair in tests for pat in pair]
+    has_pynauty = canonical.pynauty_available()
+    # labels from pynauty, if it's installed
+    nauty_labels = []
+    if has_pynauty:
+        canonical.canonical_cache.clear()
+        for pat_str in pat_strs:
+            pat = BNGPatternReader(pat_str).pattern
+            nauty_labels.append(pat.canonical_label)
+    # labels from the built-in labelling
+    canonical._has_pynauty = False
+    canonical.canonical_cache.clear()
+    try:
+        pats = [BNGPatternReader(pat_str).pattern for pat_str in pat_strs]
+    finally:
+        canonical._has_pynauty = None
+    assert all(pat.nautyG is None for pat in pats)
+    labels = [pat.canonical_label for pat in pats]
+    assert all(labels[i] == labels[i + 1] for i in range(0, len(labels), 2))
+    # both give the same classes of isomorphic patterns
+    if has_pynauty:
+        for i in range(len(labels)):
+            for j in range(i + 1, len(labels)):
+                assert (labels[i] == labels[j]) == (nauty_labels[i] == nauty_labels[j])
+
+
+def test_parameter_engine():
+    from bionetgen.modelapi.expressions import (
+        BNGParameterEngine,
+        literal_value,
+        parse_expression,
+    )
+    from bionetgen.network.network import Network
+
+    # expressions can refer to parameters defined later on
+    engine = BNGParameterEngine(
+        {"kp": "2*k0", "k0": "3", "kc": "if(kp>5,kp^2,0)+min(k0,1)", "kd": "1"}
+    )
+    assert engine["kp"] == 6
+    assert engine["kc"] == 37
+    # only the downstream parameters are updated
+    engine.set("k0", 2)
+    assert engine["kp"] == 4
+    assert engine["kc"] == 1
+    assert [engine.names[i] for i in engine.downstream(["k0"])] == ["kp", "kc"]
+    # rates are gathered from the parameter values
+    rates = engine.rate_vector(["kp", "0.5*kd", "kp*kd+1", "3"])
+    assert list(rates.evaluate()) == [4, 0.5, 5, 3]
+    engine.set("kd", 2)
+    assert list(rates.evaluate()) == [4, 1, 9, 3]
+    with raises(ValueError):
+        engine.evaluate([1, 2])
+    # number literals are read on every python version
+    engine = BNGParameterEngine({"k": "1e-3", "L": "L0*2", "L0": "2*k"})
+    assert engine["k"] == 1e-3
+    assert engine["L"] == 4e-3
+    assert engine._product_form(parse_expression("2*k")) == (2.0, "k")
+    assert literal_value(parse_expression("3")) == 3.0
+    assert literal_value(parse_expression("k")) is None
+    # network parameters
+    net = Network(os.path.join(tfold, "mockup.net"))
+    engine = net.parameters.engine()
+    assert abs(engine["kp1"] / (10e6 / (6.0221e23 * 1e-12 * 0.01)) - 1) < 1e-12
+
+
+def test_csimulator_species_init():
+    from bionetgen.core.exc import BNGModelError
+    from bionetgen.simulator.csimulator import CSimulator
+
+    # the initial counts are computed without compiling anything
+    simulator = CSimulator.__new__(CSimulator)
+    simulator.model = bng.bngmodel(os.path.join(tfold, "test.bngl"))
+    assert list(simulator.species_init()) == [5000, 0, 500]
+    # counts that can't be evaluated name the species
+    species = list(simulator.model.species)
+    simulator.model.species[species[2]].count = "unknown_count"
+    with raises(BNGModelError, match="unknown_count"):
+        simulator.species_init()
+
+
+def test_canonical_cache_processes(tmp_path):
+    import gc, multiprocessing, weakref
+    from bionetgen.modelapi.canonical import CanonicalCache
+
+    record = ("label", b"certificate", (0,), ((0,),), ((None,),))
+    db_path = str(tmp_path / "labels.db")
+    cache = CanonicalCache(path=db_path)
+    cache.put("A()", record)
+    cache.flush()
+
+    # a forked process opens its own connection to the file
+    def child(conn):
+        cache.put("B()", record)
+        cache.flush()
+        conn.send(cache.get("A()") == record)
+
+    ctx = multiprocessing.get_context("fork")
+    parent_conn, child_conn = ctx.Pipe()
+    process = ctx.Process(target=child, args=(child_conn,))
+    process.start()
+    assert parent_conn.recv()
+    process.join()
+    assert process.exitcode == 0
+    assert CanonicalCache(path=db_path).get("B()") == record
+    # caches aren't kept alive by the exit hook
+    ref = weakref.ref(cache)
+    cache.close()
+    del cache
+    gc.collect()
+    assert ref() is None